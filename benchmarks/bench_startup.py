@@ -0,0 +1,106 @@
+"""
+Startup benchmark for the command line interface.
+
+Measure the wall time of the quick commands, which only read the config
+or print the versions, in a fresh interpreter and check that they don't
+import the heavy dependencies used for the report.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat 10] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SAMPLE_CONFIG = """[General]
+base_url=https://synthetic.plentymarkets-cloud01.com
+
+[Mappings]
+referrer_id=1,4
+country_id=DE=1,AT=2
+
+[fixed_values]
+source_zone=DE
+"""
+COMMANDS = {
+    'import cli': [
+        '-c', 'import plenty_taxhub_generator.cli'],
+    '--version': ['-m', 'plenty_taxhub_generator', '--version'],
+    '--mappings': ['-m', 'plenty_taxhub_generator', '--mappings'],
+}
+HEAVY_MODULES = ['pandas', 'plenty_api', 'requests', 'pkg_resources']
+
+
+def build_environment(home: str) -> dict:
+    """Point the home directory to @home, which contains a sample config."""
+    config_dir = os.path.join(home, '.config', 'plenty_taxhub_generator')
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, 'config.ini'), mode='w',
+              encoding='utf-8') as config_file:
+        config_file.write(SAMPLE_CONFIG)
+    env = dict(os.environ)
+    env['HOME'] = home
+    env['USERPROFILE'] = home
+    return env
+
+
+def find_heavy_imports(env: dict) -> list:
+    """List the heavy modules loaded by importing the CLI module."""
+    code = ('import sys, plenty_taxhub_generator.cli; '
+            f'print(" ".join(m for m in {HEAVY_MODULES!r} '
+            'if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def measure(name: str, arguments: list, env: dict, repeat: int) -> dict:
+    """Run the command @repeat times, returning the wall times."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, env=env,
+                       capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return {
+        'name': name,
+        'repeat': repeat,
+        'median_seconds': round(statistics.median(timings), 4),
+        'min_seconds': round(min(timings), 4),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(prog='bench_startup')
+    p.add_argument('--repeat', type=int, default=10, dest='repeat',
+                   help='Amount of runs of each command')
+    p.add_argument('--json', required=False, dest='json_path',
+                   help='Write the results as JSON to the given path')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        env = build_environment(home=home)
+        heavy = find_heavy_imports(env=env)
+        results = [measure(name=name, arguments=arguments, env=env,
+                           repeat=args.repeat)
+                   for (name, arguments) in COMMANDS.items()]
+
+    print(f"{'command':<14}{'median s':>10}{'min s':>10}")
+    for result in results:
+        print(f"{result['name']:<14}{result['median_seconds']:>10}"
+              f"{result['min_seconds']:>10}")
+    print(f"heavy modules imported by the CLI: {', '.join(heavy) or 'none'}")
+    if args.json_path:
+        with open(args.json_path, mode='w', encoding='utf-8') as json_file:
+            json.dump({'results': results, 'heavy_modules': heavy},
+                      json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Microbenchmarks for the TaxHub transformation.
+
+Measure the throughput and the peak memory of the helpers used by
+`taxhub.iter_rows` and of the whole transformation, for synthetic orders
+in the shape of the PlentyMarkets API response.
+
+Usage:
+    python -m benchmarks.bench_taxhub [--sizes 10000 100000 1000000]
+                                      [--json results.json] [--workers 4]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+import tracemalloc
+
+# imported by filter_data on its first call, which would be timed otherwise
+import pandas  # noqa: F401
+
+import plenty_taxhub_generator.packages.idset as idset
+import plenty_taxhub_generator.packages.report as report
+import plenty_taxhub_generator.packages.synthetic as synthetic
+import plenty_taxhub_generator.packages.taxhub as taxhub
+import plenty_taxhub_generator.packages.utils as utils
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+POOL_SIZE = 10000
+MAX_FRAME_SIZE = 100000
+
+
+def scaled_orders(pool: list, count: int):
+    """Repeat the pool with unique order IDs until @count orders."""
+    for (index, order) in enumerate(itertools.islice(itertools.cycle(pool),
+                                                     count)):
+        clone = dict(order)
+        clone['id'] = index + 1
+        yield clone
+
+
+def measure(name: str, count: int, function) -> dict:
+    """
+    Run @function twice, returning the throughput of the first run and
+    the peak memory of the second run. Tracing the allocations slows
+    down the traced run several times, so it is not timed.
+    """
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'orders': count,
+        'seconds': round(elapsed, 4),
+        'orders_per_second': round(count / elapsed) if elapsed else 0,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def helper_benchmarks(orders: list, mapping: dict) -> list:
+    """Benchmark each helper on the same list of orders."""
+    dates = [order['documents'][0]['createdAt'] for order in orders]
+
+    def run_transform_date():
+        utils.format_date_portion.cache_clear()
+        for date in dates:
+            utils.transform_date(date=date)
+
+    benchmarks = [
+        ('transform_date', run_transform_date),
+        ('get_document_data', lambda: [
+            taxhub.get_document_data(row=order) for order in orders]),
+        ('get_delivery_date', lambda: [
+            taxhub.get_delivery_date(row=order) for order in orders]),
+        ('get_vat_zone', lambda: [
+            taxhub.get_vat_zone(row=order, mapping=mapping)
+            for order in orders]),
+        ('get_total_item_quantity', lambda: [
+            taxhub.get_total_item_quantity(row=order) for order in orders]),
+        ('compact_orders', lambda: taxhub.compact_orders(orders=orders)),
+    ]
+    return [measure(name=name, count=len(orders), function=function)
+            for (name, function) in benchmarks]
+
+
+def dedup_benchmarks(count: int) -> list:
+    """
+    Compare the memory of a set with the OrderIdSet, for @count unique
+    order IDs followed by about 10% repeated IDs, like the orders returned
+    again by overlapping requests.
+    """
+    def iter_ids():
+        return itertools.chain(range(1, count + 1), range(1, count // 10))
+
+    def run_set():
+        id_set = set()
+        for order_id in iter_ids():
+            if order_id in id_set:
+                continue
+            id_set.add(order_id)
+
+    def run_order_id_set():
+        id_set = idset.OrderIdSet()
+        for order_id in iter_ids():
+            id_set.add(order_id)
+
+    return [measure(name='dedup[set]', count=count, function=run_set),
+            measure(name='dedup[OrderIdSet]', count=count,
+                    function=run_order_id_set)]
+
+
+def end_to_end_benchmarks(pool: list, count: int, mapping: dict,
+                          workers: int = 1) -> list:
+    """Benchmark the transformation of @count orders into the report."""
+    results = []
+
+    def run_stream():
+        with open(os.devnull, mode='w', encoding='utf-8') as devnull:
+            report.write_csv(
+                rows=taxhub.iter_rows(data=scaled_orders(pool, count),
+                                      mapping=mapping),
+                stream=devnull)
+
+    results.append(measure(name='iter_rows+write_csv', count=count,
+                           function=run_stream))
+
+    if count <= MAX_FRAME_SIZE:
+        orders = list(scaled_orders(pool, count))
+        if workers > 1:
+            def run_parallel():
+                with open(os.devnull, mode='w',
+                          encoding='utf-8') as devnull:
+                    report.write_csv(
+                        rows=taxhub.iter_rows_parallel(
+                            data=orders, mapping=mapping, workers=workers),
+                        stream=devnull)
+
+            results.append(measure(name=f'iter_rows_parallel[{workers}]',
+                                   count=count, function=run_parallel))
+        results.append(measure(
+            name='filter_data', count=count,
+            function=lambda: taxhub.filter_data(data=orders,
+                                                mapping=mapping)))
+        results.append(measure(
+            name='filter_data[vectorized]', count=count,
+            function=lambda: taxhub.filter_data(data=orders, mapping=mapping,
+                                                engine='vectorized')))
+        records = taxhub.compact_orders(orders=orders)
+        for engine in taxhub.FILTER_ENGINES:
+            results.append(measure(
+                name=f'records[{engine}]', count=count,
+                function=lambda engine=engine: taxhub.filter_data(
+                    data=records, mapping=mapping, engine=engine)))
+    return results
+
+
+def print_results(results: list) -> None:
+    print(f"{'benchmark':<26}{'orders':>10}{'seconds':>10}"
+          f"{'orders/s':>12}{'peak MB':>10}")
+    for result in results:
+        print(f"{result['name']:<26}{result['orders']:>10}"
+              f"{result['seconds']:>10}{result['orders_per_second']:>12}"
+              f"{result['peak_memory_mb']:>10}")
+
+
+def main():
+    p = argparse.ArgumentParser(prog='bench_taxhub')
+    p.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                   help='Amounts of synthetic orders', dest='sizes')
+    p.add_argument('--json', required=False, dest='json_path',
+                   help='Write the results as JSON to the given path')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                   help='Worker processes of the parallel transformation',
+                   dest='workers')
+    args = p.parse_args()
+
+    mapping = synthetic.build_synthetic_mapping()
+    pool = list(synthetic.generate_orders(count=POOL_SIZE))
+    results = []
+    for size in args.sizes:
+        helper_orders = list(scaled_orders(pool, min(size, MAX_FRAME_SIZE)))
+        results += helper_benchmarks(orders=helper_orders, mapping=mapping)
+        del helper_orders
+        results += dedup_benchmarks(count=size)
+        results += end_to_end_benchmarks(pool=pool, count=size,
+                                         mapping=mapping,
+                                         workers=args.workers)
+
+    print_results(results=results)
+    if args.json_path:
+        with open(args.json_path, mode='w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
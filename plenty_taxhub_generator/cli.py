@@ -21,31 +21,68 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import argparse
 import configparser
+import copy
+import importlib.metadata
+import importlib.util
 import os
 import sys
-from pkg_resources import get_distribution, DistributionNotFound
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 
-import plenty_api
-
+import plenty_taxhub_generator.packages.archive as archive
+import plenty_taxhub_generator.packages.fetch as fetch
+import plenty_taxhub_generator.packages.incremental as incremental
+import plenty_taxhub_generator.packages.periods as periods
+import plenty_taxhub_generator.packages.profiler as profiler
+import plenty_taxhub_generator.packages.report as report
+import plenty_taxhub_generator.packages.shard as shard
+import plenty_taxhub_generator.packages.snapshot as snapshot
+import plenty_taxhub_generator.packages.spill as spill
+import plenty_taxhub_generator.packages.store as store
 import plenty_taxhub_generator.packages.taxhub as taxhub
+import plenty_taxhub_generator.packages.transport as transport
 import plenty_taxhub_generator.packages.utils as utils
 
 
 PROG_NAME = 'plenty_taxhub_generator'
-USER = os.getlogin()
-if sys.platform == 'linux':
-    BASE_PATH = os.path.join(
-        '/', 'home', str(f'{USER}'), '.config', PROG_NAME
-    )
-elif sys.platform == 'win32':
-    BASE_PATH = os.path.join(
-        'C:\\', 'Users', str(f'{USER}'), '.config', PROG_NAME
-    )
-if not os.path.exists(BASE_PATH):
-    os.mkdir(BASE_PATH)
 
-CONFIG_PATH = os.path.join(BASE_PATH, 'config.ini')
+
+def get_config_path() -> str:
+    """
+    Locate the config file within the home directory of the user.
+
+    The path is resolved on demand, so that importing the module has no
+    side effects and works without a controlling terminal (cron, systemd).
+
+    Return:
+        [str]
+    """
+    return os.path.join(os.path.expanduser('~'), '.config', PROG_NAME,
+                        'config.ini')
+
+
+def get_version(distribution: str) -> str:
+    """
+    Read the version of an installed distribution without importing it.
+
+    Return:
+        [str]               -   '(local)' if the distribution isn't installed
+    """
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return '(local)'
+
+
+class VersionAction(argparse.Action):
+    """Show the versions and exit, before the required options are checked."""
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(f"{PROG_NAME} [{get_version(distribution=PROG_NAME)}]\n"
+              f"plenty_api [{get_version(distribution='plenty_api')}]")
+        parser.exit()
 
 
 def setup_argparser():
@@ -54,7 +91,7 @@ def setup_argparser():
         '--from',
         '-f',
         '--start',
-        required=True,
+        required=False,
         help='Start date for the date range',
         dest='start_date',
     )
@@ -62,7 +99,7 @@ def setup_argparser():
         '--to',
         '-t',
         '--end',
-        required=True,
+        required=False,
         help='End date for the date range',
         dest='end_date',
     )
@@ -71,9 +108,44 @@ def setup_argparser():
         '-o',
         '--dest',
         required=False,
-        help='Destination path for the output file',
+        help='Destination path for the output file, use - for stdout',
         dest='output_path',
     )
+    p.add_argument(
+        '--configs',
+        '--batch',
+        required=False,
+        nargs='+',
+        help='Generate one report per config file, named after the file, '
+        'for several PlentyMarkets systems at the same time',
+        dest='configs',
+    )
+    p.add_argument(
+        '--periods',
+        required=False,
+        nargs='+',
+        help='Write a report for each period [NAME=]START..END (the end is '
+        'excluded), from a single request of all periods',
+        dest='periods',
+    )
+    p.add_argument(
+        '--year',
+        required=False,
+        type=int,
+        help='Write a report for each period of the year, with the length '
+        'of --period_length',
+        dest='year',
+    )
+    p.add_argument(
+        '--period_length',
+        '--period-length',
+        required=False,
+        nargs='+',
+        choices=list(periods.PERIOD_LENGTHS.keys()),
+        default=['month'],
+        help='Length of the periods of the --year option (default: month)',
+        dest='period_length',
+    )
     p.add_argument(
         '--mappings',
         '-m',
@@ -91,13 +163,160 @@ def setup_argparser():
         help='Change the base URL for the API request endpoint',
         dest='url',
     )
+    p.add_argument(
+        '--jobs',
+        '-j',
+        required=False,
+        help='Amount of concurrent order requests to PlentyMarkets',
+        dest='jobs',
+        type=int,
+        default=1,
+    )
+    p.add_argument(
+        '--pool_size',
+        '--pool-size',
+        required=False,
+        help='Amount of kept-alive connections to PlentyMarkets '
+        f'(default: {transport.DEFAULT_POOL_SIZE} or the amount of jobs)',
+        dest='pool_size',
+        type=int,
+    )
+    p.add_argument(
+        '--workers',
+        '-w',
+        required=False,
+        help='Amount of processes building the rows of the report',
+        dest='workers',
+        type=int,
+        default=1,
+    )
+    p.add_argument(
+        '--engine',
+        required=False,
+        help='Transformation of the orders into the rows of the report, '
+        '"vectorized" builds all rows at once with pandas operations on '
+        'columns (default: %(default)s)',
+        dest='engine',
+        choices=taxhub.FILTER_ENGINES,
+        default='rows',
+    )
+    p.add_argument(
+        '--fetch_mode',
+        '--mode',
+        required=False,
+        help='matrix: one request per country and referrer, sweep: a '
+        'single request for the whole date range, filtered locally',
+        dest='fetch_mode',
+        choices=fetch.FETCH_MODES,
+        default='matrix',
+    )
+    p.add_argument(
+        '--shard',
+        required=False,
+        help='Split the date range into windows of a day or a week, which '
+        'are requested in parallel and recorded in a checkpoint file',
+        dest='shard',
+        choices=list(shard.WINDOW_SIZES.keys()),
+    )
+    p.add_argument(
+        '--checkpoint',
+        required=False,
+        help='Location of the checkpoint file for the --shard option, '
+        '(default: next to the report)',
+        dest='checkpoint',
+    )
+    p.add_argument(
+        '--store',
+        required=False,
+        help='Keep the orders in a local SQLite database at the given path '
+        'and only request orders changed since the last run',
+        dest='store',
+    )
+    p.add_argument(
+        '--stream',
+        required=False,
+        help='Write the report while the orders are requested page by page, '
+        'instead of keeping the whole period in memory',
+        dest='stream',
+        action='store_true',
+    )
+    p.add_argument(
+        '--backend',
+        required=False,
+        help='Library used to write the CSV report (default: csv)',
+        dest='backend',
+        choices=report.REPORT_BACKENDS,
+        default='csv',
+    )
+    p.add_argument(
+        '--archive',
+        required=False,
+        help='Keep the raw order and VAT responses of the run in a '
+        'compressed NDJSON file at the given path',
+        dest='archive',
+    )
+    p.add_argument(
+        '--from-archive',
+        '--from_archive',
+        required=False,
+        help='Build the report from an archive written with --archive, '
+        'without any request to PlentyMarkets',
+        dest='from_archive',
+    )
+    p.add_argument(
+        '--incremental',
+        required=False,
+        help='Keep the rows of the report in a state file next to it, only '
+        'rebuild the rows of changed orders on the next run and write the '
+        'added, changed and removed TransactionIds to a delta file '
+        '(builds the rows in a single process)',
+        dest='incremental',
+        action='store_true',
+    )
+    p.add_argument(
+        '--parquet',
+        required=False,
+        help='Additionally write the report as typed and compressed Parquet '
+        'file next to the CSV report (requires pyarrow)',
+        dest='parquet',
+        action='store_true',
+    )
+    p.add_argument(
+        '--max_memory',
+        '--max-memory',
+        required=False,
+        help='Megabytes of fetched orders kept in memory, the orders '
+        'beyond are moved to temporary files in $TMPDIR until the report '
+        'is written, split evenly between the tenants of --configs '
+        '(default: no limit)',
+        type=float,
+        dest='max_memory',
+    )
+    p.add_argument(
+        '--mapping_ttl',
+        '--mapping-ttl',
+        required=False,
+        help='Hours, for which the mapping resolved from the config and the '
+        'VAT configurations is reused from its snapshot, unless the config '
+        'is modified (default: %(default)s, 0 disables the snapshot)',
+        type=float,
+        default=snapshot.DEFAULT_TTL_HOURS,
+        dest='mapping_ttl',
+    )
+    p.add_argument(
+        '--profile',
+        required=False,
+        help='Record the time, calls and orders of each stage and write a '
+        'JSON summary next to the report',
+        dest='profile',
+        action='store_true',
+    )
     p.add_argument(
         '--version',
         '-v',
         required=False,
         help='show the version of this app and some dependencies',
-        dest='version',
-        action='store_true'
+        action=VersionAction,
     )
     args = p.parse_args()
     if args.url:
@@ -106,18 +325,108 @@ def setup_argparser():
                          "URL request.")
             sys.exit(1)
 
-    if args.output_path:
+    if args.output_path and args.output_path != report.STDOUT_PATH:
         if not os.path.exists(args.output_path):
             logger.error(f"Invalid directory path [{args.output_path}] used "
                          "as output path")
             sys.exit(1)
-    if args.version:
-        try:
-            __version__ = get_distribution(PROG_NAME).version
-        except DistributionNotFound:
-            __version__ = '(local)'
-        print(f"{PROG_NAME} [{__version__}]\n"
-              f"plenty_api [{plenty_api.__version__}]")
+    if args.jobs < 1:
+        logger.error(f"Invalid amount of jobs [{args.jobs}], at least one "
+                     "job is required.")
+        sys.exit(1)
+    if args.pool_size is not None and args.pool_size < 1:
+        logger.error(f"Invalid pool size [{args.pool_size}], at least one "
+                     "connection is required.")
+        sys.exit(1)
+    if args.max_memory is not None and args.max_memory <= 0:
+        logger.error(f"Invalid memory budget [{args.max_memory}], the "
+                     "megabytes must be positive.")
+        sys.exit(1)
+    if args.max_memory and (args.engine == 'vectorized' or
+                            args.incremental):
+        logger.error("The --max-memory option cannot be combined with the "
+                     "vectorized engine or --incremental, they keep all "
+                     "rows in memory.")
+        sys.exit(1)
+    if args.max_memory and args.stream:
+        logger.error("The --max-memory option cannot be combined with "
+                     "--stream, which doesn't keep the orders in memory.")
+        sys.exit(1)
+    if args.mapping_ttl < 0:
+        logger.error(f"Invalid mapping TTL [{args.mapping_ttl}], the hours "
+                     "must not be negative.")
+        sys.exit(1)
+    if args.workers < 1:
+        logger.error(f"Invalid amount of workers [{args.workers}], at least "
+                     "one worker is required.")
+        sys.exit(1)
+    if args.stream and (args.shard or args.store):
+        logger.error("The --stream option cannot be combined with --shard "
+                     "or --store.")
+        sys.exit(1)
+    if args.engine == 'vectorized' and (args.stream or args.incremental or
+                                        args.workers > 1):
+        logger.error("The vectorized engine cannot be combined with "
+                     "--stream, --incremental or --workers, it builds all "
+                     "rows at once within a single process.")
+        sys.exit(1)
+    if args.parquet and not importlib.util.find_spec('pyarrow'):
+        logger.error("The --parquet option requires pyarrow, install it with "
+                     "`pip install pyarrow`.")
+        sys.exit(1)
+    if args.from_archive and (args.archive or args.shard or args.store):
+        logger.error("The --from-archive option cannot be combined with "
+                     "--archive, --shard or --store.")
+        sys.exit(1)
+    if args.configs and (args.from_archive or args.mappings or args.url):
+        logger.error("The --configs option cannot be combined with "
+                     "--from-archive, --mappings or --change_url.")
+        sys.exit(1)
+    if args.configs and args.workers > 1:
+        logger.error("The --configs option cannot be combined with "
+                     "--workers, the tenants are processed in threads.")
+        sys.exit(1)
+    if args.configs and args.output_path and (
+            not os.path.isdir(args.output_path)):
+        logger.error("The --out option of a batch must be a directory.")
+        sys.exit(1)
+    if args.periods or args.year:
+        if args.stream or args.configs or args.from_archive:
+            logger.error("The --periods and --year options cannot be "
+                         "combined with --stream, --configs or "
+                         "--from-archive.")
+            sys.exit(1)
+        if args.start_date or args.end_date:
+            logger.error("The --periods and --year options replace the "
+                         "date range of --from and --to, use only one of "
+                         "them.")
+            sys.exit(1)
+        if args.output_path == report.STDOUT_PATH:
+            logger.error("The reports of multiple periods cannot be "
+                         "written to the standard output.")
+            sys.exit(1)
+        parsed = [periods.parse_period(value=x) for x in args.periods or []]
+        if None in parsed:
+            logger.error("Invalid period, use [NAME=]START..END with a "
+                         "start before the end and a name without path "
+                         "separators.")
+            sys.exit(1)
+        if args.year:
+            parsed += periods.build_year_periods(year=args.year,
+                                                 lengths=args.period_length)
+        duplicates = periods.get_duplicate_names(periods=parsed)
+        if duplicates:
+            logger.error(f"Duplicate period names {duplicates}, the name of "
+                         "each period must be unique.")
+            sys.exit(1)
+        args.periods = parsed
+    if args.from_archive and not os.path.exists(args.from_archive):
+        logger.error(f"Archive [{args.from_archive}] does not exist.")
+        sys.exit(1)
+    if not (args.mappings or args.from_archive or args.periods) and not (
+            args.start_date and args.end_date):
+        p.error("the following arguments are required: --from/-f/--start, "
+                "--to/-t/--end")
     return args
 
 
@@ -155,6 +464,9 @@ def gather_data_from_config(config):
     }
     data['countries'] = utils.country_id_mapping(config=config)
     data['referrer'] = utils.get_referrer_id_list(config=config)
+    if not data['referrer']:
+        logger.error("At least one valid referrer ID or ALL is required.")
+        return None
 
     if 'fixed_values' in config.sections():
         for key in config['fixed_values']:
@@ -166,7 +478,7 @@ def gather_data_from_config(config):
 def add_vat_data_to_mappings(mapping: dict, vat_data: dict) -> dict:
     """
     Add the Tax ID and the VAT configuration IDs to the existing
-    country mappings.
+    country mappings and index the VAT configuration IDs by country.
     """
     for key in mapping['countries'].keys():
         country_id = mapping['countries'][key]['country_id']
@@ -176,9 +488,124 @@ def add_vat_data_to_mappings(mapping: dict, vat_data: dict) -> dict:
         else:
             logger.error(f"No VAT data found, for {key}: {country_id}")
 
+    mapping['vat_index'] = taxhub.build_vat_index(mapping=mapping)
     return mapping
 
 
+def get_side_file_path(out_path: str, suffix: str) -> str:
+    """
+    Build the path of a file, that is placed next to the report.
+
+    Parameter:
+        out_path [str]      -   location of the report, '-' for stdout
+        suffix [str]        -   appended to the name of the report
+
+    Return:
+        [str]
+    """
+    if out_path == report.STDOUT_PATH:
+        out_path = os.path.join(os.getcwd(), 'tax_hub_report.csv')
+    return out_path + suffix
+
+
+def get_parquet_path(out_path: str) -> str:
+    """
+    Place the Parquet export next to the report, with the same name.
+    """
+    if out_path == report.STDOUT_PATH:
+        out_path = os.path.join(os.getcwd(), 'tax_hub_report.csv')
+    return os.path.splitext(out_path)[0] + '.parquet'
+
+
+def get_archive_meta(args, mapping: dict) -> dict:
+    return {
+        'start': args.start_date,
+        'end': args.end_date,
+        'fetch_mode': args.fetch_mode,
+        'fetch_key': shard.get_checkpoint_key(mapping=mapping,
+                                              fetch_mode=args.fetch_mode),
+    }
+
+
+def get_report_rows(args, orders, mapping: dict, out_path: str) -> tuple:
+    """
+    Build the rows of the report, from the state of the previous report
+    for incremental runs or all at once with the vectorized engine.
+
+    Parameter:
+        args [Namespace]    -   parsed command line arguments
+        orders [Iterable]   -   orders in JSON format or OrderRecords
+        mapping [dict]      -   configuration data and VAT data
+        out_path [str]      -   location of the report, '-' for stdout
+
+    Return:
+        [tuple]             -   rows generator and ReportState or None
+    """
+    state = None
+    if args.incremental:
+        state = incremental.ReportState(
+            path=get_side_file_path(out_path=out_path, suffix='.state.gz'),
+            mapping=mapping)
+        rows = state.iter_rows(data=orders)
+    elif args.engine == 'vectorized':
+        with profiler.get_profiler().stage('transform') as record:
+            frame = taxhub.filter_data(data=list(orders), mapping=mapping,
+                                       engine=args.engine)
+            record['orders'] = len(frame)
+        return (frame.itertuples(index=False, name=None), state)
+    else:
+        rows = taxhub.iter_rows_parallel(data=orders, mapping=mapping,
+                                         workers=args.workers)
+    return (profiler.get_profiler().wrap_iter('transform', rows), state)
+
+
+def get_memory_budget(args) -> spill.MemoryBudget:
+    return spill.MemoryBudget(
+        max_bytes=int((args.max_memory or 0) * 1024 * 1024))
+
+
+def write_delta(state, out_path: str) -> None:
+    if state is None:
+        return
+    incremental.write_delta(
+        state=state,
+        path=get_side_file_path(out_path=out_path, suffix='.delta.json'))
+
+
+def report_from_archive(args, mapping: dict, out_path: str,
+                        parquet_path: str) -> None:
+    """
+    Build the report from the orders and the VAT mapping of an archive,
+    with the current configuration.
+    """
+    prof = profiler.get_profiler()
+    try:
+        (meta, vat_data, orders) = archive.read_archive(
+            path=args.from_archive)
+    except archive.ArchiveError as err:
+        logger.error(str(err))
+        sys.exit(1)
+    logger.info(f"Building the report for [{meta['start']}] to "
+                f"[{meta['end']}] from archive [{args.from_archive}]")
+    mapping = add_vat_data_to_mappings(mapping=mapping, vat_data=vat_data)
+    fetch_key = shard.get_checkpoint_key(mapping=mapping,
+                                         fetch_mode=meta['fetch_mode'])
+    if fetch_key != meta['fetch_key']:
+        logger.warning("The countries or referrers of the configuration "
+                       "changed since the archive was written, orders of "
+                       "new countries or referrers are missing.")
+
+    (rows, state) = get_report_rows(
+        args=args, orders=prof.wrap_iter('archive read', orders),
+        mapping=mapping, out_path=out_path)
+    with prof.stage('write'):
+        report.write_report(rows=rows, path=out_path, backend=args.backend,
+                            parquet_path=parquet_path)
+    logger.info(f"Report written to [{out_path}]")
+    write_delta(state=state, out_path=out_path)
+    write_profile(args=args, out_path=out_path)
+
+
 def show_mappings(data: dict) -> None:
     logger.info(f"PlentyMarkets API base URL: {data['url']}\n-------")
 
@@ -192,49 +619,455 @@ def show_mappings(data: dict) -> None:
     sys.exit(0)
 
 
+def write_profile(args, out_path: str) -> None:
+    """
+    Write the summary of the profiler next to the report, if requested.
+    """
+    if not args.profile:
+        return
+    profile_path = get_side_file_path(out_path=out_path,
+                                      suffix='.profile.json')
+    profiler.get_profiler().write(path=profile_path)
+    logger.info(f"Profile written to [{profile_path}]")
+
+
+def configure_transport(args) -> None:
+    transport.configure(
+        pool_size=args.pool_size or max(transport.DEFAULT_POOL_SIZE,
+                                        args.jobs))
+    transport.install()
+
+
+def load_mapping(config_path: str) -> tuple:
+    """
+    Read a config file and gather its mapping.
+
+    Return:
+        [tuple]             -   config [ConfigParser], mapping [dict] or
+                                None if the config is not valid
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return (config, gather_data_from_config(config=config))
+
+
+def load_cached_mapping(args, config_path: str) -> tuple:
+    """
+    Take the mapping and the VAT data from the snapshot of the config,
+    if it is still valid, otherwise read the config.
+
+    Return:
+        [tuple]             -   config [ConfigParser] or None for a
+                                snapshot, mapping [dict] or None if the
+                                config is not valid, VAT data [dict] or
+                                None if it has to be requested
+    """
+    if args.mapping_ttl > 0 and not args.url:
+        cached = snapshot.load_snapshot(config_path=config_path,
+                                        ttl=args.mapping_ttl * 3600)
+        if cached:
+            return (None,) + cached
+    (config, mapping) = load_mapping(config_path=config_path)
+    return (config, mapping, None)
+
+
+def resolve_vat_data(args, plenty, mapping: dict, vat_data: dict,
+                     config_path: str) -> tuple:
+    """
+    Request the VAT mapping, unless it is taken from a snapshot, and add
+    it to the mapping. A requested VAT mapping is kept in a snapshot of
+    the config at @config_path.
+
+    Return:
+        [tuple]             -   mapping [dict], VAT data [dict]
+    """
+    if vat_data is not None:
+        return (mapping, vat_data)
+    with profiler.get_profiler().stage('vat mapping'):
+        vat_data = plenty.plenty_api_get_vat_id_mappings()
+    mapping = add_vat_data_to_mappings(mapping=mapping, vat_data=vat_data)
+    if config_path and args.mapping_ttl > 0:
+        snapshot.write_snapshot(config_path=config_path, mapping=mapping,
+                                vat_data=vat_data)
+    return (mapping, vat_data)
+
+
+def login(mapping: dict):
+    # Imported here, as plenty_api pulls in pandas and requests, which are
+    # not needed for the quick commands and reports from an archive.
+    import plenty_api
+
+    with profiler.get_profiler().stage('login'):
+        return plenty_api.PlentyApi(
+            base_url=mapping['url'], data_format='json', use_keyring=True,
+            debug=False
+        )
+
+
+def generate_report(args, plenty, mapping: dict, out_path: str,
+                    vat_data: dict = None, config_path: str = '') -> None:
+    """
+    Request the VAT mapping and the orders of the date range and write the
+    report, with the fetch mode, storage and outputs chosen by @args.
+
+    Parameter:
+        args [Namespace]    -   parsed command line arguments
+        plenty [PlentyApi]  -   authenticated API client
+        mapping [dict]      -   data from the configuration
+        out_path [str]      -   location of the report, '-' for stdout
+        vat_data [dict]     -   VAT mapping of a snapshot, None to request
+                                it
+        config_path [str]   -   config of the mapping, for its snapshot
+
+    Raises:
+        fetch.FetchError    -   when the orders cannot be requested
+    """
+    prof = profiler.get_profiler()
+    parquet_path = ''
+    if args.parquet:
+        parquet_path = get_parquet_path(out_path=out_path)
+
+    (mapping, vat_data) = resolve_vat_data(
+        args=args, plenty=plenty, mapping=mapping, vat_data=vat_data,
+        config_path=config_path)
+
+    if args.stream:
+        orders = fetch.iter_orders(
+            plenty=plenty, start=args.start_date, end=args.end_date,
+            mapping=mapping, fetch_mode=args.fetch_mode
+        )
+        archive_writer = None
+        if args.archive:
+            archive_writer = archive.ArchiveWriter(
+                path=args.archive, meta=get_archive_meta(args=args,
+                                                         mapping=mapping),
+                vat_data=vat_data)
+            orders = archive_writer.tee(orders=orders)
+        try:
+            (rows, state) = get_report_rows(
+                args=args, orders=orders, mapping=mapping, out_path=out_path)
+            with prof.stage('write'):
+                report.write_report(rows=rows, path=out_path,
+                                    backend=args.backend,
+                                    parquet_path=parquet_path)
+        except BaseException:
+            # also on interrupts, so no partial archive is left behind
+            if archive_writer:
+                archive_writer.discard()
+            raise
+        if archive_writer:
+            archive_writer.commit()
+            logger.info(f"Archived {archive_writer.count} orders to "
+                        f"[{args.archive}]")
+        logger.info(f"Report written to [{out_path}]")
+        if parquet_path:
+            logger.info(f"Parquet export written to [{parquet_path}]")
+        write_delta(state=state, out_path=out_path)
+        return
+
+    checkpoint_path = args.checkpoint or get_side_file_path(
+        out_path=out_path, suffix='.checkpoint')
+    with get_memory_budget(args=args) as budget:
+        # keep only the values used by the report, the archive receives
+        # the orders in JSON format and they are reduced afterwards
+        all_orders = fetch_all_orders(
+            args=args, plenty=plenty, mapping=mapping, start=args.start_date,
+            end=args.end_date, checkpoint_path=checkpoint_path,
+            new_bucket=budget.new_list, convert=get_convert(args=args))
+        if args.archive:
+            write_archive(args=args, mapping=mapping, vat_data=vat_data,
+                          orders=all_orders, start=args.start_date,
+                          end=args.end_date)
+            with prof.stage('ingest') as record:
+                orders = all_orders
+                all_orders = taxhub.compact_orders(
+                    orders=orders, new_bucket=budget.new_list)
+                orders.clear()
+                record['orders'] = len(all_orders)
+
+        write_orders_report(args=args, orders=all_orders, mapping=mapping,
+                            out_path=out_path, parquet_path=parquet_path)
+    if args.shard and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def get_convert(args):
+    """
+    Reduce the orders to OrderRecords as soon as they are fetched, unless
+    they are archived first, which requires the orders in JSON format.
+    """
+    if args.archive:
+        return None
+    return taxhub.OrderRecord
+
+
+def fetch_all_orders(args, plenty, mapping: dict, start: str, end: str,
+                     checkpoint_path: str, new_bucket=list,
+                     convert=None) -> list:
+    """
+    Request the orders of the date range with the storage and fetch mode
+    chosen by @args, into lists created by @new_bucket, each order is
+    passed through @convert as soon as it is fetched.
+
+    Raises:
+        fetch.FetchError    -   when the orders cannot be requested
+    """
+    with profiler.get_profiler().stage('fetch') as record:
+        if args.store:
+            orders = store.fetch_from_store(
+                plenty=plenty, path=args.store, start=start, end=end,
+                mapping=mapping, new_bucket=new_bucket, convert=convert
+            )
+        elif args.shard:
+            orders = shard.fetch_sharded(
+                plenty=plenty, start=start, end=end, mapping=mapping,
+                window=args.shard, checkpoint_path=checkpoint_path,
+                fetch_mode=args.fetch_mode, jobs=args.jobs,
+                new_bucket=new_bucket, convert=convert
+            )
+        else:
+            orders = fetch.fetch_range(
+                plenty=plenty, start=start, end=end, mapping=mapping,
+                fetch_mode=args.fetch_mode, jobs=args.jobs,
+                new_bucket=new_bucket, convert=convert
+            )
+        record['orders'] = len(orders)
+    return orders
+
+
+def write_archive(args, mapping: dict, vat_data: dict, orders: list,
+                  start: str, end: str) -> None:
+    if not args.archive:
+        return
+    meta = dict(get_archive_meta(args=args, mapping=mapping), start=start,
+                end=end)
+    with profiler.get_profiler().stage('archive write') as record:
+        record['orders'] = archive.write_archive(
+            path=args.archive, meta=meta, vat_data=vat_data, orders=orders)
+    logger.info(f"Archived {record['orders']} orders to [{args.archive}]")
+
+
+def write_orders_report(args, orders: list, mapping: dict, out_path: str,
+                        parquet_path: str) -> None:
+    prof = profiler.get_profiler()
+    (rows, state) = get_report_rows(args=args, orders=orders,
+                                    mapping=mapping, out_path=out_path)
+    with prof.stage('write'):
+        report.write_report(rows=rows, path=out_path, backend=args.backend,
+                            parquet_path=parquet_path)
+    logger.info(f"Report written to [{out_path}]")
+    if parquet_path:
+        logger.info(f"Parquet export written to [{parquet_path}]")
+    write_delta(state=state, out_path=out_path)
+
+
+def get_period_path(out_path: str, name: str) -> str:
+    (root, extension) = os.path.splitext(out_path)
+    return f"{root}_{name}{extension}"
+
+
+def generate_period_reports(args, plenty, mapping: dict, out_path: str,
+                            vat_data: dict = None,
+                            config_path: str = '') -> None:
+    """
+    Request the orders of all periods at once and write a report for each
+    period, named after the report with the name of the period appended.
+
+    Parameter:
+        args [Namespace]    -   parsed command line arguments
+        plenty [PlentyApi]  -   authenticated API client
+        mapping [dict]      -   data from the configuration
+        out_path [str]      -   location of the report
+        vat_data [dict]     -   VAT mapping of a snapshot, None to request
+                                it
+        config_path [str]   -   config of the mapping, for its snapshot
+
+    Raises:
+        fetch.FetchError    -   when the orders cannot be requested
+    """
+    prof = profiler.get_profiler()
+    (mapping, vat_data) = resolve_vat_data(
+        args=args, plenty=plenty, mapping=mapping, vat_data=vat_data,
+        config_path=config_path)
+
+    checkpoint_path = args.checkpoint or get_side_file_path(
+        out_path=out_path, suffix='.checkpoint')
+    budget = get_memory_budget(args=args)
+    all_orders = budget.new_list()
+    ranges = periods.merge_periods(periods=args.periods)
+    with budget:
+        for (start, end) in ranges:
+            logger.info(f"Load... orders of the periods from [{start}] to "
+                        f"[{end}]")
+            orders = fetch_all_orders(
+                args=args, plenty=plenty, mapping=mapping, start=start,
+                end=end, checkpoint_path=checkpoint_path,
+                new_bucket=budget.new_list, convert=get_convert(args=args))
+            all_orders.extend(orders)
+            orders.clear()
+        write_archive(args=args, mapping=mapping, vat_data=vat_data,
+                      orders=all_orders, start=ranges[0][0],
+                      end=ranges[-1][1])
+
+        with prof.stage('ingest') as record:
+            buckets = periods.bucket_orders(
+                orders=all_orders, periods=args.periods,
+                convert=taxhub.OrderRecord if args.archive else None,
+                new_bucket=budget.new_list)
+            record['orders'] = len(all_orders)
+        all_orders.clear()
+
+        for (name, _, _) in args.periods:
+            period_path = get_period_path(out_path=out_path, name=name)
+            parquet_path = ''
+            if args.parquet:
+                parquet_path = get_parquet_path(out_path=period_path)
+            orders = buckets.pop(name)
+            write_orders_report(args=args, orders=orders, mapping=mapping,
+                                out_path=period_path,
+                                parquet_path=parquet_path)
+            orders.clear()
+    if args.shard and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def get_tenant_name(config_path: str) -> str:
+    return os.path.splitext(os.path.basename(config_path))[0]
+
+
+def get_tenant_path(path: str, tenant: str) -> str:
+    """
+    Prefix the file name of @path with the name of the tenant, so that
+    the tenants of a batch don't share any file.
+    """
+    (directory, name) = os.path.split(path)
+    return os.path.join(directory, f"{tenant}_{name}")
+
+
+def get_tenant_args(args, tenant: str, tenant_count: int = 1):
+    tenant_args = copy.copy(args)
+    for option in ['archive', 'checkpoint', 'store']:
+        path = getattr(args, option)
+        if path:
+            setattr(tenant_args, option,
+                    get_tenant_path(path=path, tenant=tenant))
+    if args.max_memory:
+        # the tenants run at the same time, each gets its share of the
+        # memory budget
+        tenant_args.max_memory = args.max_memory / tenant_count
+    return tenant_args
+
+
+def run_batch(args) -> None:
+    """
+    Write one report per config file of the --configs option into the
+    directory of the --out option (default: current working directory).
+    The logins are done one after the other, as they might ask for
+    credentials, the reports of all tenants are generated at the same time
+    within a shared pool of threads.
+    """
+    out_dir = args.output_path or os.getcwd()
+    tenants = {}
+    for config_path in args.configs:
+        tenant = get_tenant_name(config_path=config_path)
+        if tenant in tenants:
+            logger.error(f"Duplicate tenant [{tenant}], the names of the "
+                         "config files must be unique.")
+            sys.exit(1)
+        (_, mapping, vat_data) = load_cached_mapping(
+            args=args, config_path=config_path)
+        if not mapping:
+            logger.error(f"Configuration [{config_path}] does not exist or "
+                         "not valid.")
+            sys.exit(1)
+        tenants[tenant] = (config_path, mapping, vat_data)
+
+    clients = {}
+    for (tenant, (_, mapping, _)) in tenants.items():
+        logger.info(f"Login... tenant [{tenant}]")
+        clients[tenant] = login(mapping=mapping)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(tenants)) as executor:
+        futures = {
+            executor.submit(
+                generate_report, args=get_tenant_args(
+                    args=args, tenant=tenant, tenant_count=len(tenants)),
+                plenty=clients[tenant], mapping=mapping,
+                out_path=os.path.join(out_dir,
+                                      f"{tenant}_tax_hub_report.csv"),
+                vat_data=vat_data, config_path=config_path
+            ): tenant
+            for (tenant, (config_path, mapping, vat_data))
+            in tenants.items()
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except fetch.FetchError as err:
+                logger.error(f"Fetching orders failed for tenant "
+                             f"[{futures[future]}]: {err}")
+                failed.append(futures[future])
+            except Exception:
+                # a failing tenant must not stop the reports of the others
+                logger.exception(f"Report failed for tenant "
+                                 f"[{futures[future]}]")
+                failed.append(futures[future])
+
+    write_profile(args=args, out_path=os.path.join(out_dir,
+                                                   'tax_hub_report.csv'))
+    if failed:
+        logger.error(f"No report for the tenants: {sorted(failed)}")
+        sys.exit(1)
+
+
 def cli():
     out_path = os.path.join(os.getcwd(), 'tax_hub_report.csv')
-    config = configparser.ConfigParser()
-    config.read(CONFIG_PATH)
-    mapping = gather_data_from_config(config=config)
+    args = setup_argparser()
+    if args.profile:
+        profiler.enable()
+    if args.configs:
+        configure_transport(args=args)
+        run_batch(args=args)
+        return
+
+    config_path = get_config_path()
+    (config, mapping, vat_data) = load_cached_mapping(
+        args=args, config_path=config_path)
     if not mapping:
         logger.error(f"Configuration does not exist or not valid.")
         sys.exit(1)
-    args = setup_argparser()
-    all_orders = []
 
     if args.url:
         config['General']['base_url'] = args.url
-        config.write(CONFIG_PATH)
+        with open(config_path, mode='w', encoding='utf-8') as config_file:
+            config.write(config_file)
     if args.mappings:
         show_mappings(data=mapping)
     if args.output_path:
         out_path = args.output_path
 
-    plenty = plenty_api.PlentyApi(
-        base_url=mapping['url'], data_format='json', use_keyring=True,
-        debug=False
-    )
-    vat_data = plenty.plenty_api_get_vat_id_mappings()
-    mapping = add_vat_data_to_mappings(mapping=mapping, vat_data=vat_data)
-
-    for country in mapping['countries']:
-        for referrer in mapping['referrer']:
-            logger.info(f"Load... country [{country}] referrer [{referrer}]")
-            orders = plenty.plenty_api_get_orders_by_date(
-                start=args.start_date,
-                end=args.end_date,
-                date_type='Payment',
-                additional=['documents', 'location'],
-                refine={
-                    'countryId': mapping['countries'][country]['country_id'],
-                    'referrerId': referrer,
-                    'orderType': '1,4',
-                },
-            )
-            all_orders += orders
-
-    filtered_data = taxhub.filter_data(data=all_orders, mapping=mapping)
+    if args.from_archive:
+        parquet_path = ''
+        if args.parquet:
+            parquet_path = get_parquet_path(out_path=out_path)
+        report_from_archive(args=args, mapping=mapping, out_path=out_path,
+                            parquet_path=parquet_path)
+        return
 
-    filtered_data.to_csv(out_path, index=False, header=True)
-    logger.info(f"Report written to [{out_path}]")
+    configure_transport(args=args)
+    plenty = login(mapping=mapping)
+    try:
+        if args.periods:
+            generate_period_reports(args=args, plenty=plenty,
+                                    mapping=mapping, out_path=out_path,
+                                    vat_data=vat_data,
+                                    config_path=config_path)
+        else:
+            generate_report(args=args, plenty=plenty, mapping=mapping,
+                            out_path=out_path, vat_data=vat_data,
+                            config_path=config_path)
+    except fetch.FetchError as err:
+        logger.error(f"Fetching orders failed: {err}")
+        sys.exit(1)
+    write_profile(args=args, out_path=out_path)
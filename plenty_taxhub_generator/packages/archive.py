@@ -0,0 +1,141 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Archive of the raw responses of a run, a gzip compressed file with one
+JSON document per line (NDJSON):
+    {"type": "meta", ...}       -   version, date range and fetch key
+    {"type": "vat", "data": {}} -   response of the VAT mapping request
+    {"type": "order", "data": {}}   -   one line per order
+"""
+
+import datetime
+import gzip
+import json
+import os
+
+ARCHIVE_VERSION = 1
+COMPRESS_LEVEL = 6
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveWriter:
+    """
+    Write the archive to a temporary file next to @path, which replaces
+    the archive at @path only after `commit`, so that a failed run doesn't
+    overwrite the archive of a previous run.
+    """
+    def __init__(self, path: str, meta: dict, vat_data: dict):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.count = 0
+        self.stream = gzip.open(self.tmp_path, mode='wt', encoding='utf-8',
+                                compresslevel=COMPRESS_LEVEL)
+        header = dict(meta, type='meta', version=ARCHIVE_VERSION,
+                      created=datetime.datetime.now().isoformat())
+        self.write_line(header)
+        self.write_line({'type': 'vat', 'data': vat_data})
+
+    def write_line(self, document: dict) -> None:
+        self.stream.write(json.dumps(document, separators=(',', ':')))
+        self.stream.write('\n')
+
+    def write_orders(self, orders) -> None:
+        for order in orders:
+            self.write_line({'type': 'order', 'data': order})
+            self.count += 1
+
+    def tee(self, orders):
+        """Archive the orders of a generator, while they are consumed."""
+        for order in orders:
+            self.write_line({'type': 'order', 'data': order})
+            self.count += 1
+            yield order
+
+    def commit(self) -> None:
+        self.stream.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self) -> None:
+        self.stream.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def write_archive(path: str, meta: dict, vat_data: dict,
+                  orders: list) -> int:
+    """
+    Archive the VAT mapping and the orders of a run.
+
+    Parameter:
+        path [str]          -   location of the archive
+        meta [dict]         -   description of the run (date range, ...)
+        vat_data [dict]     -   response of the VAT mapping request
+        orders [list]       -   orders in JSON format
+
+    Return:
+        [int]               -   amount of archived orders
+    """
+    writer = ArchiveWriter(path=path, meta=meta, vat_data=vat_data)
+    try:
+        writer.write_orders(orders=orders)
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+    return writer.count
+
+
+def read_archive(path: str) -> tuple:
+    """
+    Open an archive, the orders are read line by line while the returned
+    generator is consumed.
+
+    Parameter:
+        path [str]          -   location of the archive
+
+    Return:
+        [tuple]             -   meta data [dict], VAT mapping [dict] and
+                                orders [Generator]
+    """
+    try:
+        stream = gzip.open(path, mode='rt', encoding='utf-8')
+        meta = json.loads(stream.readline())
+        vat = json.loads(stream.readline())
+    except (OSError, ValueError) as err:
+        raise ArchiveError(f"Invalid archive [{path}]: {err}") from err
+    if meta.get('type') != 'meta' or vat.get('type') != 'vat':
+        stream.close()
+        raise ArchiveError(f"Invalid archive [{path}]: missing header")
+    if meta.get('version') != ARCHIVE_VERSION:
+        stream.close()
+        raise ArchiveError(f"Unsupported version [{meta.get('version')}] "
+                           f"of archive [{path}]")
+
+    def iter_orders():
+        with stream:
+            for line in stream:
+                document = json.loads(line)
+                if document['type'] == 'order':
+                    yield document['data']
+
+    return (meta, vat['data'], iter_orders())
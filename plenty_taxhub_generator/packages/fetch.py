@@ -0,0 +1,524 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from loguru import logger
+
+import plenty_taxhub_generator.packages.profiler as profiler
+import plenty_taxhub_generator.packages.transport as transport
+
+FETCH_MODES = ['matrix', 'sweep']
+DELIVERY_ADDRESS_TYPE = 2
+BILLING_ADDRESS_TYPE = 1
+ORDER_ROUTE = '/rest/orders'
+THROTTLE_DELAY = 3
+
+
+class FetchError(Exception):
+    """A request for orders from PlentyMarkets failed."""
+
+
+def build_fetch_tasks(mapping: dict) -> list:
+    """
+    Create the list of (country, referrer) combinations, that have to be
+    requested from PlentyMarkets, in the order of the configuration.
+
+    Parameter:
+        mapping [dict]  -   data from the configuration and plenty VAT data
+
+    Return:
+        [list]          -   tuples of country abbreviation and referrer ID
+    """
+    return [
+        (country, referrer)
+        for country in mapping['countries']
+        for referrer in mapping['referrer']
+    ]
+
+
+def convert_orders(orders: list, convert=None) -> list:
+    """
+    Apply @convert to each order of a response in place, so that the
+    order in JSON format is released as soon as it is converted.
+
+    Parameter:
+        orders [list]       -   orders in JSON format
+        convert [callable]  -   e.g. `taxhub.OrderRecord`, None keeps the
+                                orders in JSON format
+
+    Return:
+        [list]              -   the same list with the converted orders
+    """
+    if convert:
+        for (index, order) in enumerate(orders):
+            orders[index] = convert(order)
+    return orders
+
+
+def fetch_task_orders(plenty, start: str, end: str, mapping: dict,
+                      task: tuple, convert=None) -> list:
+    """
+    Pull all sales orders and refunds paid within the date range for a
+    single country and referrer.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        task [tuple]        -   country abbreviation and referrer ID
+        convert [callable]  -   applied to each order of the response,
+                                see `convert_orders`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    (country, referrer) = task
+    logger.info(f"Load... country [{country}] referrer [{referrer}]")
+    with profiler.get_profiler().stage(
+            f"fetch [{country}] [{referrer}]") as record:
+        orders = plenty.plenty_api_get_orders_by_date(
+            start=start,
+            end=end,
+            date_type='Payment',
+            additional=['documents', 'location'],
+            refine={
+                'countryId': mapping['countries'][country]['country_id'],
+                'referrerId': referrer,
+                'orderType': '1,4',
+            },
+        )
+        if orders is None:
+            raise FetchError(f"Request failed for country [{country}] "
+                             f"referrer [{referrer}] from [{start}] to "
+                             f"[{end}]")
+        record['orders'] = len(orders)
+    return convert_orders(orders=orders, convert=convert)
+
+
+def fetch_orders(plenty, start: str, end: str, mapping: dict,
+                 jobs: int = 1, new_bucket=list, convert=None) -> list:
+    """
+    Pull the orders for every (country, referrer) combination, with up to
+    @jobs requests running at the same time.
+    The result is merged in the order of the configuration, regardless of
+    which request finished first, so that the report stays reproducible.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        jobs [int]          -   maximum amount of concurrent requests
+        new_bucket [callable] - creates the list of the result, e.g.
+                                `spill.MemoryBudget.new_list`
+        convert [callable]  -   applied to each order as soon as its
+                                response arrives, e.g. `taxhub.OrderRecord`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    tasks = build_fetch_tasks(mapping=mapping)
+    all_orders = new_bucket()
+
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            all_orders.extend(fetch_task_orders(plenty=plenty, start=start,
+                                                end=end, mapping=mapping,
+                                                task=task, convert=convert))
+        return all_orders
+
+    buckets = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(fetch_task_orders, plenty=plenty, start=start,
+                            end=end, mapping=mapping, task=task,
+                            convert=convert): index
+            for (index, task) in enumerate(tasks)
+        }
+        # move each response into its bucket as soon as it arrives, instead
+        # of keeping all responses until the earlier tasks are finished
+        for future in as_completed(futures):
+            index = futures.pop(future)
+            buckets[index] = new_bucket()
+            buckets[index].extend(future.result())
+
+    for bucket in buckets:
+        all_orders.extend(bucket)
+        bucket.clear()
+    return all_orders
+
+
+def get_delivery_country_id(order: dict) -> str:
+    """
+    Find the PlentyMarkets country ID of the delivery address, which is
+    the country the API uses for the `countryId` filter. Orders without
+    a delivery address are delivered to the billing address.
+
+    Parameter:
+        order [dict]        -   full order from the API JSON response
+                                (requested with the `addresses` addition)
+
+    Return:
+        [str]               -   country ID or an empty string
+    """
+    if not order.get('addressRelations') or not order.get('addresses'):
+        return ''
+
+    address_ids = {}
+    for relation in order['addressRelations']:
+        address_ids[relation['typeId']] = relation['addressId']
+
+    for address_type in [DELIVERY_ADDRESS_TYPE, BILLING_ADDRESS_TYPE]:
+        if address_type not in address_ids:
+            continue
+        for address in order['addresses']:
+            if address['id'] == address_ids[address_type]:
+                return str(address['countryId'])
+    return ''
+
+
+def build_task_lookup(mapping: dict):
+    """
+    Create a function, which finds the (country, referrer) combination of
+    the configuration for an order requested with the `addresses` addition.
+
+    Parameter:
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+
+    Return:
+        [Callable]          -   returns the task tuple or None for orders
+                                outside of the configuration
+    """
+    country_map = {
+        mapping['countries'][country]['country_id']: country
+        for country in mapping['countries']
+    }
+    all_referrer = 'ALL' in mapping['referrer']
+    referrer_map = {}
+    for referrer in mapping['referrer']:
+        if referrer == 'ALL':
+            continue
+        referrer_map.setdefault(float(referrer), referrer)
+
+    def get_order_task(order: dict):
+        country = country_map.get(get_delivery_country_id(order=order))
+        if not country:
+            return None
+        if all_referrer:
+            return (country, 'ALL')
+        referrer = referrer_map.get(float(order['referrerId']))
+        if referrer is None:
+            return None
+        return (country, referrer)
+
+    return get_order_task
+
+
+def split_by_task(orders, mapping: dict, new_bucket=list,
+                  convert=None) -> list:
+    """
+    Sort the orders of a single request into the (country, referrer)
+    combinations of the configuration and drop every order outside of
+    them.
+
+    Parameter:
+        orders [Iterable]   -   orders in JSON format
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        new_bucket [callable] - creates the list of each combination
+        convert [callable]  -   applied to each kept order, after its
+                                combination is found, e.g.
+                                `taxhub.OrderRecord`
+
+    Return:
+        [list]              -   list of orders for each combination of
+                                `build_fetch_tasks`
+    """
+    tasks = build_fetch_tasks(mapping=mapping)
+    buckets = {task: new_bucket() for task in tasks}
+    get_order_task = build_task_lookup(mapping=mapping)
+
+    for order in orders:
+        task = get_order_task(order)
+        if task:
+            buckets[task].append(convert(order) if convert else order)
+    return [buckets[task] for task in tasks]
+
+
+def partition_orders(orders, mapping: dict, new_bucket=list,
+                     convert=None) -> list:
+    """
+    Sort the orders of a single request into the (country, referrer)
+    combinations of the configuration and drop every order outside of
+    them. The orders are returned in the same sequence as the requests of
+    the matrix mode would have returned them.
+
+    Parameter:
+        orders [Iterable]   -   orders in JSON format
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        new_bucket [callable] - creates the list of each combination and
+                                of the result
+        convert [callable]  -   see `split_by_task`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    buckets = split_by_task(orders=orders, mapping=mapping,
+                            new_bucket=new_bucket, convert=convert)
+    all_orders = new_bucket()
+    for bucket in buckets:
+        all_orders.extend(bucket)
+        bucket.clear()
+    return all_orders
+
+
+def request_sweep(plenty, start: str, end: str) -> list:
+    """
+    Pull all sales orders and refunds paid within the date range with a
+    single request, with the addresses required to partition them.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+
+    Return:
+        [list]              -   orders in JSON format
+    """
+    logger.info(f"Load... all orders from [{start}] to [{end}]")
+    with profiler.get_profiler().stage('fetch sweep') as record:
+        orders = plenty.plenty_api_get_orders_by_date(
+            start=start,
+            end=end,
+            date_type='Payment',
+            additional=['documents', 'location', 'addresses'],
+            refine={'orderType': '1,4'},
+        )
+        if orders is None:
+            raise FetchError(f"Request failed from [{start}] to [{end}]")
+        record['orders'] = len(orders)
+    return orders
+
+
+def sweep_orders(plenty, start: str, end: str, mapping: dict,
+                 new_bucket=list, convert=None) -> list:
+    """
+    Pull all sales orders and refunds paid within the date range with a
+    single request and filter them locally by the configured countries and
+    referrers.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        new_bucket [callable] - see `partition_orders`
+        convert [callable]  -   see `split_by_task`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    orders = request_sweep(plenty=plenty, start=start, end=end)
+    return partition_orders(orders=orders, mapping=mapping,
+                            new_bucket=new_bucket, convert=convert)
+
+
+def fetch_task_buckets(plenty, start: str, end: str, mapping: dict,
+                       fetch_mode: str = 'matrix') -> list:
+    """
+    Pull the orders for the date range with the chosen fetch mode, kept
+    apart for each (country, referrer) combination, so that the results
+    of multiple date ranges can be merged in the order of the
+    configuration.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        fetch_mode [str]    -   one of FETCH_MODES
+
+    Return:
+        [list]              -   list of orders for each combination of
+                                `build_fetch_tasks`
+    """
+    if fetch_mode == 'sweep':
+        return split_by_task(
+            orders=request_sweep(plenty=plenty, start=start, end=end),
+            mapping=mapping)
+    return [fetch_task_orders(plenty=plenty, start=start, end=end,
+                              mapping=mapping, task=task)
+            for task in build_fetch_tasks(mapping=mapping)]
+
+
+def fetch_range(plenty, start: str, end: str, mapping: dict,
+                fetch_mode: str = 'matrix', jobs: int = 1,
+                new_bucket=list, convert=None) -> list:
+    """
+    Pull the orders for the date range with the chosen fetch mode.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        fetch_mode [str]    -   one of FETCH_MODES
+        jobs [int]          -   maximum amount of concurrent requests
+        new_bucket [callable] - creates the lists holding the orders, e.g.
+                                `spill.MemoryBudget.new_list`
+        convert [callable]  -   applied to each order as soon as it is
+                                fetched, e.g. `taxhub.OrderRecord`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    if fetch_mode == 'sweep':
+        return sweep_orders(plenty=plenty, start=start, end=end,
+                            mapping=mapping, new_bucket=new_bucket,
+                            convert=convert)
+    return fetch_orders(plenty=plenty, start=start, end=end, mapping=mapping,
+                        jobs=jobs, new_bucket=new_bucket, convert=convert)
+
+
+def request_page(plenty, endpoint: str, query: dict) -> dict:
+    """
+    Send a single GET request with the token of the API client through the
+    shared transport and retry the request while PlentyMarkets throttles it.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        endpoint [str]      -   full URL of the route
+        query [dict]        -   parameters of the request
+
+    Return:
+        [dict]              -   response body
+    """
+    session = transport.get_transport()
+    while True:
+        response = session.get(endpoint, headers=plenty.creds, params=query)
+        if response.status_code != 429:
+            break
+        logger.warning("Request throttled, limit for subscription reached")
+        time.sleep(THROTTLE_DELAY)
+
+    try:
+        body = response.json()
+    except ValueError as err:
+        raise FetchError(f"No valid response for [{endpoint}]") from err
+    if isinstance(body, dict) and 'error' in body:
+        raise FetchError(f"Request failed:\n{body['error']}")
+    return body
+
+
+def iter_order_pages(plenty, start: str, end: str, date_type: str,
+                     additional: list, refine: dict):
+    """
+    Request orders within the date range page by page, so that a page
+    can be processed before the next page is requested.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        date_type [str]     -   {Creation, Change, Payment, Delivery}
+        additional [list]   -   Additional arguments for the query
+        refine [dict]       -   Apply filters to the request
+
+    Return:
+        [Generator]         -   lists of orders in JSON format
+    """
+    import plenty_api.utils
+
+    date_range = plenty_api.utils.build_date_range(start=start, end=end)
+    if not date_range:
+        raise FetchError(f"Invalid range {start} -> {end}")
+    query = plenty_api.utils.build_query_date(date_range=date_range,
+                                              date_type=date_type)
+    query = plenty_api.utils.sanity_check_parameter(
+        domain='order', query=query, refine=refine, additional=additional)
+    endpoint = plenty.url + ORDER_ROUTE
+
+    page = 1
+    while True:
+        query['page'] = page
+        response = request_page(plenty=plenty, endpoint=endpoint,
+                                query=query)
+        yield response['entries']
+        if response['isLastPage']:
+            break
+        page += 1
+
+
+def iter_orders(plenty, start: str, end: str, mapping: dict,
+                fetch_mode: str = 'matrix'):
+    """
+    Pull the orders for the date range with the chosen fetch mode and hand
+    them out as soon as each page arrives.
+    In the sweep mode the orders keep the sequence of the API response, as
+    sorting them into the matrix sequence would require the whole period.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        fetch_mode [str]    -   one of FETCH_MODES
+
+    Return:
+        [Generator]         -   orders in JSON format
+    """
+    if fetch_mode == 'sweep':
+        get_order_task = build_task_lookup(mapping=mapping)
+        logger.info(f"Load... all orders from [{start}] to [{end}]")
+        pages = iter_order_pages(
+            plenty=plenty, start=start, end=end, date_type='Payment',
+            additional=['documents', 'location', 'addresses'],
+            refine={'orderType': '1,4'})
+        orders = (order for page in pages for order in page)
+        for order in profiler.get_profiler().wrap_iter('fetch sweep', orders):
+            if get_order_task(order):
+                yield order
+        return
+
+    for (country, referrer) in build_fetch_tasks(mapping=mapping):
+        logger.info(f"Load... country [{country}] referrer [{referrer}]")
+        pages = iter_order_pages(
+            plenty=plenty, start=start, end=end, date_type='Payment',
+            additional=['documents', 'location'],
+            refine={
+                'countryId': mapping['countries'][country]['country_id'],
+                'referrerId': referrer,
+                'orderType': '1,4',
+            })
+        orders = (order for page in pages for order in page)
+        yield from profiler.get_profiler().wrap_iter(
+            f"fetch [{country}] [{referrer}]", orders)
@@ -0,0 +1,122 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Compact set of order IDs, used to skip duplicate orders of large periods.
+The IDs are split into blocks of 65536 consecutive IDs, each block keeps
+its IDs as sorted array of 16 bit offsets and changes to a bitmap of
+8 KiB when it gets dense, which costs at most 2 bytes per ID instead of
+the roughly 60 bytes of an int within a set.
+"""
+
+import array
+import bisect
+
+BLOCK_BITS = 16
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+BITMAP_SIZE = (1 << BLOCK_BITS) // 8
+# a sorted block needs 2 bytes per ID, beyond this size the bitmap is smaller
+MAX_ARRAY_SIZE = BITMAP_SIZE // 2
+
+
+class OrderIdSet:
+    """
+    Set of non-negative integer IDs, other values are kept in a plain set.
+    """
+    __slots__ = ('blocks', 'other', 'count')
+
+    def __init__(self, ids=()):
+        self.blocks = {}
+        self.other = set()
+        self.count = 0
+        for order_id in ids:
+            self.add(order_id)
+
+    def __len__(self) -> int:
+        return self.count + len(self.other)
+
+    def __contains__(self, order_id) -> bool:
+        if type(order_id) is not int or order_id < 0:
+            return order_id in self.other
+        block = self.blocks.get(order_id >> BLOCK_BITS)
+        if block is None:
+            return False
+        offset = order_id & BLOCK_MASK
+        if type(block) is bytearray:
+            return bool(block[offset >> 3] & (1 << (offset & 7)))
+        index = bisect.bisect_left(block, offset)
+        return index < len(block) and block[index] == offset
+
+    def add(self, order_id) -> bool:
+        """
+        Add an ID to the set.
+
+        Parameter:
+            order_id [int]      -   ID of an order
+
+        Return:
+            [bool]              -   True if the ID was not part of the set
+        """
+        if type(order_id) is not int or order_id < 0:
+            if order_id in self.other:
+                return False
+            self.other.add(order_id)
+            return True
+        key = order_id >> BLOCK_BITS
+        offset = order_id & BLOCK_MASK
+        block = self.blocks.get(key)
+        if block is None:
+            self.blocks[key] = array.array('H', [offset])
+            self.count += 1
+            return True
+        if type(block) is bytearray:
+            mask = 1 << (offset & 7)
+            if block[offset >> 3] & mask:
+                return False
+            block[offset >> 3] |= mask
+            self.count += 1
+            return True
+        index = bisect.bisect_left(block, offset)
+        if index < len(block) and block[index] == offset:
+            return False
+        if index == len(block):
+            block.append(offset)  # IDs mostly arrive in ascending order
+        else:
+            block.insert(index, offset)
+        if len(block) > MAX_ARRAY_SIZE:
+            self.blocks[key] = to_bitmap(block=block)
+        self.count += 1
+        return True
+
+    def memory_size(self) -> int:
+        """Approximate size of the blocks in bytes."""
+        size = 0
+        for block in self.blocks.values():
+            if type(block) is bytearray:
+                size += len(block)
+            else:
+                size += block.itemsize * len(block)
+        return size
+
+
+def to_bitmap(block: array.array) -> bytearray:
+    bitmap = bytearray(BITMAP_SIZE)
+    for offset in block:
+        bitmap[offset >> 3] |= 1 << (offset & 7)
+    return bitmap
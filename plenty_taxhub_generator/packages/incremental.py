@@ -0,0 +1,230 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Incremental regeneration of a report: the state of the previous run keeps
+the type and the `updatedAt` timestamp of each order together with its
+row, so that only the rows of changed orders are built again.
+Each run writes a delta of the TransactionIds added, changed or removed
+since the previous report.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+
+from loguru import logger
+
+import plenty_taxhub_generator.packages.taxhub as taxhub
+
+STATE_VERSION = 2
+# columns compared between the runs, the position depends on other orders
+VALUE_INDICES = [index for (index, _) in taxhub.ROW_FIELDS
+                 if index != taxhub.POSITION_INDEX]
+DOCUMENT_VALUE = VALUE_INDICES.index(taxhub.tax_columns.index('DocumentId'))
+DELIVERY_VALUE = VALUE_INDICES.index(
+    taxhub.tax_columns.index('DepatureDate'))
+
+
+def get_fingerprint(value) -> str:
+    return hashlib.blake2b(repr(value).encode('utf-8'),
+                           digest_size=12).hexdigest()
+
+
+def get_order_fingerprint(entry, order_type: str) -> str:
+    """
+    Describe the state of an order without extracting its values,
+    PlentyMarkets updates the `updatedAt` timestamp of an order with every
+    change. Orders without the timestamp are always built again.
+
+    Parameter:
+        entry [dict]        -   order in JSON format or its OrderRecord
+        order_type [str]    -   value of the KindOfBusiness column
+
+    Return:
+        [str]               -   empty string without a timestamp
+    """
+    if isinstance(entry, taxhub.OrderRecord):
+        updated_at = entry.updated_at
+    else:
+        updated_at = entry.get('updatedAt', '')
+    if not updated_at:
+        return ''
+    return f"{order_type};{updated_at}"
+
+
+def get_mapping_key(mapping: dict) -> str:
+    """
+    Fingerprint of the mapping, a changed mapping changes the rows of
+    unchanged orders.
+    """
+    relevant = {key: value for (key, value) in mapping.items()
+                if key != 'url'}
+    return get_fingerprint(json.dumps(relevant, sort_keys=True, default=str))
+
+
+class ReportState:
+    """
+    Rows of the previous and the current run of a report, identified by
+    their TransactionId.
+    """
+    def __init__(self, path: str, mapping: dict):
+        self.path = path
+        self.mapping = mapping
+        self.mapping_key = get_mapping_key(mapping=mapping)
+        self.previous = {}
+        self.previous_created = ''
+        self.previous_rows_valid = False
+        self.current = {}
+        self.reused = 0
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, mode='rt', encoding='utf-8') as state:
+                data = json.load(state)
+        except (OSError, ValueError) as err:
+            logger.warning(f"Ignoring invalid report state [{self.path}]: "
+                           f"{err}")
+            return
+        if data.get('version') != STATE_VERSION:
+            return
+        self.previous = data['orders']
+        self.previous_created = data['created']
+        self.previous_rows_valid = data['mapping_key'] == self.mapping_key
+        if not self.previous_rows_valid:
+            logger.info("The mapping changed since the previous report, "
+                        "all rows are built again.")
+
+    def iter_rows(self, data):
+        """
+        Build the rows of the report like `taxhub.iter_rows`, rows of
+        orders with an unchanged fingerprint are taken from the previous
+        run, without extracting the values of the order.
+
+        Parameter:
+            data [Iterable] -   API data in JSON format or OrderRecords
+
+        Return:
+            [Generator]     -   lists with the values of the tax_columns
+        """
+        reuse = self.previous_rows_valid
+        no_delivery = []
+        no_document = []
+        position = 1
+        for entry in taxhub.iter_unique_orders(data=data):
+            type_id = taxhub.get_order_type_id(entry=entry)
+            order_type = taxhub.get_order_type(value=type_id)
+            if not order_type:
+                continue
+            order_id = taxhub.get_order_id(entry=entry)
+            transaction_id = str(order_id)
+            fingerprint = get_order_fingerprint(entry=entry,
+                                                order_type=order_type)
+            cached = None
+            if reuse and fingerprint:
+                cached = self.previous.get(transaction_id)
+
+            if cached and cached[0] == fingerprint:
+                values = cached[1]
+                frame_row = taxhub.ROW_TEMPLATE.copy()
+                for (index, value) in zip(VALUE_INDICES, values):
+                    frame_row[index] = value
+                frame_row[taxhub.POSITION_INDEX] = str(position)
+                if not values[DOCUMENT_VALUE]:
+                    no_document.append(order_id)
+                if not values[DELIVERY_VALUE] and type_id == 1:
+                    no_delivery.append(order_id)
+                self.reused += 1
+            else:
+                frame_row = taxhub.build_row(
+                    entry=entry, mapping=self.mapping, position=position,
+                    no_document=no_document, no_delivery=no_delivery)
+                if frame_row is None:
+                    continue
+                values = [frame_row[index] for index in VALUE_INDICES]
+
+            self.current[transaction_id] = [fingerprint, values]
+            position += 1
+            yield frame_row
+
+        taxhub.log_missing_data(no_document=no_document,
+                                no_delivery=no_delivery)
+
+    def build_delta(self) -> dict:
+        """
+        Compare the rows of the current run with the previous run.
+
+        Return:
+            [dict]          -   sorted TransactionIds of the added, changed
+                                and removed rows
+        """
+        def sort(ids):
+            return sorted(ids, key=lambda x: (len(x), x))
+
+        changed = [
+            transaction_id for (transaction_id, entry) in self.current.items()
+            if transaction_id in self.previous and
+            self.previous[transaction_id][1] != entry[1]
+        ]
+        return {
+            'previous': self.previous_created,
+            'added': sort(set(self.current) - set(self.previous)),
+            'changed': sort(changed),
+            'removed': sort(set(self.previous) - set(self.current)),
+        }
+
+    def save(self) -> None:
+        """Keep the rows of the current run for the next run."""
+        tmp_path = self.path + '.tmp'
+        with gzip.open(tmp_path, mode='wt', encoding='utf-8') as state:
+            json.dump({
+                'version': STATE_VERSION,
+                'created': datetime.datetime.now().isoformat(),
+                'mapping_key': self.mapping_key,
+                'orders': self.current,
+            }, state, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+
+def write_delta(state: ReportState, path: str) -> dict:
+    """
+    Write the delta against the previous report as JSON and keep the
+    current state for the next run.
+
+    Parameter:
+        state [ReportState] -   state after all rows were written
+        path [str]          -   location of the delta file
+
+    Return:
+        [dict]              -   the delta
+    """
+    delta = state.build_delta()
+    with open(path, mode='w', encoding='utf-8') as delta_file:
+        json.dump(delta, delta_file, indent=2)
+    state.save()
+    logger.info(f"Delta written to [{path}]: {len(delta['added'])} added, "
+                f"{len(delta['changed'])} changed, "
+                f"{len(delta['removed'])} removed, "
+                f"{state.reused} rows reused")
+    return delta
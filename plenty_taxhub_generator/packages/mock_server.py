@@ -0,0 +1,319 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Local stand-in for the PlentyMarkets REST API, serving synthetic orders
+through the login, VAT and order search routes used by the generator.
+
+Usage:
+    python3 -m plenty_taxhub_generator.packages.mock_server --orders 100000
+        --latency 0.05 [--certfile cert.pem --keyfile key.pem]
+"""
+
+import argparse
+import gzip
+import json
+import ssl
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dateutil.parser
+
+import plenty_taxhub_generator.packages.fetch as fetch
+import plenty_taxhub_generator.packages.synthetic as synthetic
+
+MOCK_TOKEN = 'mock-token'
+ITEMS_PER_PAGE = 50
+DATE_FILTERS = {
+    'created': lambda order: order['createdAt'],
+    'paid': lambda order: next(
+        (x['date'] for x in order['dates'] if x['typeId'] == 3), ''),
+    'updated': lambda order: order['updatedAt'],
+}
+
+
+def build_order_index(orders: list) -> list:
+    """
+    Precompute the values of every order used by the search filters.
+
+    Parameter:
+        orders [list]       -   orders in JSON format
+
+    Return:
+        [list]              -   tuples of the filter values and the order
+    """
+    index = []
+    for order in sorted(orders, key=lambda x: x['id']):
+        dates = {}
+        for (name, get_date) in DATE_FILTERS.items():
+            date = get_date(order)
+            dates[name] = dateutil.parser.parse(date) if date else None
+        values = {
+            'dates': dates,
+            'countryId': fetch.get_delivery_country_id(order=order),
+            'referrerId': float(order['referrerId']),
+            'typeId': str(order['typeId']),
+        }
+        index.append((values, order))
+    return index
+
+
+def filter_orders(index: list, query: dict) -> list:
+    """
+    Apply the filters of an order search request.
+
+    Parameter:
+        index [list]        -   result of `build_order_index`
+        query [dict]        -   parameters of the request, single values
+
+    Return:
+        [list]              -   matching orders, sorted by ID
+    """
+    checks = []
+    for name in DATE_FILTERS:
+        for (suffix, compare) in [('AtFrom', lambda x, y: x >= y),
+                                  ('AtTo', lambda x, y: x <= y)]:
+            if name + suffix in query:
+                limit = dateutil.parser.parse(query[name + suffix])
+                checks.append(
+                    lambda values, name=name, limit=limit, compare=compare:
+                    values['dates'][name] is not None and
+                    compare(values['dates'][name], limit))
+    if 'countryId' in query:
+        checks.append(lambda values: values['countryId'] == query['countryId'])
+    if 'referrerId' in query and query['referrerId'] != 'ALL':
+        referrer = float(query['referrerId'])
+        checks.append(lambda values: values['referrerId'] == referrer)
+    if 'orderType' in query:
+        order_types = query['orderType'].split(',')
+        checks.append(lambda values: values['typeId'] in order_types)
+
+    return [order for (values, order) in index
+            if all(check(values) for check in checks)]
+
+
+def paginate(entries: list, page: int, items_per_page: int) -> dict:
+    """
+    Wrap a page of the entries into the paginated response format of the
+    PlentyMarkets REST API.
+
+    Parameter:
+        entries [list]      -   all entries of the request
+        page [int]          -   requested page, starting at 1
+        items_per_page [int]-   maximum amount of entries per page
+
+    Return:
+        [dict]              -   response body
+    """
+    last_page = max((len(entries) - 1) // items_per_page + 1, 1)
+    first = (page - 1) * items_per_page
+    return {
+        'page': page,
+        'totalsCount': len(entries),
+        'isLastPage': page >= last_page,
+        'lastPageNumber': last_page,
+        'firstOnPage': first + 1,
+        'lastOnPage': min(first + items_per_page, len(entries)),
+        'itemsPerPage': items_per_page,
+        'entries': entries[first:first + items_per_page],
+    }
+
+
+class MockPlentyHandler(BaseHTTPRequestHandler):
+    """
+    Answer the login, VAT and order search routes, with persistent
+    connections and gzip compressed responses for clients accepting them.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status: int = 200) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.count_bytes(len(payload))
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        if urllib.parse.urlparse(self.path).path != '/rest/login':
+            self.send_json({'error': {'message': 'Not found'}}, status=404)
+            return
+        self.send_json({'token_type': 'Bearer', 'access_token': MOCK_TOKEN,
+                        'expires_in': 86400})
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urllib.parse.urlparse(self.path)
+        query = {
+            key: values[-1]
+            for (key, values) in urllib.parse.parse_qs(url.query).items()
+        }
+        if self.headers.get('Authorization') != f'Bearer {MOCK_TOKEN}':
+            self.send_json({'error': {'message': 'Unauthenticated.'}},
+                           status=401)
+            return
+        page = int(query.pop('page', 1))
+        items_per_page = int(query.pop('itemsPerPage',
+                                       self.server.items_per_page))
+
+        if url.path == '/rest/vat':
+            entries = self.server.vat_data
+        elif url.path == '/rest/orders':
+            entries = self.server.search(query=query)
+        else:
+            self.send_json({'error': {'message': 'Not found'}}, status=404)
+            return
+        self.send_json(paginate(entries=entries, page=page,
+                                items_per_page=items_per_page))
+
+
+class MockPlentyServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP(S) server holding the synthetic orders, the results of
+    each search are cached for the requests of the following pages.
+    The amount of requests, accepted connections and sent bytes of the
+    response bodies are counted.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, orders: list, latency: float = 0.0,
+                 items_per_page: int = ITEMS_PER_PAGE):
+        super().__init__(address, MockPlentyHandler)
+        self.latency = latency
+        self.items_per_page = items_per_page
+        self.vat_data = synthetic.build_vat_data()
+        self.index = build_order_index(orders=orders)
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def count_bytes(self, amount: int) -> None:
+        with self.lock:
+            self.bytes_sent += amount
+
+    def search(self, query: dict) -> list:
+        key = tuple(sorted((k, v) for (k, v) in query.items()
+                           if k != 'with[]'))
+        with self.lock:
+            self.requests += 1
+            orders = self.cache.get(key)
+        if orders is not None:
+            return orders
+        # concurrent requests are filtered in parallel, the first one wins
+        orders = filter_orders(index=self.index, query=query)
+        with self.lock:
+            return self.cache.setdefault(key, orders)
+
+    @property
+    def url(self) -> str:
+        scheme = 'https' if isinstance(self.socket, ssl.SSLSocket) else 'http'
+        (host, port) = self.server_address[:2]
+        return f'{scheme}://{host}:{port}'
+
+
+def create_server(orders: list, host: str = '127.0.0.1', port: int = 0,
+                  latency: float = 0.0, items_per_page: int = ITEMS_PER_PAGE,
+                  certfile: str = '', keyfile: str = '') -> MockPlentyServer:
+    """
+    Create the mock server, port 0 picks a free port.
+    With a certificate the server speaks HTTPS, which the plenty_api
+    client requires for its requests.
+
+    Parameter:
+        orders [list]       -   orders in JSON format
+        host [str]          -   address to bind to
+        port [int]          -   port to bind to
+        latency [float]     -   artificial delay of each request in seconds
+        items_per_page [int]-   default page size of paginated routes
+        certfile [str]      -   path to a PEM certificate
+        keyfile [str]       -   path to the private key of the certificate
+
+    Return:
+        [MockPlentyServer]
+    """
+    server = MockPlentyServer((host, port), orders=orders, latency=latency,
+                              items_per_page=items_per_page)
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=certfile, keyfile=keyfile or None)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def main():
+    p = argparse.ArgumentParser(prog='mock_server')
+    p.add_argument('--host', default='127.0.0.1', dest='host')
+    p.add_argument('--port', type=int, default=8443, dest='port')
+    p.add_argument('--orders', type=int, default=10000, dest='orders',
+                   help='Amount of distinct synthetic orders')
+    p.add_argument('--start', default='2020-09-01', dest='start',
+                   help='First day of the synthetic payment dates')
+    p.add_argument('--days', type=int, default=30, dest='days',
+                   help='Length of the synthetic period in days')
+    p.add_argument('--refund_ratio', type=float, default=0.1,
+                   dest='refund_ratio')
+    p.add_argument('--duplicate_ratio', type=float, default=0.0,
+                   dest='duplicate_ratio')
+    p.add_argument('--latency', type=float, default=0.0, dest='latency',
+                   help='Artificial delay of each request in seconds')
+    p.add_argument('--items_per_page', type=int, default=ITEMS_PER_PAGE,
+                   dest='items_per_page')
+    p.add_argument('--certfile', default='', dest='certfile')
+    p.add_argument('--keyfile', default='', dest='keyfile')
+    p.add_argument('--seed', type=int, default=0, dest='seed')
+    args = p.parse_args()
+
+    orders = list(synthetic.generate_orders(
+        count=args.orders, start=args.start, days=args.days,
+        refund_ratio=args.refund_ratio,
+        duplicate_ratio=args.duplicate_ratio, seed=args.seed))
+    server = create_server(
+        orders=orders, host=args.host, port=args.port, latency=args.latency,
+        items_per_page=args.items_per_page, certfile=args.certfile,
+        keyfile=args.keyfile)
+    print(f"Serving {len(orders)} orders at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{server.requests} order requests, {server.connections} "
+              f"connections, {server.bytes_sent} bytes sent")
+
+
+if __name__ == '__main__':
+    main()
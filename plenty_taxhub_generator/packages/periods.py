@@ -0,0 +1,194 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Reporting periods of a multi-period run, the orders of the union of all
+periods are requested once and distributed to the periods by their
+payment date.
+A period includes its start and excludes its end, like the date range of
+the --from and --to options.
+"""
+
+import collections
+import datetime
+
+import plenty_taxhub_generator.packages.store as store
+import plenty_taxhub_generator.packages.taxhub as taxhub
+
+PERIOD_LENGTHS = {'month': 1, 'quarter': 3, 'year': 12}
+PERIOD_SEPARATOR = '..'
+NAME_SEPARATORS = ['/', '\\']
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1)
+
+
+def get_period_name(start: datetime.date, length: str) -> str:
+    if length == 'month':
+        return start.strftime('%Y-%m')
+    if length == 'quarter':
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return str(start.year)
+
+
+def build_year_periods(year: int, lengths: list) -> list:
+    """
+    Split a year into periods of each of the given lengths.
+
+    Parameter:
+        year [int]          -   calendar year
+        lengths [list]      -   keys of PERIOD_LENGTHS
+
+    Return:
+        [list]              -   tuples of name, start and end
+                                {YYYY}-{MM}-{DD}
+    """
+    periods = []
+    for length in lengths:
+        start = datetime.date(year, 1, 1)
+        while start.year == year:
+            end = add_months(date=start, months=PERIOD_LENGTHS[length])
+            periods.append((get_period_name(start=start, length=length),
+                            start.isoformat(), end.isoformat()))
+            start = end
+    return periods
+
+
+def parse_period(value: str) -> tuple:
+    """
+    Read a period of the --periods option: [NAME=]START..END
+
+    Parameter:
+        value [str]         -   period from the command line
+
+    Return:
+        [tuple]             -   name, start and end, None if invalid
+    """
+    (name, _, period) = value.rpartition('=')
+    (start, separator, end) = period.partition(PERIOD_SEPARATOR)
+    if not separator or not store.normalize_date(date=start) or (
+            not store.normalize_date(date=end)):
+        return None
+    if store.normalize_date(date=start) >= store.normalize_date(date=end):
+        return None
+    # the name is part of the file name of the report
+    if any(x in name for x in NAME_SEPARATORS):
+        return None
+    if not name:
+        name = f"{start}_{end}"
+        for character in NAME_SEPARATORS + [':']:
+            name = name.replace(character, '-')
+    return (name, start, end)
+
+
+def get_duplicate_names(periods: list) -> list:
+    """
+    Find the names used by more than one period, whose reports would
+    overwrite each other.
+
+    Parameter:
+        periods [list]      -   tuples of name, start and end
+
+    Return:
+        [list]              -   sorted duplicate names
+    """
+    names = collections.Counter(name for (name, _, _) in periods)
+    return sorted(name for (name, count) in names.items() if count > 1)
+
+
+def merge_periods(periods: list) -> list:
+    """
+    Combine overlapping and adjacent periods into the date ranges, which
+    are requested from PlentyMarkets.
+
+    Parameter:
+        periods [list]      -   tuples of name, start and end
+
+    Return:
+        [list]              -   tuples of start and end
+    """
+    ranges = sorted(
+        (store.normalize_date(date=start), store.normalize_date(date=end),
+         start, end)
+        for (_, start, end) in periods
+    )
+    merged = []
+    for (start_key, end_key, start, end) in ranges:
+        if merged and start_key <= merged[-1][1]:
+            if end_key > merged[-1][1]:
+                merged[-1][1] = end_key
+                merged[-1][3] = end
+            continue
+        merged.append([start_key, end_key, start, end])
+    return [(start, end) for (_, _, start, end) in merged]
+
+
+def get_payment_date(entry) -> str:
+    """
+    Get the normalized payment date of an order in JSON format or of an
+    OrderRecord.
+
+    Parameter:
+        entry [dict]        -   order in JSON format or its OrderRecord
+
+    Return:
+        [str]               -   normalized date or an empty string
+    """
+    if isinstance(entry, taxhub.OrderRecord):
+        if not entry.payment_date:
+            return ''
+        return store.normalize_date(date=entry.payment_date)
+    return store.get_payment_date(order=entry)
+
+
+def bucket_orders(orders, periods: list, convert=None,
+                  new_bucket=list) -> dict:
+    """
+    Distribute the orders to each period containing their payment date,
+    in a single pass over the orders.
+
+    Parameter:
+        orders [Iterable]   -   API data in JSON format or OrderRecords
+        periods [list]      -   tuples of name, start and end
+        convert [callable]  -   applied once to each distributed order,
+                                e.g. `taxhub.OrderRecord`, None for
+                                orders which are already converted
+        new_bucket [callable] - creates the list of each period, e.g.
+                                `spill.MemoryBudget.new_list`
+
+    Return:
+        [dict]              -   list of orders for each period name
+    """
+    bounds = [(name, store.normalize_date(date=start),
+               store.normalize_date(date=end))
+              for (name, start, end) in periods]
+    buckets = {name: new_bucket() for (name, _, _) in bounds}
+    for order in orders:
+        paid_at = get_payment_date(entry=order)
+        if not paid_at:
+            continue
+        converted = None
+        for (name, start, end) in bounds:
+            if start <= paid_at < end:
+                if converted is None:
+                    converted = convert(order) if convert else order
+                buckets[name].append(converted)
+    return buckets
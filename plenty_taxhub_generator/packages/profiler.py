@@ -0,0 +1,126 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import contextlib
+import json
+import threading
+import time
+
+
+class Profiler:
+    """
+    Collect the wall time, the amount of calls and the amount of processed
+    orders for each stage of a run. A disabled profiler records nothing.
+    Stages can be nested, the time of a stage includes its inner stages.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def add(self, name: str, seconds: float, orders: int = 0,
+            calls: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            stage = self.stages.setdefault(
+                name, {'seconds': 0.0, 'calls': 0, 'orders': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+            stage['orders'] += orders
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Time the enclosed block, the yielded dict takes the amount of
+        processed orders under the key 'orders'.
+        """
+        record = {'orders': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(name=name, seconds=time.perf_counter() - start,
+                     orders=record['orders'])
+
+    def wrap_iter(self, name: str, iterable):
+        """
+        Time the production of each element of @iterable and count the
+        elements as processed orders.
+        """
+        if not self.enabled:
+            return iterable
+        return self.__timed_iter(name=name, iterable=iterable)
+
+    def __timed_iter(self, name: str, iterable):
+        iterator = iter(iterable)
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    element = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    break
+                seconds += time.perf_counter() - start
+                count += 1
+                yield element
+        finally:
+            self.add(name=name, seconds=seconds, orders=count)
+
+    def summary(self) -> dict:
+        with self.lock:
+            stages = {
+                name: {
+                    'seconds': round(stage['seconds'], 6),
+                    'calls': stage['calls'],
+                    'orders': stage['orders'],
+                    'orders_per_second': (
+                        round(stage['orders'] / stage['seconds'], 1)
+                        if stage['seconds'] and stage['orders'] else 0),
+                }
+                for (name, stage) in self.stages.items()
+            }
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 6),
+            'stages': stages,
+        }
+
+    def write(self, path: str) -> None:
+        with open(path, mode='w', encoding='utf-8') as profile_file:
+            json.dump(self.summary(), profile_file, indent=2)
+
+
+PROFILER = Profiler()
+
+
+def enable() -> Profiler:
+    """Replace the disabled default profiler with a recording one."""
+    global PROFILER
+    PROFILER = Profiler(enabled=True)
+    return PROFILER
+
+
+def get_profiler() -> Profiler:
+    return PROFILER
@@ -0,0 +1,245 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import csv
+import datetime
+import os
+import sys
+
+from plenty_taxhub_generator.packages.taxhub import tax_columns
+
+CHUNK_SIZE = 1000
+PARQUET_CHUNK_SIZE = 65536
+REPORT_BACKENDS = ['csv', 'pandas']
+STDOUT_PATH = '-'
+
+
+def write_csv(rows, stream) -> int:
+    """
+    Write the rows of the TaxHub report with the csv module, one row at a
+    time. The output is identical to `pandas.DataFrame.to_csv`.
+
+    Parameter:
+        rows [Iterable]     -   lists with the values of the tax_columns
+        stream [TextIO]     -   opened file or sys.stdout
+
+    Return:
+        [int]               -   amount of written rows
+    """
+    writer = csv.writer(stream, lineterminator=os.linesep)
+    writer.writerow(tax_columns)
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+    return written
+
+
+def write_pandas(rows, stream, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Write the rows of the TaxHub report in chunks of DataFrames, so that
+    only a single chunk of rows has to be kept in memory.
+
+    Parameter:
+        rows [Iterable]     -   lists with the values of the tax_columns
+        stream [TextIO]     -   opened file or sys.stdout
+        chunk_size [int]    -   amount of rows written at once
+
+    Return:
+        [int]               -   amount of written rows
+    """
+    import pandas
+
+    written = 0
+    chunk = []
+    header = True
+
+    def write_chunk(chunk: list, header: bool) -> None:
+        frame = pandas.DataFrame(chunk, columns=tax_columns)
+        frame.to_csv(stream, index=False, header=header)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk=chunk, header=header)
+            written += len(chunk)
+            header = False
+            chunk = []
+
+    if chunk or header:
+        write_chunk(chunk=chunk, header=header)
+        written += len(chunk)
+
+    return written
+
+
+def to_rate(value: str) -> float:
+    """Convert a VAT rate in the '{rate} %' format of the report."""
+    return float(value.rstrip(' %'))
+
+
+def to_date(value: str) -> datetime.date:
+    """Convert a date in the {DD}/{MM}/{YYYY} format of the report."""
+    return datetime.datetime.strptime(value, '%d/%m/%Y').date()
+
+
+# Typed columns of the Parquet export with the type name of pyarrow and
+# the conversion from the text value of the report, all other columns are
+# written as text. Empty values are written as null.
+PARQUET_TYPES = {
+    'Position-Nr.': ('int64', int),
+    'TransactionId': ('int64', int),
+    'DepatureDate': ('date32', to_date),
+    'ArrivalDate': ('date32', to_date),
+    'DocumentDate': ('date32', to_date),
+    'VatRate': ('float64', to_rate),
+    'VatAmount (in VatZoneCurrency)': ('float64', float),
+    'SourceZoneVatRate': ('float64', to_rate),
+    'SourceZoneGross': ('float64', float),
+    'SourceZoneNet': ('float64', float),
+    'TargetZoneVatRate': ('float64', to_rate),
+    'TargetZoneGross': ('float64', float),
+    'TargetZoneNet': ('float64', float),
+    'MarketZoneGross': ('float64', float),
+    'MarketZoneNet': ('float64', float),
+    # PlentyMarkets item quantities are floating point numbers
+    'ItemQuantity': ('float64', float),
+    'ItemSalesPrice': ('float64', float),
+    'ItemPurchasePrice': ('float64', float),
+    'ItemWeight': ('float64', float),
+    'PostingDateInvoice': ('date32', to_date),
+}
+
+
+def build_parquet_schema():
+    import pyarrow
+
+    fields = []
+    for column in tax_columns:
+        (type_name, _) = PARQUET_TYPES.get(column, ('string', str))
+        fields.append((column, getattr(pyarrow, type_name)()))
+    return pyarrow.schema(fields)
+
+
+def build_parquet_batch(chunk: list, schema):
+    """
+    Convert a chunk of report rows into a typed Arrow record batch.
+
+    Parameter:
+        chunk [list]        -   lists with the values of the tax_columns
+        schema [Schema]     -   result of `build_parquet_schema`
+
+    Return:
+        [RecordBatch]
+    """
+    import pyarrow
+
+    arrays = []
+    for (index, field) in enumerate(schema):
+        (_, convert) = PARQUET_TYPES.get(field.name, ('string', str))
+        values = [convert(row[index]) if row[index] != '' else None
+                  for row in chunk]
+        arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def tee_parquet(rows, path: str, chunk_size: int = PARQUET_CHUNK_SIZE):
+    """
+    Pass the rows through, while writing them to a compressed Parquet file
+    in chunks, so the report is written in both formats at the same time.
+    The file is created right away, so that a missing pyarrow installation
+    is reported before the CSV report is started.
+
+    Parameter:
+        rows [Iterable]     -   lists with the values of the tax_columns
+        path [str]          -   location of the Parquet file
+        chunk_size [int]    -   amount of rows per row group
+
+    Return:
+        [Generator]         -   the rows
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError as err:
+        raise RuntimeError("The Parquet export requires pyarrow, install "
+                           "it with `pip install pyarrow`.") from err
+
+    schema = build_parquet_schema()
+    writer = pyarrow.parquet.ParquetWriter(path, schema,
+                                           compression='zstd')
+
+    def iter_tee():
+        try:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    writer.write_batch(build_parquet_batch(chunk=chunk,
+                                                           schema=schema))
+                    chunk = []
+                yield row
+            if chunk:
+                writer.write_batch(build_parquet_batch(chunk=chunk,
+                                                       schema=schema))
+        finally:
+            writer.close()
+
+    return iter_tee()
+
+
+def write_report(rows, path: str, backend: str = 'csv',
+                 chunk_size: int = CHUNK_SIZE, parquet_path: str = '') -> int:
+    """
+    Write the rows of the TaxHub report to a CSV file or to the standard
+    output, while the rows are produced.
+
+    Parameter:
+        rows [Iterable]     -   lists with the values of the tax_columns
+        path [str]          -   location of the report, '-' for stdout
+        backend [str]       -   one of REPORT_BACKENDS
+        chunk_size [int]    -   amount of rows written at once by the
+                                pandas backend
+        parquet_path [str]  -   additionally write the rows to a Parquet
+                                file at this location (see `tee_parquet`)
+
+    Return:
+        [int]               -   amount of written rows
+    """
+    if parquet_path:
+        rows = tee_parquet(rows=rows, path=parquet_path)
+    if path == STDOUT_PATH:
+        stream = sys.stdout
+    else:
+        stream = open(path, mode='w', encoding='utf-8', newline='')
+
+    try:
+        if backend == 'pandas':
+            return write_pandas(rows=rows, stream=stream,
+                                chunk_size=chunk_size)
+        return write_csv(rows=rows, stream=stream)
+    finally:
+        if parquet_path:
+            rows.close()
+        if stream is sys.stdout:
+            stream.flush()
+        else:
+            stream.close()
+
@@ -0,0 +1,215 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import dateutil.parser
+from loguru import logger
+
+import plenty_taxhub_generator.packages.fetch as fetch
+import plenty_taxhub_generator.packages.idset as idset
+import plenty_taxhub_generator.packages.taxhub as taxhub
+
+WINDOW_SIZES = {'day': 1, 'week': 7}
+
+
+def split_date_range(start: str, end: str, window: str) -> list:
+    """
+    Split the date range into consecutive windows of a day or a week,
+    the last window ends at the end of the date range.
+
+    Parameter:
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        window [str]        -   size of a window: 'day' or 'week'
+
+    Return:
+        [list]              -   tuples of start and end date in
+                                {YYYY}-{MM}-{DD}T{HH}:{MM}:{SS} format
+    """
+    try:
+        window_start = dateutil.parser.parse(start)
+        range_end = dateutil.parser.parse(end)
+    except dateutil.parser._parser.ParserError:
+        logger.error(f"Invalid date range: {start} -> {end}")
+        return []
+
+    step = datetime.timedelta(days=WINDOW_SIZES[window])
+    windows = []
+    while window_start < range_end:
+        window_end = min(window_start + step, range_end)
+        windows.append((window_start.isoformat(), window_end.isoformat()))
+        window_start = window_end
+    return windows
+
+
+def get_checkpoint_key(mapping: dict, fetch_mode: str) -> str:
+    """
+    Describe the requests of a window, so that a checkpoint written for
+    different countries, referrers or fetch mode is not reused.
+
+    Parameter:
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        fetch_mode [str]    -   one of fetch.FETCH_MODES
+
+    Return:
+        [str]
+    """
+    countries = ','.join(
+        f"{country}={mapping['countries'][country]['country_id']}"
+        for country in mapping['countries']
+    )
+    referrer = ','.join(mapping['referrer'])
+    return f"{fetch_mode};{countries};{referrer}"
+
+
+def load_checkpoint(path: str, key: str) -> dict:
+    """
+    Read the finished windows from the checkpoint file, entries of an
+    interrupted write or a different configuration are ignored.
+
+    Parameter:
+        path [str]          -   location of the checkpoint file
+        key [str]           -   result of `get_checkpoint_key`
+
+    Return:
+        [dict]              -   orders of each finished window, a list
+                                for each (country, referrer) combination
+    """
+    finished = {}
+    if not os.path.exists(path):
+        return finished
+
+    with open(path, mode='r', encoding='utf-8') as checkpoint:
+        for line in checkpoint:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # entries of older versions hold a single list of orders
+            if entry.get('key') != key or 'tasks' not in entry:
+                continue
+            finished[(entry['start'], entry['end'])] = entry['tasks']
+    return finished
+
+
+def fetch_sharded(plenty, start: str, end: str, mapping: dict, window: str,
+                  checkpoint_path: str, fetch_mode: str = 'matrix',
+                  jobs: int = 1, new_bucket=list, convert=None) -> list:
+    """
+    Pull the orders of the date range window by window, with up to @jobs
+    windows requested at the same time. Every finished window is appended
+    to the checkpoint file, windows found within the checkpoint are not
+    requested again.
+    The orders are merged in the order of the configuration like an
+    unsharded request, window by window for each (country, referrer)
+    combination, so that the report doesn't depend on the window size.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        window [str]        -   size of a window: 'day' or 'week'
+        checkpoint_path [str] - location of the checkpoint file
+        fetch_mode [str]    -   one of fetch.FETCH_MODES
+        jobs [int]          -   maximum amount of concurrent requests
+        new_bucket [callable] - creates the lists holding the orders of
+                                each finished window and the result
+        convert [callable]  -   applied to each order of a finished window,
+                                the checkpoint keeps the orders in JSON
+                                format, e.g. `taxhub.OrderRecord`
+
+    Return:
+        [list]              -   orders in JSON format or converted, without
+                                duplicates
+    """
+    windows = split_date_range(start=start, end=end, window=window)
+    key = get_checkpoint_key(mapping=mapping, fetch_mode=fetch_mode)
+
+    def get_buckets(task_orders: list) -> list:
+        buckets = []
+        for orders in task_orders:
+            buckets.append(new_bucket())
+            buckets[-1].extend(fetch.convert_orders(orders=orders,
+                                                    convert=convert))
+        return buckets
+
+    finished = {
+        date_window: get_buckets(task_orders=task_orders)
+        for (date_window, task_orders) in load_checkpoint(
+            path=checkpoint_path, key=key).items()
+        if date_window in windows
+    }
+    pending = [x for x in windows if x not in finished]
+    if len(pending) < len(windows):
+        logger.info(f"Resume... {len(windows) - len(pending)} of "
+                    f"{len(windows)} windows found in [{checkpoint_path}]")
+
+    failed = []
+
+    def fetch_window(date_window: tuple) -> list:
+        return fetch.fetch_task_buckets(plenty=plenty, start=date_window[0],
+                                        end=date_window[1], mapping=mapping,
+                                        fetch_mode=fetch_mode)
+
+    with open(checkpoint_path, mode='a', encoding='utf-8') as checkpoint:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = {
+                executor.submit(fetch_window, date_window): date_window
+                for date_window in pending
+            }
+            for future in as_completed(futures):
+                date_window = futures[future]
+                try:
+                    task_orders = future.result()
+                except fetch.FetchError as err:
+                    logger.error(f"{err}")
+                    failed.append(date_window)
+                    continue
+                checkpoint.write(json.dumps({
+                    'key': key, 'start': date_window[0],
+                    'end': date_window[1], 'tasks': task_orders
+                }) + '\n')
+                checkpoint.flush()
+                finished[date_window] = get_buckets(task_orders=task_orders)
+
+    if failed:
+        raise fetch.FetchError(
+            f"{len(failed)} of {len(windows)} windows failed, run the same "
+            "command again to resume from the checkpoint.")
+
+    id_set = idset.OrderIdSet()
+    all_orders = new_bucket()
+    for index in range(len(fetch.build_fetch_tasks(mapping=mapping))):
+        for date_window in windows:
+            window_orders = finished[date_window][index]
+            for order in window_orders:
+                # windows share their boundary, an order can appear twice
+                if id_set.add(taxhub.get_order_id(entry=order)):
+                    all_orders.append(order)
+            window_orders.clear()
+    return all_orders
@@ -0,0 +1,135 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Snapshot of the mapping resolved from a configuration and the VAT
+configurations of PlentyMarkets, which allows repeated runs to skip
+parsing the configuration and requesting the VAT configurations.
+A snapshot is valid until the configuration is modified or its time to
+live expired.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from loguru import logger
+
+SNAPSHOT_VERSION = 1
+DEFAULT_TTL_HOURS = 24.0
+
+
+def get_snapshot_path(config_path: str) -> str:
+    """
+    Place the snapshot of a configuration into the user cache directory,
+    named after the configuration and its absolute path.
+
+    Parameter:
+        config_path [str]   -   location of the configuration
+
+    Return:
+        [str]
+    """
+    config_path = os.path.abspath(config_path)
+    name = os.path.splitext(os.path.basename(config_path))[0]
+    digest = hashlib.blake2b(config_path.encode('utf-8'),
+                             digest_size=6).hexdigest()
+    return os.path.join(os.path.expanduser('~'), '.cache',
+                        'plenty_taxhub_generator',
+                        f'{name}-{digest}.mapping.json')
+
+
+def get_config_key(config_path: str) -> list:
+    """Modification time and size of the configuration, empty if missing."""
+    try:
+        stat = os.stat(config_path)
+    except OSError:
+        return []
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_snapshot(config_path: str, ttl: float):
+    """
+    Read the snapshot of a configuration, if it is still valid.
+
+    Parameter:
+        config_path [str]   -   location of the configuration
+        ttl [float]         -   maximum age of the snapshot in seconds
+
+    Return:
+        [tuple]             -   mapping [dict] with the VAT data and the
+                                VAT data [dict], None without a valid
+                                snapshot
+    """
+    config_key = get_config_key(config_path=config_path)
+    if not config_key:
+        return None
+    path = get_snapshot_path(config_path=config_path)
+    try:
+        with open(path, mode='r', encoding='utf-8') as snapshot_file:
+            data = json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as err:
+        logger.warning(f"Ignoring invalid mapping snapshot [{path}]: {err}")
+        return None
+    if data.get('version') != SNAPSHOT_VERSION:
+        return None
+    if data['config_key'] != config_key:
+        logger.debug("The configuration changed since the mapping snapshot.")
+        return None
+    age = time.time() - data['created']
+    if not 0 <= age <= ttl:
+        logger.debug(f"The mapping snapshot expired {age - ttl:.0f}s ago.")
+        return None
+    logger.info(f"Using the mapping snapshot [{path}] from "
+                f"{age / 3600:.1f} hours ago")
+    return (data['mapping'], data['vat_data'])
+
+
+def write_snapshot(config_path: str, mapping: dict, vat_data: dict) -> None:
+    """
+    Keep the mapping and the VAT data of a configuration for later runs,
+    a failure is only logged as the snapshot is optional.
+
+    Parameter:
+        config_path [str]   -   location of the configuration
+        mapping [dict]      -   mapping with the VAT data
+        vat_data [dict]     -   VAT configurations by country ID
+    """
+    config_key = get_config_key(config_path=config_path)
+    if not config_key:
+        return
+    path = get_snapshot_path(config_path=config_path)
+    tmp_path = path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, mode='w', encoding='utf-8') as snapshot_file:
+            json.dump({
+                'version': SNAPSHOT_VERSION,
+                'created': time.time(),
+                'config_path': os.path.abspath(config_path),
+                'config_key': config_key,
+                'mapping': mapping,
+                'vat_data': vat_data,
+            }, snapshot_file)
+        os.replace(tmp_path, path)
+    except OSError as err:
+        logger.warning(f"Mapping snapshot [{path}] not written: {err}")
@@ -0,0 +1,176 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Keep lists of orders within a memory budget, by moving their entries to
+temporary files on disk once the budget is used up.
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import weakref
+
+from loguru import logger
+
+SAMPLE_INTERVAL = 64
+
+
+def get_size(value) -> int:
+    """
+    Approximate the memory used by a JSON value or an object with slots,
+    including the values it contains. Shared values are counted for each
+    reference, which overestimates the size.
+
+    Parameter:
+        value [Any]         -   dict, list, tuple, scalar or OrderRecord
+
+    Return:
+        [int]               -   size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for (key, entry) in value.items():
+            size += get_size(key) + get_size(entry)
+    elif isinstance(value, (list, tuple)):
+        for entry in value:
+            size += get_size(entry)
+    elif hasattr(type(value), '__slots__'):
+        for name in type(value).__slots__:
+            size += get_size(getattr(value, name, None))
+    return size
+
+
+class MemoryBudget:
+    """
+    Share a maximum amount of memory between the lists created by
+    `new_list`, once it is exceeded all of them are spilled to disk.
+    Without a maximum, the lists are plain lists.
+    The spill files are removed, when the budget is closed.
+    """
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.lists = weakref.WeakSet()
+        self.directory = ''
+        self.files = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def new_list(self):
+        if not self.max_bytes:
+            return []
+        spill_list = SpillList(budget=self)
+        self.lists.add(spill_list)
+        return spill_list
+
+    def add(self, size: int) -> None:
+        self.used += size
+        if self.used > self.max_bytes:
+            for spill_list in list(self.lists):
+                spill_list.spill()
+
+    def get_spill_path(self) -> str:
+        if not self.directory:
+            self.directory = tempfile.mkdtemp(prefix='taxhub-spill-')
+            logger.info(f"Memory budget of {self.max_bytes / 2**20:.1f} "
+                        f"MB reached, spilling orders to [{self.directory}]")
+        self.files += 1
+        return os.path.join(self.directory, f'{self.files}.pickle')
+
+    def close(self) -> None:
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = ''
+
+
+class SpillList:
+    """
+    List, that only supports appending and iterating, whose entries are
+    pickled in chunks to a file of its budget, whenever the budget is
+    exceeded. The entries are returned in the sequence they were added,
+    also when the list is spilled while it is iterated.
+    The memory of the entries is estimated from every SAMPLE_INTERVAL-th
+    entry. Not safe to use from multiple threads.
+    """
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.entries = []
+        self.path = ''
+        self.spilled = 0
+        self.memory = 0
+        self.entry_size = 0
+        self.samples = 0
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.entries)
+
+    def __iter__(self):
+        if self.path:
+            with open(self.path, mode='rb') as spill_file:
+                while True:
+                    try:
+                        chunk = pickle.load(spill_file)
+                    except EOFError:
+                        break
+                    yield from chunk
+        yield from self.entries
+
+    def append(self, entry) -> None:
+        if len(self.entries) % SAMPLE_INTERVAL == 0:
+            self.samples += 1
+            self.entry_size += (get_size(entry) - self.entry_size) // (
+                self.samples)
+        self.entries.append(entry)
+        self.memory += self.entry_size
+        self.budget.add(size=self.entry_size)
+
+    def extend(self, entries) -> None:
+        for entry in entries:
+            self.append(entry)
+
+    def spill(self) -> None:
+        """Move the entries held in memory to the end of the spill file."""
+        if not self.entries:
+            return
+        if not self.path:
+            self.path = self.budget.get_spill_path()
+        with open(self.path, mode='ab') as spill_file:
+            pickle.dump(self.entries, spill_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled += len(self.entries)
+        self.entries = []
+        self.budget.used -= self.memory
+        self.memory = 0
+
+    def clear(self) -> None:
+        """Drop all entries and release their memory and spill file."""
+        self.entries = []
+        self.budget.used -= self.memory
+        self.memory = 0
+        self.spilled = 0
+        if self.path:
+            os.remove(self.path)
+            self.path = ''
@@ -0,0 +1,279 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import json
+import sqlite3
+
+import dateutil.parser
+from loguru import logger
+
+import plenty_taxhub_generator.packages.fetch as fetch
+import plenty_taxhub_generator.packages.profiler as profiler
+
+PAYMENT_DATE_TYPE = 3
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY,
+        updated_at TEXT NOT NULL,
+        paid_at TEXT,
+        data TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS orders_paid_at ON orders (paid_at)",
+    """CREATE TABLE IF NOT EXISTS ranges (
+        start TEXT NOT NULL,
+        end TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )""",
+]
+
+
+def normalize_date(date: str) -> str:
+    """
+    Transform a date into local time without an UTC offset, so that dates
+    from the API and from the command line can be compared as strings.
+
+    Parameter:
+        date [str]          -   date in one of the supported formats
+
+    Return:
+        [str]               -   {YYYY}-{MM}-{DD}T{HH}:{MM}:{SS} or an
+                                empty string
+    """
+    try:
+        parsed_date = dateutil.parser.parse(date)
+    except (dateutil.parser._parser.ParserError, TypeError):
+        return ''
+    if parsed_date.tzinfo:
+        parsed_date = parsed_date.astimezone().replace(tzinfo=None)
+    return parsed_date.isoformat(timespec='seconds')
+
+
+def get_payment_date(order: dict) -> str:
+    """
+    Get the normalized payment date of the order.
+
+    Parameter:
+        order [dict]        -   full order from the API JSON response
+
+    Return:
+        [str]               -   normalized date or an empty string
+    """
+    for date in order.get('dates', []):
+        if date['typeId'] == PAYMENT_DATE_TYPE:
+            return normalize_date(date=date['date'])
+    return ''
+
+
+class OrderStore:
+    """
+    On-disk copy of the orders from PlentyMarkets, keyed by the order ID
+    and kept up to date with the `updatedAt` timestamp of each order.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def upsert_orders(self, orders: list) -> int:
+        """
+        Insert new orders and replace the stored version of changed orders.
+
+        Parameter:
+            orders [list]   -   orders in JSON format
+
+        Return:
+            [int]           -   amount of written orders
+        """
+        rows = [
+            (order['id'], order['updatedAt'], get_payment_date(order=order),
+             json.dumps(order))
+            for order in orders
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def get_watermark(self) -> str:
+        """
+        Get the start time of the latest synchronization, every order
+        changed afterwards has a later `updatedAt` timestamp.
+
+        Return:
+            [str]           -   W3C date or an empty string
+        """
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        if not row:
+            return ''
+        return row[0]
+
+    def set_watermark(self, watermark: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('watermark', ?)",
+                (watermark,))
+
+    def covers(self, start: str, end: str) -> bool:
+        """
+        Check if the payment date range was downloaded completely before.
+
+        Parameter:
+            start [str]     -   Start date for the date range
+            end [str]       -   End date for the date range
+
+        Return:
+            [bool]
+        """
+        start = normalize_date(date=start)
+        end = normalize_date(date=end)
+        row = self.connection.execute(
+            "SELECT 1 FROM ranges WHERE start <= ? AND end >= ?",
+            (start, end)).fetchone()
+        return row is not None
+
+    def add_range(self, start: str, end: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO ranges VALUES (?, ?)",
+                (normalize_date(date=start), normalize_date(date=end)))
+
+    def get_orders(self, start: str, end: str) -> list:
+        """
+        Get the stored orders paid within the date range, sorted by ID.
+
+        Parameter:
+            start [str]     -   Start date for the date range
+            end [str]       -   End date for the date range
+
+        Return:
+            [list]          -   orders in JSON format
+        """
+        return list(self.iter_orders(start=start, end=end))
+
+    def iter_orders(self, start: str, end: str):
+        """Like `get_orders`, decoding the orders while they are read."""
+        cursor = self.connection.execute(
+            "SELECT data FROM orders WHERE paid_at BETWEEN ? AND ? "
+            "ORDER BY id",
+            (normalize_date(date=start), normalize_date(date=end)))
+        for (data,) in cursor:
+            yield json.loads(data)
+
+
+def request_orders(plenty, start: str, end: str, date_type: str) -> list:
+    """
+    Pull all sales orders and refunds within the date range, with all
+    additions required to partition the orders locally.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        date_type [str]     -   'Payment' or 'Change'
+
+    Return:
+        [list]              -   orders in JSON format
+    """
+    orders = plenty.plenty_api_get_orders_by_date(
+        start=start,
+        end=end,
+        date_type=date_type,
+        additional=['documents', 'location', 'addresses'],
+        refine={'orderType': '1,4'},
+    )
+    if orders is None:
+        raise fetch.FetchError(f"{date_type} request failed from [{start}] "
+                               f"to [{end}]")
+    return orders
+
+
+def sync_store(plenty, store: OrderStore, start: str, end: str) -> None:
+    """
+    Bring the store up to date for the payment date range.
+    A range, that was never downloaded, is requested completely, afterwards
+    only orders changed since the watermark are requested.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        store [OrderStore]  -   on-disk order store
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+    """
+    watermark = store.get_watermark()
+    now = datetime.datetime.now().astimezone().isoformat(timespec='seconds')
+
+    if watermark and normalize_date(date=watermark) < normalize_date(date=now):
+        logger.info(f"Sync... orders changed since [{watermark}]")
+        orders = request_orders(plenty=plenty, start=watermark, end=now,
+                                date_type='Change')
+        store.upsert_orders(orders=orders)
+        logger.info(f"Sync... {len(orders)} changed orders stored")
+
+    if not store.covers(start=start, end=end):
+        logger.info(f"Sync... all orders paid from [{start}] to [{end}]")
+        orders = request_orders(plenty=plenty, start=start, end=end,
+                                date_type='Payment')
+        store.upsert_orders(orders=orders)
+        store.add_range(start=start, end=end)
+
+    store.set_watermark(watermark=now)
+
+
+def fetch_from_store(plenty, path: str, start: str, end: str,
+                     mapping: dict, new_bucket=list, convert=None) -> list:
+    """
+    Synchronize the order store and load the orders of the date range for
+    the configured countries and referrers.
+
+    Parameter:
+        plenty [PlentyApi]  -   authenticated API client
+        path [str]          -   location of the SQLite database
+        start [str]         -   Start date for the date range
+        end [str]           -   End date for the date range
+        mapping [dict]      -   data from the configuration and plenty
+                                VAT data
+        new_bucket [callable] - see `fetch.partition_orders`
+        convert [callable]  -   see `fetch.split_by_task`
+
+    Return:
+        [list]              -   orders in JSON format or converted
+    """
+    prof = profiler.get_profiler()
+    store = OrderStore(path=path)
+    try:
+        with prof.stage('store sync'):
+            sync_store(plenty=plenty, store=store, start=start, end=end)
+        orders = prof.wrap_iter(
+            'store read', store.iter_orders(start=start, end=end))
+        return fetch.partition_orders(orders=orders, mapping=mapping,
+                                      new_bucket=new_bucket, convert=convert)
+    finally:
+        store.close()
@@ -0,0 +1,224 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import random
+
+# abbreviation: (PlentyMarkets country ID, VAT configuration IDs, VAT rate)
+SYNTHETIC_COUNTRIES = {
+    'DE': ('1', ['54', '55'], 19),
+    'AT': ('2', ['34', '35'], 20),
+    'CZ': ('6', ['61'], 21),
+    'ES': ('8', ['81'], 21),
+    'FR': ('10', ['101'], 20),
+    'IT': ('15', ['151'], 22),
+    'PL': ('23', ['231'], 23),
+}
+SYNTHETIC_REFERRER = ['1', '4', '4.01']
+W3C_FORMAT = '%Y-%m-%dT%H:%M:%S+02:00'
+
+
+def build_synthetic_mapping() -> dict:
+    """
+    Create a mapping, as returned by `cli.add_vat_data_to_mappings`, that
+    matches the countries and referrers of the synthetic orders.
+
+    Return:
+        [dict]
+    """
+    mapping = {
+        'url': 'https://synthetic.plentymarkets-cloud01.com',
+        'countries': {},
+        'referrer': list(SYNTHETIC_REFERRER),
+        'fixed_values': {'source_zone': 'DE', 'market_zone_currency': 'EUR'},
+    }
+    for (country, (country_id, vat_conf, _)) in SYNTHETIC_COUNTRIES.items():
+        mapping['countries'][country] = {
+            'country_id': country_id,
+            'tax_id': f'{country}123456789',
+            'vat_conf': list(vat_conf),
+        }
+    mapping['vat_index'] = {
+        vat_id: country
+        for (country, (_, vat_conf, _)) in SYNTHETIC_COUNTRIES.items()
+        for vat_id in vat_conf
+    }
+    return mapping
+
+
+def build_vat_data() -> list:
+    """
+    Create the entries of the /rest/vat route for the synthetic countries.
+
+    Return:
+        [list]
+    """
+    return [
+        {'id': int(vat_id), 'countryId': int(country_id),
+         'taxIdNumber': f'{country}123456789'}
+        for (country, (country_id, vat_conf, _)) in SYNTHETIC_COUNTRIES.items()
+        for vat_id in vat_conf
+    ]
+
+
+def generate_order(order_id: int, type_id: int, country: str, referrer: str,
+                   paid_at: datetime.datetime, rng: random.Random) -> dict:
+    """
+    Create an order in the shape of the PlentyMarkets order JSON with the
+    additions `documents`, `location` and `addresses`.
+
+    Parameter:
+        order_id [int]      -   ID of the order
+        type_id [int]       -   1 for sales orders, 4 for refunds
+        country [str]       -   key of SYNTHETIC_COUNTRIES
+        referrer [str]      -   referrer ID
+        paid_at [datetime]  -   payment date of the order
+        rng [Random]        -   source of the amounts and quantities
+
+    Return:
+        [dict]
+    """
+    (country_id, vat_conf, vat_rate) = SYNTHETIC_COUNTRIES[country]
+    vat_id = int(rng.choice(vat_conf))
+    created = (paid_at - datetime.timedelta(minutes=5)).strftime(W3C_FORMAT)
+    paid = paid_at.strftime(W3C_FORMAT)
+    delivered = (paid_at + datetime.timedelta(days=1)).strftime(W3C_FORMAT)
+    document_date = (paid_at + datetime.timedelta(hours=12)).strftime(
+        W3C_FORMAT)
+
+    items = []
+    gross = 0.0
+    for position in range(rng.randint(1, 4)):
+        price = round(rng.uniform(2, 80), 2)
+        quantity = rng.randint(1, 5)
+        gross += price * quantity
+        items.append({
+            'id': order_id * 10 + position,
+            'orderId': order_id,
+            'typeId': 1,
+            'referrerId': float(referrer),
+            'itemVariationId': 1000 + rng.randint(0, 5000),
+            'quantity': quantity,
+            'orderItemName': f'Item {position}',
+            'countryVatId': vat_id,
+            'vatRate': vat_rate,
+            'amounts': [{'priceGross': price, 'currency': 'EUR'}],
+        })
+    items.append({
+        'id': order_id * 10 + 9, 'orderId': order_id, 'typeId': 6,
+        'referrerId': float(referrer), 'itemVariationId': 0, 'quantity': 1,
+        'orderItemName': 'ShippingCosts', 'countryVatId': vat_id,
+        'vatRate': vat_rate, 'amounts': [{'priceGross': 0, 'currency': 'EUR'}],
+    })
+    gross = round(gross, 2)
+    net = round(gross / (1 + vat_rate / 100), 2)
+    document_type = 'invoice' if type_id == 1 else 'credit_note'
+    prefix = 'R' if type_id == 1 else 'G'
+
+    return {
+        'id': order_id,
+        'referrerId': float(referrer),
+        'typeId': type_id,
+        'statusId': 7 if type_id == 1 else 11,
+        'locationId': '3',
+        'createdAt': created,
+        'updatedAt': document_date,
+        'relations': [
+            {'orderId': order_id, 'referenceType': 'warehouse',
+             'referenceId': 104, 'relation': 'sender'},
+        ],
+        'properties': [],
+        'dates': [
+            {'orderId': order_id, 'typeId': 2, 'date': created},
+            {'orderId': order_id, 'typeId': 3, 'date': paid},
+            {'orderId': order_id, 'typeId': 4, 'date': document_date},
+            {'orderId': order_id, 'typeId': 5, 'date': delivered},
+        ],
+        'amounts': [{
+            'orderId': order_id,
+            'isSystemCurrency': True,
+            'currency': 'EUR',
+            'netTotal': net,
+            'grossTotal': gross,
+            'vatTotal': round(gross - net, 2),
+            'vats': [{
+                'countryVatId': vat_id,
+                'vatRate': vat_rate,
+                'value': round(gross - net, 2),
+                'netTotal': net,
+                'grossTotal': gross,
+            }],
+        }],
+        'orderItems': items,
+        'addressRelations': [
+            {'orderId': order_id, 'typeId': 1, 'addressId': order_id * 2},
+            {'orderId': order_id, 'typeId': 2, 'addressId': order_id * 2 + 1},
+        ],
+        'addresses': [
+            {'id': order_id * 2, 'countryId': int(country_id)},
+            {'id': order_id * 2 + 1, 'countryId': int(country_id)},
+        ],
+        'documents': [{
+            'id': order_id,
+            'type': document_type,
+            'number': str(order_id),
+            'numberWithPrefix': f'{prefix}{order_id}',
+            'createdAt': document_date,
+        }],
+    }
+
+
+def generate_orders(count: int, start: str = '2020-09-01', days: int = 30,
+                    first_id: int = 100000, refund_ratio: float = 0.1,
+                    duplicate_ratio: float = 0.0, seed: int = 0):
+    """
+    Create orders paid within the period, in order of their payment date,
+    spread over the synthetic countries and referrers.
+    Duplicates repeat the previous order with the same ID, like orders
+    returned by multiple overlapping requests.
+
+    Parameter:
+        count [int]         -   amount of distinct orders
+        start [str]         -   first day of the period {YYYY}-{MM}-{DD}
+        days [int]          -   length of the period in days
+        first_id [int]      -   ID of the first order
+        refund_ratio [float]-   share of refunds within the orders
+        duplicate_ratio [float] - share of orders, that are repeated
+        seed [int]          -   seed of the random number generator
+
+    Return:
+        [Generator]         -   orders in JSON format
+    """
+    rng = random.Random(seed)
+    countries = list(SYNTHETIC_COUNTRIES.keys())
+    period_start = datetime.datetime.fromisoformat(start)
+    step = datetime.timedelta(days=days) / max(count, 1)
+
+    for index in range(count):
+        type_id = 4 if rng.random() < refund_ratio else 1
+        order = generate_order(
+            order_id=first_id + index, type_id=type_id,
+            country=rng.choice(countries),
+            referrer=rng.choice(SYNTHETIC_REFERRER),
+            paid_at=period_start + step * index, rng=rng)
+        yield order
+        if duplicate_ratio and rng.random() < duplicate_ratio:
+            yield order
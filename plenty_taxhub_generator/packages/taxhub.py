@@ -19,9 +19,13 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import pandas
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from loguru import logger
 
+import plenty_taxhub_generator.packages.idset as idset
 import plenty_taxhub_generator.packages.utils as utils
 
 ORDER_TYPE_MAP = {'1': 'SALE', '4': 'REFUND'}
@@ -61,9 +65,49 @@ tax_columns = [
 ]
 
 
-def insert_empty_entries(target: list, num: int) -> None:
-    for _ in range(num):
-        target.append('')
+def get_vat_rate(record, context: dict) -> str:
+    return f"{record.vat_rate} %"
+
+
+# Every populated column of the report with the function extracting its
+# value from the OrderRecord and the values computed once per order, all
+# other columns stay empty.
+ROW_SPEC = [
+    ('Position-Nr.', lambda record, context: str(context['position'])),
+    ('KindOfBusiness', lambda record, context: context['order_type']),
+    ('TransactionId', lambda record, context: str(record.id)),
+    ('DocumentId', lambda record, context: record.document_id),
+    ('DepatureDate', lambda record, context: record.delivery_date),
+    ('DocumentDate', lambda record, context: record.document_date),
+    ('VatZone', lambda record, context: context['country']),
+    ('VatRate', get_vat_rate),
+    ('VatAmount (in VatZoneCurrency)',
+     lambda record, context: str(record.vat_total)),
+    ('SourceZone',
+     lambda record, context: context['mapping']['fixed_values']['source_zone']),
+    ('TargetZone', lambda record, context: context['country']),
+    ('TargetZoneVatId',
+     lambda record, context:
+     context['mapping']['countries'][context['country']]['tax_id']),
+    ('TargetZoneVatRate', get_vat_rate),
+    ('MarketZoneCurrencyCode',
+     lambda record, context:
+     context['mapping']['fixed_values']['market_zone_currency']),
+    ('MarketZoneGross', lambda record, context: str(record.gross_total)),
+    ('MarketZoneNet', lambda record, context: str(record.net_total)),
+    ('ItemQuantity', lambda record, context: record.quantity),
+]
+ROW_FIELDS = [
+    (tax_columns.index(column), extractor) for (column, extractor) in ROW_SPEC
+]
+ROW_TEMPLATE = [''] * len(tax_columns)
+POSITION_INDEX = tax_columns.index('Position-Nr.')
+PARALLEL_CHUNK_SIZE = 5000
+FILTER_ENGINES = ['rows', 'vectorized']
+
+# state of a worker process of `iter_rows_parallel`
+WORKER_MAPPING = {}
+WORKER_DATA = None
 
 
 def get_order_type(value: int) -> str:
@@ -123,6 +167,42 @@ def get_delivery_date(row: dict) -> str:
     return ''
 
 
+def get_payment_date(row: dict) -> str:
+    """
+    Search for the ID of a payment date [3], without transforming it, as
+    it is only compared with the bounds of reporting periods.
+
+    Parameter:
+        row [dict]      -   full row from the API JSON response
+
+    Return:
+        [str]           -   Date in W3C format or an empty string.
+    """
+    for date in row.get('dates', []):
+        if date['typeId'] == 3:
+            return date['date']
+    return ''
+
+
+def build_vat_index(mapping: dict) -> dict:
+    """
+    Map each VAT configuration ID to the country it belongs to, when an ID
+    is listed for multiple countries, the first country wins.
+
+    Parameter:
+        mapping [dict]  -   data from the configuration and plenty VAT data
+
+    Return:
+        [dict]          -   VAT configuration ID as key and the country
+                            abbreviation as value
+    """
+    vat_index = {}
+    for country in mapping['countries']:
+        for vat_config_id in mapping['countries'][country]['vat_conf']:
+            vat_index.setdefault(str(vat_config_id), country)
+    return vat_index
+
+
 def get_vat_zone(row: dict, mapping: dict) -> str:
     """
     Find the country for which the VAT is charged,
@@ -139,7 +219,29 @@ def get_vat_zone(row: dict, mapping: dict) -> str:
     if not row or not mapping:
         return ''
 
-    vat_config_id = str(row['amounts'][0]['vats'][0]['countryVatId'])
+    return find_vat_zone(
+        vat_config_id=str(row['amounts'][0]['vats'][0]['countryVatId']),
+        mapping=mapping)
+
+
+def find_vat_zone(vat_config_id: str, mapping: dict) -> str:
+    """
+    Find the country of a VAT configuration ID.
+    Uses the 'vat_index' of the mapping (see `build_vat_index`) if present.
+
+    Parameter:
+        vat_config_id [str] -   ID of the VAT configuration of the order
+        mapping [dict]  -   data from the configuration and plenty VAT data
+
+    Return:
+        [str]           -   Abbreviation of the country in upper case
+                            letters
+    """
+    if not mapping:
+        return ''
+
+    if 'vat_index' in mapping:
+        return mapping['vat_index'].get(vat_config_id, '')
 
     for country in mapping['countries']:
         if vat_config_id in mapping['countries'][country]['vat_conf']:
@@ -166,80 +268,335 @@ def get_total_item_quantity(row: dict) -> str:
     return str(total)
 
 
-def filter_data(data: list, mapping: dict) -> pandas.DataFrame:
+class OrderRecord:
     """
-    Reduce the data structure from the PlentyMarkets API request
-    to the elements required for the TaxHub report.
+    The values of an order used by the report, without the remaining
+    fields of the API response, to keep large periods in memory.
+    The document, dates and quantity are only extracted for sales orders
+    and refunds, the only orders within the report, the payment date is
+    kept to sort the records into reporting periods.
+    """
+    __slots__ = ('id', 'type_id', 'document_id', 'document_date',
+                 'delivery_date', 'vat_config_id', 'vat_rate', 'vat_total',
+                 'gross_total', 'net_total', 'quantity', 'updated_at',
+                 'payment_date')
+
+    def __init__(self, order: dict):
+        self.id = order['id']
+        self.type_id = order['typeId']
+        self.updated_at = order.get('updatedAt', '')
+        self.payment_date = get_payment_date(row=order)
+        self.document_id = ''
+        self.document_date = ''
+        self.delivery_date = ''
+        self.vat_config_id = ''
+        self.vat_rate = None
+        self.vat_total = None
+        self.gross_total = None
+        self.net_total = None
+        self.quantity = ''
+        if not get_order_type(value=self.type_id):
+            return
+
+        document = get_document_data(row=order)
+        self.document_id = document['id']
+        self.document_date = document['date']
+        self.delivery_date = get_delivery_date(row=order)
+        amounts = order['amounts'][0]
+        self.vat_config_id = str(amounts['vats'][0]['countryVatId'])
+        self.vat_rate = amounts['vats'][0]['vatRate']
+        self.vat_total = amounts['vatTotal']
+        self.gross_total = amounts['grossTotal']
+        self.net_total = amounts['netTotal']
+        self.quantity = get_total_item_quantity(row=order)
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for (name, value) in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def compact_orders(orders, new_bucket=list) -> list:
+    """
+    Convert the orders of an API response into OrderRecords, orders which
+    are already converted are kept.
 
     Parameter:
-        data [List]         -   API data in JSON format
+        orders [Iterable]   -   API data in JSON format
+        new_bucket [callable] - creates the list of the result, e.g.
+                                `spill.MemoryBudget.new_list`
+
+    Return:
+        [list]              -   OrderRecord instances
+    """
+    records = new_bucket()
+    records.extend(
+        entry if isinstance(entry, OrderRecord) else OrderRecord(entry)
+        for entry in orders)
+    return records
+
+
+def get_order_id(entry) -> int:
+    if isinstance(entry, OrderRecord):
+        return entry.id
+    return entry['id']
+
+
+def get_order_type_id(entry) -> int:
+    if isinstance(entry, OrderRecord):
+        return entry.type_id
+    return entry['typeId']
+
+
+def iter_unique_orders(data):
+    """
+    Skip every order with an ID that occurred before, the first
+    occurrence of an ID is kept.
+
+    Parameter:
+        data [Iterable]     -   API data in JSON format
+
+    Return:
+        [Generator]         -   orders in JSON format
+    """
+    id_set = idset.OrderIdSet()
+    for entry in data:
+        if id_set.add(get_order_id(entry=entry)):
+            yield entry
+
+
+def build_row(entry, mapping: dict, position: int,
+              no_document: list, no_delivery: list) -> list:
+    """
+    Reduce a single order to a row of the TaxHub report.
+
+    Parameter:
+        entry [dict]        -   full row from the API JSON response or its
+                                OrderRecord
+        mapping [dict]      -   Configuration data and VAT data
+        position [int]      -   value of the Position-Nr. column
+        no_document [list]  -   collects the IDs of orders without document
+        no_delivery [list]  -   collects the IDs of sales orders without
+                                delivery date
+
+    Return:
+        [list]              -   values of the tax_columns, None if the
+                                order is not part of the report
+    """
+    order_type = get_order_type(value=get_order_type_id(entry=entry))
+    if not order_type:
+        return None  # skip any order besides sales orders and refunds
+    if not isinstance(entry, OrderRecord):
+        entry = OrderRecord(entry)
+    if not entry.document_id:
+        no_document.append(entry.id)
+    if not entry.delivery_date and entry.type_id == 1:
+        no_delivery.append(entry.id)
+    country = find_vat_zone(vat_config_id=entry.vat_config_id,
+                            mapping=mapping)
+    if not country:
+        return None
+    if not entry.quantity:
+        logger.warning(f"No item quantity for {entry.id}.")
+
+    context = {
+        'position': position, 'order_type': order_type,
+        'country': country, 'mapping': mapping,
+    }
+    frame_row = ROW_TEMPLATE.copy()
+    for (index, extractor) in ROW_FIELDS:
+        frame_row[index] = extractor(entry, context)
+    return frame_row
+
+
+def log_missing_data(no_document: list, no_delivery: list) -> None:
+    if no_document:
+        logger.info(f'Missing documents for Order ID: {no_document}')
+    if no_delivery:
+        logger.info(f'Missing delivery date for Order ID: {no_delivery}')
+
+
+def iter_rows(data, mapping: dict):
+    """
+    Reduce the orders from the PlentyMarkets API request to the rows of
+    the TaxHub report, one order at a time.
+    Each row is a copy of the ROW_TEMPLATE, filled by the ROW_SPEC.
+
+    Parameter:
+        data [Iterable]     -   API data in JSON format, a list or any
+                                generator of orders
         mapping [Dict]      -   Configuration data and VAT data
 
     Return:
-        [DataFrame]         -   with the required columns from the
-                                tax_columns list
+        [Generator]         -   lists with the values of the tax_columns
     """
-    id_set = set()
-    frame_data = []
     no_delivery = []
     no_document = []
     position = 1
-    for entry in data:
-        frame_row = []
-        # skip duplicate Order IDs
-        if entry['id'] in id_set:
+    for entry in iter_unique_orders(data=data):
+        frame_row = build_row(entry=entry, mapping=mapping,
+                              position=position, no_document=no_document,
+                              no_delivery=no_delivery)
+        if frame_row is None:
             continue
-        id_set.add(entry['id'])
-        document = {'id': '', 'date': ''}
-        frame_row.append(str(position))
-        order_type = get_order_type(value=entry['typeId'])
-        if not order_type:
-            continue  # skip any order besides sales orders and refunds
-        frame_row.append(order_type)
-        frame_row.append(str(entry['id']))
-        document = get_document_data(row=entry)
-        if not document['id']:
-            no_document.append(entry['id'])
-        frame_row.append(document['id'])
-        insert_empty_entries(target=frame_row, num=1)
-        d_date = get_delivery_date(row=entry)
-        if not d_date and entry['typeId'] == 1:
-            no_delivery.append(entry['id'])
-        frame_row.append(d_date)
-
-        insert_empty_entries(target=frame_row, num=1)
-        frame_row.append(document['date'])
-        country = get_vat_zone(row=entry, mapping=mapping)
-        if not country:
-            continue
-        frame_row.append(country)
-
-        frame_row.append(str(f"{entry['amounts'][0]['vats'][0]['vatRate']} %"))
-        frame_row.append(str(entry['amounts'][0]['vatTotal']))
-        frame_row.append(mapping['fixed_values']['source_zone'])
-        insert_empty_entries(target=frame_row, num=6)
-        frame_row.append(country)
-        insert_empty_entries(target=frame_row, num=1)
-        frame_row.append(mapping['countries'][country]['tax_id'])
-        frame_row.append(str(f"{entry['amounts'][0]['vats'][0]['vatRate']} %"))
-        insert_empty_entries(target=frame_row, num=4)
-        frame_row.append(mapping['fixed_values']['market_zone_currency'])
-        frame_row.append(str(entry['amounts'][0]['grossTotal']))
-        frame_row.append(str(entry['amounts'][0]['netTotal']))
-        insert_empty_entries(target=frame_row, num=4)
-        qty = get_total_item_quantity(row=entry)
-        if not qty:
-            logger.warning(f"No item quantity for {entry['id']}.")
-        frame_row.append(qty)
-
-        insert_empty_entries(target=frame_row, num=64)
         position += 1
-        frame_data.append(frame_row)
+        yield frame_row
 
-    frame = pandas.DataFrame(frame_data, columns=tax_columns)
-    if no_document:
-        logger.info(f'Missing documents for Order ID: {no_document}')
-    if no_delivery:
-        logger.info(f'Missing delivery date for Order ID: {no_delivery}')
+    log_missing_data(no_document=no_document, no_delivery=no_delivery)
+
+
+def init_worker(mapping: dict, data: list) -> None:
+    global WORKER_MAPPING, WORKER_DATA
+    WORKER_MAPPING = mapping
+    WORKER_DATA = data
+
+
+def transform_chunk(chunk: list) -> tuple:
+    """
+    Build the rows of a chunk of unique orders within a worker process.
+    Only the populated columns (ROW_FIELDS) are returned, to keep the
+    transfer to the parent process small, the Position-Nr. is assigned by
+    the parent process.
+
+    Parameter:
+        chunk [list]        -   orders in JSON format or, if the worker
+                                holds the orders, their indices
+
+    Return:
+        [tuple]             -   values of the rows, IDs without document,
+                                IDs without delivery date
+    """
+    if WORKER_DATA is not None:
+        chunk = [WORKER_DATA[index] for index in chunk]
+    no_delivery = []
+    no_document = []
+    values = []
+    for entry in chunk:
+        frame_row = build_row(entry=entry, mapping=WORKER_MAPPING,
+                              position=0, no_document=no_document,
+                              no_delivery=no_delivery)
+        if frame_row is not None:
+            values.append(tuple(frame_row[index]
+                                for (index, _) in ROW_FIELDS))
+    return (values, no_document, no_delivery)
+
+
+def iter_chunks(data, chunk_size: int):
+    chunk = []
+    for entry in data:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_unique_indices(data: list):
+    id_set = idset.OrderIdSet()
+    for (index, entry) in enumerate(data):
+        if id_set.add(get_order_id(entry=entry)):
+            yield index
+
+
+def iter_rows_parallel(data, mapping: dict, workers: int,
+                       chunk_size: int = PARALLEL_CHUNK_SIZE):
+    """
+    Build the rows of the TaxHub report within a pool of worker processes.
+
+    Duplicates are removed by the parent process before the unique orders
+    are split into chunks, and the rows of the chunks are merged in the
+    order of the chunks, so the rows and their Position-Nr. are identical
+    to the result of `iter_rows`.
+    A list of orders is handed to the workers when they are started
+    (without a copy, where processes are forked), so that only indices
+    are sent per chunk. Orders from other iterables are sent to the
+    workers chunk by chunk, with at most two chunks per worker pending at
+    the same time, which keeps generators of orders (see
+    `fetch.iter_orders`) streaming.
+
+    Parameter:
+        data [Iterable]     -   API data in JSON format, a list or any
+                                generator of orders
+        mapping [Dict]      -   Configuration data and VAT data
+        workers [int]       -   amount of worker processes
+        chunk_size [int]    -   amount of orders sent to a worker at once
+
+    Return:
+        [Generator]         -   lists with the values of the tax_columns
+    """
+    if workers <= 1:
+        yield from iter_rows(data=data, mapping=mapping)
+        return
+
+    if isinstance(data, list):
+        worker_data = data
+        unique = get_unique_indices(data=data)
+    else:
+        worker_data = None
+        unique = iter_unique_orders(data=data)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    no_delivery = []
+    no_document = []
+    position = 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker,
+                             initargs=(mapping, worker_data)) as executor:
+        pending = collections.deque()
+        chunks = iter_chunks(data=unique, chunk_size=chunk_size)
+        while True:
+            for chunk in chunks:
+                pending.append(executor.submit(transform_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            (values, chunk_no_document, chunk_no_delivery) = (
+                pending.popleft().result())
+            for row_values in values:
+                frame_row = ROW_TEMPLATE.copy()
+                for ((index, _), value) in zip(ROW_FIELDS, row_values):
+                    frame_row[index] = value
+                frame_row[POSITION_INDEX] = str(position)
+                position += 1
+                yield frame_row
+            no_document += chunk_no_document
+            no_delivery += chunk_no_delivery
+
+    log_missing_data(no_document=no_document, no_delivery=no_delivery)
+
+
+def filter_data(data: list, mapping: dict, workers: int = 1,
+                engine: str = 'rows') -> 'pandas.DataFrame':
+    """
+    Reduce the data structure from the PlentyMarkets API request
+    to the elements required for the TaxHub report.
+
+    Parameter:
+        data [List]         -   API data in JSON format
+        mapping [Dict]      -   Configuration data and VAT data
+        workers [int]       -   amount of worker processes of the 'rows'
+                                engine
+        engine [str]        -   one of FILTER_ENGINES, 'vectorized' builds
+                                the identical DataFrame with column-wise
+                                operations (see `vectorized.build_frame`)
+
+    Return:
+        [DataFrame]         -   with the required columns from the
+                                tax_columns list
+    """
+    if engine == 'vectorized':
+        import plenty_taxhub_generator.packages.vectorized as vectorized
+        return vectorized.build_frame(data=data, mapping=mapping)
+
+    import pandas
 
-    return frame
+    frame_data = list(iter_rows_parallel(data=data, mapping=mapping,
+                                         workers=workers))
+    return pandas.DataFrame(frame_data, columns=tax_columns)
@@ -0,0 +1,109 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+HTTP transport shared by every request of a run, a pooled session which
+keeps the connections to PlentyMarkets alive and accepts compressed
+responses.
+The plenty_api client sends its requests through the functions of the
+`requests` module, the transport takes the place of that module within
+the client (see `install`).
+"""
+
+import threading
+
+DEFAULT_POOL_SIZE = 10
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class Transport:
+    """
+    Offer the request functions of the `requests` module on top of a
+    session with a connection pool of @pool_size connections per host.
+    Any other attribute is taken from the `requests` module.
+    """
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        import requests
+        import requests.adapters
+
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __getattr__(self, name: str):
+        import requests
+
+        return getattr(requests, name)
+
+    def request(self, method: str, url: str, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def put(self, url: str, **kwargs):
+        return self.session.put(url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+TRANSPORT = None
+TRANSPORT_LOCK = threading.Lock()
+
+
+def configure(pool_size: int = DEFAULT_POOL_SIZE) -> Transport:
+    """Replace the shared transport with one of the given pool size."""
+    global TRANSPORT
+    with TRANSPORT_LOCK:
+        if TRANSPORT is not None:
+            TRANSPORT.close()
+        TRANSPORT = Transport(pool_size=pool_size)
+    return TRANSPORT
+
+
+def get_transport() -> Transport:
+    """Return the shared transport, create it on the first use."""
+    global TRANSPORT
+    with TRANSPORT_LOCK:
+        if TRANSPORT is None:
+            TRANSPORT = Transport()
+    return TRANSPORT
+
+
+def install() -> Transport:
+    """
+    Route the requests of the plenty_api client through the shared
+    transport, must be called before the client logs in.
+
+    Return:
+        [Transport]
+    """
+    import plenty_api.api
+
+    transport = get_transport()
+    plenty_api.api.requests = transport
+    return transport
@@ -19,9 +19,12 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import datetime
+import functools
 import re
 
 import dateutil.parser
+from loguru import logger
 
 VALID_COUNTRY_ABBREVIATIONS = [
     'AF', 'AL', 'DZ', 'AD', 'AO', 'AG', 'AR', 'AM', 'AU', 'AT', 'AZ',
@@ -43,6 +46,11 @@ VALID_COUNTRY_ABBREVIATIONS = [
     'TN', 'TR', 'TM', 'TV', 'UG', 'UA', 'AE', 'GB', 'US', 'UY', 'UZ',
     'VU', 'VE', 'VN', 'YE', 'ZM', 'ZW',
 ]
+W3C_DATE = re.compile(
+    r'(\d{4}-\d{2}-\d{2})T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?'
+    r'(?:Z|[+-]\d{2}:?\d{2})?'
+)
+DATE_CACHE_SIZE = 4096
 
 
 def transform_date(date: str) -> str:
@@ -53,10 +61,15 @@ def transform_date(date: str) -> str:
         {DD}/{MM}/{YYYY}
     The PlentyMarkets API uses the W3C date format.
     The TaxHub Report uses the {DD}/{MM}/{YYYY} format.
+    W3C dates are converted by their date portion, any other input is
+    handed to the generic dateutil parser.
 
     Parameter:
         date [String]
     """
+    match = W3C_DATE.fullmatch(date)
+    if match:
+        return transform_date_portion(date_portion=match.group(1))
     try:
         parsed_date = dateutil.parser.parse(date)
     except dateutil.parser._parser.ParserError:
@@ -67,6 +80,35 @@ def transform_date(date: str) -> str:
     return parsed_date.strftime('%d/%m/%Y')
 
 
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_date_portion(date_portion: str) -> str:
+    """
+    Transform a {YYYY}-{MM}-{DD} date into the {DD}/{MM}/{YYYY} format,
+    the result is cached as every order of a period shares a few dates.
+    Invalid dates raise a ValueError, which is not cached.
+
+    Parameter:
+        date_portion [String]
+    """
+    return datetime.date.fromisoformat(date_portion).strftime('%d/%m/%Y')
+
+
+def transform_date_portion(date_portion: str) -> str:
+    """
+    Transform a {YYYY}-{MM}-{DD} date into the {DD}/{MM}/{YYYY} format,
+    every invalid date is logged and transformed to an empty string.
+
+    Parameter:
+        date_portion [String]
+    """
+    try:
+        return format_date_portion(date_portion=date_portion)
+    except ValueError:
+        logger.error(f"Invalid date: {date_portion}, cannot transform date "
+                     "format.")
+        return ''
+
+
 def check_url(url) -> bool:
     """
     Check if the provided URL is in exactly the correct format.
@@ -151,8 +193,9 @@ def get_referrer_id_list(config: object) -> list:
         try:
             float(referrer)
         except ValueError:
-            logger.error(f"Invalid referrer ID: {conf_value} must be a "
-                         "number.")
+            logger.error(f"Invalid referrer ID: {referrer} must be a "
+                         "number, the referrer is skipped.")
+            continue
 
         referrer_list.append(referrer)
 
@@ -0,0 +1,291 @@
+"""
+TaxHub Report Generator
+Create a report for orders and refunds from a specified period,
+the data of which is drawn from Plentymarkets.
+
+Copyright (C) 2020  Sebastian Fricke, Panasiam
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Vectorized engine of `taxhub.filter_data`: the unique sales orders and
+refunds are split into columns in a single pass, the documents, dates and
+items of the orders into flat tables, and the values of the report are
+computed with pandas operations on whole columns. The result is identical
+to the rows of `taxhub.iter_rows`.
+"""
+
+import itertools
+import operator
+
+import numpy
+import pandas
+
+import plenty_taxhub_generator.packages.taxhub as taxhub
+import plenty_taxhub_generator.packages.utils as utils
+
+W3C_DATE_PATTERN = rf'\A(?:{utils.W3C_DATE.pattern})\Z'
+# attributes of the OrderRecord, the document, dates and quantity of
+# orders in JSON format are computed from their documents, dates and items
+ORDER_COLUMNS = ['id', 'type_id', 'vat_config_id', 'vat_rate', 'vat_total',
+                 'gross_total', 'net_total', 'document_id', 'document_date',
+                 'delivery_date', 'quantity']
+
+
+def normalize_orders(data: list) -> dict:
+    """
+    Skip duplicates and orders besides sales orders and refunds, and split
+    the remaining orders into columns, in order of their first occurrence.
+    The documents, dates and items of orders in JSON format are collected
+    into flat tables.
+
+    Parameter:
+        data [list]         -   API data in JSON format or OrderRecords
+
+    Return:
+        [dict]              -   'orders' [dict] of the ORDER_COLUMNS as
+                                arrays, 'documents', 'dates', 'items'
+                                [DataFrame] with the 'position' of the
+                                order within the arrays
+    """
+    ids = pandas.Series([taxhub.get_order_id(entry=entry) for entry in data],
+                        dtype=object)
+    type_ids = pandas.Series(
+        [taxhub.get_order_type_id(entry=entry) for entry in data],
+        dtype=object)
+    selected = (~ids.duplicated(keep='first') &
+                type_ids.astype(str).isin(list(taxhub.ORDER_TYPE_MAP)))
+    entries = [data[index] for index in numpy.flatnonzero(selected)]
+    is_record = numpy.array(
+        [isinstance(entry, taxhub.OrderRecord) for entry in entries],
+        dtype=bool)
+    orders = {name: numpy.full(len(entries), None, dtype=object)
+              for name in ORDER_COLUMNS}
+
+    if is_record.any():
+        records = [entry for entry in entries
+                   if isinstance(entry, taxhub.OrderRecord)]
+        record_positions = numpy.flatnonzero(is_record)
+        for name in ORDER_COLUMNS:
+            set_values(target=orders[name], positions=record_positions,
+                       values=list(map(operator.attrgetter(name), records)))
+
+    json_orders = [entry for entry in entries
+                   if not isinstance(entry, taxhub.OrderRecord)]
+    positions = numpy.flatnonzero(~is_record)
+    amounts = [order['amounts'][0] for order in json_orders]
+    vats = [amount['vats'][0] for amount in amounts]
+    for (name, values) in [
+            ('id', [order['id'] for order in json_orders]),
+            ('type_id', [order['typeId'] for order in json_orders]),
+            ('vat_config_id', [str(vat['countryVatId']) for vat in vats]),
+            ('vat_rate', [vat['vatRate'] for vat in vats]),
+            ('vat_total', [amount['vatTotal'] for amount in amounts]),
+            ('gross_total', [amount['grossTotal'] for amount in amounts]),
+            ('net_total', [amount['netTotal'] for amount in amounts])]:
+        set_values(target=orders[name], positions=positions, values=values)
+
+    # only sales orders are delivered
+    dates = [order['dates'] if order['typeId'] == 1 else []
+             for order in json_orders]
+    return {
+        'orders': orders,
+        'documents': flatten(
+            positions=positions,
+            nested=[order.get('documents') or [] for order in json_orders],
+            fields={'type': 'type', 'number': 'numberWithPrefix',
+                    'date': 'createdAt'}),
+        'dates': flatten(positions=positions, nested=dates,
+                         fields={'type': 'typeId', 'date': 'date'}),
+        'items': flatten(
+            positions=positions,
+            nested=[order['orderItems'] for order in json_orders],
+            fields={'type': 'typeId', 'quantity': 'quantity'}),
+    }
+
+
+def set_values(target: numpy.ndarray, positions: numpy.ndarray,
+               values: list) -> None:
+    # assigned through an object array, as numpy would unpack sequences
+    source = numpy.empty(len(values), dtype=object)
+    source[:] = values
+    target[positions] = source
+
+
+def flatten(positions: numpy.ndarray, nested: list,
+            fields: dict) -> pandas.DataFrame:
+    """
+    Build a table of the entries of a nested list of each order.
+
+    Parameter:
+        positions [ndarray] -   position of each order
+        nested [list]       -   list of entries of each order
+        fields [dict]       -   column name and key of the value within
+                                an entry
+
+    Return:
+        [DataFrame]         -   'position' of the order and the fields
+    """
+    entries = list(itertools.chain.from_iterable(nested))
+    table = {'position': numpy.repeat(
+        positions, [len(sublist) for sublist in nested]).astype(int)}
+    for (name, key) in fields.items():
+        table[name] = pandas.Series(
+            list(map(operator.itemgetter(key), entries)), dtype=object)
+    return pandas.DataFrame(table)
+
+
+def transform_dates(dates: pandas.Series) -> numpy.ndarray:
+    """
+    Transform W3C dates into the {DD}/{MM}/{YYYY} format like
+    `utils.transform_date`, each distinct day is only converted once.
+
+    Parameter:
+        dates [Series]      -   dates in W3C format
+
+    Return:
+        [ndarray]           -   dates in {DD}/{MM}/{YYYY} format
+    """
+    if dates.empty:
+        return numpy.empty(0, dtype=object)
+    portions = dates.str.extract(W3C_DATE_PATTERN, expand=False)
+    lookup = {portion: utils.transform_date_portion(date_portion=portion)
+              for portion in portions.dropna().unique()}
+    result = portions.map(lookup).to_numpy(dtype=object)
+    unmatched = portions.isna().to_numpy()
+    if unmatched.any():
+        set_values(target=result, positions=numpy.flatnonzero(unmatched),
+                   values=[utils.transform_date(date=date)
+                           for date in dates[unmatched]])
+    return result
+
+
+def set_documents(tables: dict) -> None:
+    """
+    Take the number and date of the last invoice of each sales order and
+    of the last credit note of each refund in JSON format.
+    """
+    (orders, documents) = (tables['orders'], tables['documents'])
+    owner_types = orders['type_id'][documents['position'].to_numpy()]
+    matching = (((owner_types == 1) &
+                 (documents['type'] == 'invoice').to_numpy()) |
+                ((owner_types == 4) &
+                 (documents['type'] == 'credit_note').to_numpy()))
+    documents = documents[matching].drop_duplicates(subset='position',
+                                                    keep='last')
+    missing = pandas.isna(orders['document_id'])
+    orders['document_id'][missing] = ''
+    orders['document_date'][missing] = ''
+    positions = documents['position'].to_numpy()
+    set_values(target=orders['document_id'], positions=positions,
+               values=documents['number'].tolist())
+    orders['document_date'][positions] = transform_dates(
+        dates=documents['date'])
+
+
+def set_delivery_dates(tables: dict) -> None:
+    """Take the first delivery date (type 5) of each sales order."""
+    (orders, dates) = (tables['orders'], tables['dates'])
+    dates = dates[(dates['type'] == 5).to_numpy()].drop_duplicates(
+        subset='position', keep='first')
+    orders['delivery_date'][pandas.isna(orders['delivery_date'])] = ''
+    orders['delivery_date'][dates['position'].to_numpy()] = transform_dates(
+        dates=dates['date'])
+
+
+def set_quantities(tables: dict) -> None:
+    """Sum the quantities of the items (type 1 and 2) of each order."""
+    (orders, items) = (tables['orders'], tables['items'])
+    missing = pandas.isna(orders['quantity'])
+    items = items[items['type'].isin([1, 2]).to_numpy()]
+    quantities = items['quantity'].infer_objects()
+    count = len(orders['quantity'])
+    if pandas.api.types.is_integer_dtype(quantities):
+        totals = quantities.groupby(items['position']).sum().reindex(
+            range(count), fill_value=0).astype(str).to_numpy(dtype=object)
+    else:
+        # keep the Python types of other quantities, like the row-wise sum
+        sums = {}
+        for (position, value) in zip(items['position'], items['quantity']):
+            sums[position] = sums.get(position, 0) + value
+        totals = numpy.empty(count, dtype=object)
+        totals[:] = [str(sums.get(position, 0)) for position in range(count)]
+    orders['quantity'][missing] = totals[missing]
+
+
+def build_frame(data: list, mapping: dict) -> pandas.DataFrame:
+    """
+    Build the TaxHub report from the orders with vectorized operations.
+
+    Parameter:
+        data [list]         -   API data in JSON format or OrderRecords
+        mapping [dict]      -   Configuration data and VAT data
+
+    Return:
+        [DataFrame]         -   the tax_columns, identical to the rows of
+                                `taxhub.iter_rows`
+    """
+    tables = normalize_orders(data=data)
+    set_documents(tables=tables)
+    set_delivery_dates(tables=tables)
+    set_quantities(tables=tables)
+    orders = tables['orders']
+
+    taxhub.log_missing_data(
+        no_document=orders['id'][orders['document_id'] == ''].tolist(),
+        no_delivery=orders['id'][(orders['delivery_date'] == '') &
+                                 (orders['type_id'] == 1)].tolist())
+
+    vat_index = mapping.get('vat_index') or taxhub.build_vat_index(
+        mapping=mapping)
+    zones = pandas.Series(orders['vat_config_id'], dtype=object).map(
+        vat_index)
+    keep = (zones.notna() & (zones != '')).to_numpy()
+    count = int(keep.sum())
+    if not count:
+        return pandas.DataFrame([], columns=taxhub.tax_columns)
+    orders = {name: values[keep] for (name, values) in orders.items()}
+    zones = zones[keep]
+
+    def to_str(values: numpy.ndarray) -> numpy.ndarray:
+        return pandas.Series(values, dtype=object).astype(str).to_numpy()
+
+    vat_rates = to_str(orders['vat_rate']) + ' %'
+    tax_ids = {country: config.get('tax_id')
+               for (country, config) in mapping['countries'].items()}
+    values = {
+        'Position-Nr.': numpy.arange(1, count + 1).astype(str),
+        'KindOfBusiness': pandas.Series(to_str(orders['type_id'])).map(
+            taxhub.ORDER_TYPE_MAP).to_numpy(),
+        'TransactionId': to_str(orders['id']),
+        'DocumentId': orders['document_id'],
+        'DepatureDate': orders['delivery_date'],
+        'DocumentDate': orders['document_date'],
+        'VatZone': zones.to_numpy(),
+        'VatRate': vat_rates,
+        'VatAmount (in VatZoneCurrency)': to_str(orders['vat_total']),
+        'SourceZone': mapping['fixed_values']['source_zone'],
+        'TargetZone': zones.to_numpy(),
+        'TargetZoneVatId': zones.map(tax_ids).to_numpy(),
+        'TargetZoneVatRate': vat_rates,
+        'MarketZoneCurrencyCode':
+            mapping['fixed_values']['market_zone_currency'],
+        'MarketZoneGross': to_str(orders['gross_total']),
+        'MarketZoneNet': to_str(orders['net_total']),
+        'ItemQuantity': orders['quantity'],
+    }
+    # a single block of objects, filled column by column
+    frame = numpy.full((count, len(taxhub.tax_columns)), '', dtype=object)
+    for (column, value) in values.items():
+        frame[:, taxhub.tax_columns.index(column)] = value
+    return pandas.DataFrame(frame, columns=taxhub.tax_columns)
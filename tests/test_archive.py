@@ -0,0 +1,81 @@
+import gzip
+import json
+
+import pytest
+
+from plenty_taxhub_generator.packages.archive import (ArchiveError,
+                                                      ArchiveWriter,
+                                                      read_archive,
+                                                      write_archive)
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, build_vat_data, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import iter_rows
+
+
+@pytest.fixture
+def sample_archive_orders() -> list:
+    return list(generate_orders(count=30, duplicate_ratio=0.2, seed=2))
+
+
+@pytest.fixture
+def sample_meta() -> dict:
+    return {'start': '2020-09-01', 'end': '2020-09-30',
+            'fetch_mode': 'matrix', 'fetch_key': 'matrix;DE=1;1'}
+
+
+def test_write_and_read_archive(tmp_path, sample_archive_orders: list,
+                                sample_meta: dict) -> None:
+    path = str(tmp_path / 'orders.ndjson.gz')
+    vat_data = {'1': {'config': ['54', '55'], 'TaxId': 'DE123456789'}}
+
+    written = write_archive(path=path, meta=sample_meta, vat_data=vat_data,
+                            orders=sample_archive_orders)
+    (meta, vat_result, orders) = read_archive(path=path)
+
+    assert written == len(sample_archive_orders)
+    assert meta['fetch_key'] == sample_meta['fetch_key']
+    assert vat_data == vat_result
+    assert sample_archive_orders == list(orders)
+
+
+def test_archive_rebuilds_report(tmp_path,
+                                 sample_archive_orders: list) -> None:
+    mapping = build_synthetic_mapping()
+    path = str(tmp_path / 'orders.ndjson.gz')
+    writer = ArchiveWriter(path=path, meta={}, vat_data=build_vat_data())
+
+    expected = list(iter_rows(data=writer.tee(iter(sample_archive_orders)),
+                              mapping=mapping))
+    writer.commit()
+    (_, _, orders) = read_archive(path=path)
+
+    assert expected == list(iter_rows(data=orders, mapping=mapping))
+
+
+def test_discard_keeps_previous_archive(tmp_path, sample_meta: dict,
+                                        sample_archive_orders: list) -> None:
+    path = str(tmp_path / 'orders.ndjson.gz')
+    write_archive(path=path, meta=sample_meta, vat_data={},
+                  orders=sample_archive_orders[:3])
+
+    writer = ArchiveWriter(path=path, meta=sample_meta, vat_data={})
+    writer.write_orders(orders=sample_archive_orders)
+    writer.discard()
+
+    (_, _, orders) = read_archive(path=path)
+    assert 3 == len(list(orders))
+    assert not (tmp_path / 'orders.ndjson.gz.tmp').exists()
+
+
+def test_read_invalid_archive(tmp_path) -> None:
+    plain_path = tmp_path / 'plain.csv'
+    plain_path.write_text('a,b\n')
+    version_path = tmp_path / 'version.ndjson.gz'
+    with gzip.open(version_path, mode='wt') as archive_file:
+        archive_file.write(json.dumps({'type': 'meta', 'version': 99}) + '\n')
+        archive_file.write(json.dumps({'type': 'vat', 'data': {}}) + '\n')
+
+    for path in [plain_path, version_path]:
+        with pytest.raises(ArchiveError):
+            read_archive(path=str(path))
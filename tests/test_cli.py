@@ -0,0 +1,445 @@
+import configparser
+import csv
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from plenty_taxhub_generator.cli import (cli, gather_data_from_config,
+                                         get_config_path, setup_argparser)
+from plenty_taxhub_generator.packages.fetch import get_delivery_country_id
+from plenty_taxhub_generator.packages.archive import (read_archive,
+                                                      write_archive)
+from plenty_taxhub_generator.packages.report import write_report
+from plenty_taxhub_generator.packages.spill import MemoryBudget
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, build_vat_data, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import iter_rows
+
+SAMPLE_CONFIG = """[General]
+base_url=https://synthetic.plentymarkets-cloud01.com
+
+[Mappings]
+referrer_id=1,4,4.01
+country_id=DE=1,AT=2,CZ=6,ES=8,FR=10,IT=15,PL=23
+
+[fixed_values]
+source_zone=DE
+market_zone_currency=EUR
+"""
+
+
+def write_config(path, source_zone: str = 'DE') -> str:
+    """Write the sample config, with the source zone naming the tenant."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(SAMPLE_CONFIG.replace('source_zone=DE',
+                                          f'source_zone={source_zone}'))
+    return str(path)
+
+
+@pytest.fixture
+def home(monkeypatch, tmp_path):
+    """Use @tmp_path as home directory."""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def config_path(home):
+    """Write the sample config into the home directory."""
+    path = home / '.config' / 'plenty_taxhub_generator' / 'config.ini'
+    write_config(path=path)
+    return path
+
+
+def get_vat_data() -> dict:
+    """Build the VAT mapping of the synthetic VAT configurations."""
+    vat_data = {}
+    for entry in build_vat_data():
+        country = vat_data.setdefault(str(entry['countryId']), {
+            'config': [], 'TaxId': entry['taxIdNumber']})
+        country['config'].append(str(entry['id']))
+    return vat_data
+
+
+def set_clients(monkeypatch, clients: dict) -> None:
+    """Log in to the client named after the source zone of the config."""
+    monkeypatch.setattr(
+        'plenty_taxhub_generator.cli.login',
+        lambda mapping: clients[mapping['fixed_values']['source_zone']])
+
+
+def set_argv(monkeypatch, argv: list) -> None:
+    monkeypatch.setattr(sys, 'argv', ['prog'] + argv)
+
+
+
+def test_get_config_path(home, tmp_path) -> None:
+    expected = str(tmp_path / '.config' / 'plenty_taxhub_generator' /
+                   'config.ini')
+
+    assert expected == get_config_path()
+    assert not (tmp_path / '.config').exists()
+
+
+@pytest.mark.parametrize('referrer, expected', [
+    ('1,abc,4.01', ['1', '4.01']),
+    ('abc', None),
+])
+def test_gather_data_from_config_referrer(referrer: str,
+                                          expected: list) -> None:
+    config = configparser.ConfigParser()
+    config.read_string(SAMPLE_CONFIG.replace('referrer_id=1,4,4.01',
+                                             f'referrer_id={referrer}'))
+
+    data = gather_data_from_config(config=config)
+
+    assert expected == (data['referrer'] if data else None)
+
+
+def test_import_skips_heavy_modules() -> None:
+    code = ('import sys, plenty_taxhub_generator.cli; '
+            'print([m for m in ["pandas", "plenty_api", "requests"] '
+            'if m in sys.modules])')
+
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+
+    assert '[]' == result.stdout.strip()
+
+
+def test_version_without_date_range(monkeypatch, capsys) -> None:
+    set_argv(monkeypatch, ['--version'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        setup_argparser()
+
+    assert 0 == exit_info.value.code
+    assert 'plenty_api [' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('argv, valid', [
+    (['--mappings'], True),
+    (['--from', '2020-09-01', '--to', '2020-09-30'], True),
+    (['--from', '2020-09-01'], False),
+])
+def test_date_range_required(monkeypatch, argv: list, valid: bool) -> None:
+    set_argv(monkeypatch, argv)
+
+    if valid:
+        assert setup_argparser()
+    else:
+        with pytest.raises(SystemExit):
+            setup_argparser()
+
+
+@pytest.mark.parametrize('engine', ['rows', 'vectorized'])
+def test_report_from_archive(config_path, tmp_path, engine: str) -> None:
+    orders = list(generate_orders(count=40, duplicate_ratio=0.1, seed=4))
+    write_archive(path=str(tmp_path / 'archive.ndjson.gz'),
+                  vat_data=get_vat_data(), orders=orders,
+                  meta={'start': '2020-09-01', 'end': '2020-09-30',
+                        'fetch_mode': 'matrix', 'fetch_key': ''})
+    write_report(rows=iter_rows(data=orders,
+                                mapping=build_synthetic_mapping()),
+                 path=str(tmp_path / 'expected.csv'))
+    (tmp_path / 'result.csv').touch()
+
+    subprocess.run(
+        [sys.executable, '-m', 'plenty_taxhub_generator', '--from-archive',
+         str(tmp_path / 'archive.ndjson.gz'), '-o',
+         str(tmp_path / 'result.csv'), '--engine', engine],
+        check=True, capture_output=True,
+        env=dict(os.environ, HOME=str(tmp_path)))
+
+    assert ((tmp_path / 'expected.csv').read_bytes() ==
+            (tmp_path / 'result.csv').read_bytes())
+
+
+class FakeTenantApi:
+    """Answer the VAT and order requests of a tenant from synthetic data."""
+    def __init__(self, orders: list, barrier: threading.Barrier):
+        self.orders = orders
+        self.barrier = barrier
+
+    def plenty_api_get_vat_id_mappings(self) -> dict:
+        # only passes, if all tenants are processed at the same time
+        self.barrier.wait(timeout=10)
+        return get_vat_data()
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine) -> list:
+        return [
+            order for order in self.orders
+            if get_delivery_country_id(order=order) == refine['countryId']
+            and float(order['referrerId']) == float(refine['referrerId'])
+        ]
+
+
+def get_batch_configs(tmp_path, tenants) -> list:
+    """Write a config for each tenant of a batch, named after the tenant."""
+    return [write_config(path=tmp_path / f'{tenant}.ini', source_zone=tenant)
+            for tenant in tenants]
+
+
+def test_batch_reports(monkeypatch, tmp_path, home) -> None:
+    barrier = threading.Barrier(2)
+    tenants = {
+        'shop_a': list(generate_orders(count=20, seed=6)),
+        'shop_b': list(generate_orders(count=30, first_id=500, seed=7)),
+    }
+    set_clients(monkeypatch, {
+        tenant: FakeTenantApi(orders=orders, barrier=barrier)
+        for (tenant, orders) in tenants.items()})
+    set_argv(monkeypatch, ['--configs'] + get_batch_configs(
+        tmp_path=tmp_path, tenants=tenants) + [
+        '--from', '2020-09-01', '--to', '2020-10-01', '-o', str(tmp_path)])
+
+    cli()
+
+    for (tenant, orders) in tenants.items():
+        with open(tmp_path / f'{tenant}_tax_hub_report.csv',
+                  encoding='utf-8') as report_file:
+            rows = list(csv.DictReader(report_file))
+        assert ({str(order['id']) for order in orders} ==
+                {row['TransactionId'] for row in rows})
+        assert {tenant} == {row['SourceZone'] for row in rows}
+
+
+def test_batch_reports_failing_tenant(monkeypatch, tmp_path, home) -> None:
+    barrier = threading.Barrier(2)
+    clients = {
+        'shop_a': FakeTenantApi(orders=list(generate_orders(count=20)),
+                                barrier=barrier),
+        'shop_b': FakeTenantApi(orders=[], barrier=barrier),
+    }
+
+    def get_no_vat_data() -> dict:
+        barrier.wait(timeout=10)
+
+    clients['shop_b'].plenty_api_get_vat_id_mappings = get_no_vat_data
+    set_clients(monkeypatch, clients)
+    set_argv(monkeypatch, ['--configs'] + get_batch_configs(
+        tmp_path=tmp_path, tenants=clients) + [
+        '--from', '2020-09-01', '--to', '2020-10-01', '-o', str(tmp_path),
+        '--profile'])
+
+    with pytest.raises(SystemExit):
+        cli()
+
+    assert (tmp_path / 'shop_a_tax_hub_report.csv').exists()
+    assert not (tmp_path / 'shop_b_tax_hub_report.csv').exists()
+    assert list(tmp_path.glob('*profile*'))
+
+
+def test_batch_reports_max_memory(monkeypatch, tmp_path, home) -> None:
+    barrier = threading.Barrier(2)
+    clients = {
+        tenant: FakeTenantApi(
+            orders=list(generate_orders(count=100, first_id=index * 1000,
+                                        seed=index)),
+            barrier=barrier)
+        for (index, tenant) in enumerate(['shop_a', 'shop_b'])
+    }
+    set_clients(monkeypatch, clients)
+    budgets = []
+    original = MemoryBudget.__init__
+
+    def init_budget(budget, max_bytes: int = 0) -> None:
+        budgets.append(max_bytes)
+        original(budget, max_bytes=max_bytes)
+
+    monkeypatch.setattr(MemoryBudget, '__init__', init_budget)
+    set_argv(monkeypatch, ['--configs'] + get_batch_configs(
+        tmp_path=tmp_path, tenants=clients) + [
+        '--from', '2020-09-01', '--to', '2020-10-01', '-o', str(tmp_path),
+        '--max-memory', '0.02'])
+
+    cli()
+
+    # the tenants share the budget of the option
+    assert [int(0.01 * 1024 * 1024)] * 2 == budgets
+    for tenant in clients:
+        assert (tmp_path / f'{tenant}_tax_hub_report.csv').exists()
+
+
+def test_period_reports(monkeypatch, tmp_path, config_path) -> None:
+    orders = list(generate_orders(count=60, start='2020-01-20', days=80,
+                                  seed=8))
+    client = FakeTenantApi(orders=orders, barrier=threading.Barrier(1))
+    ranges = []
+    original = client.plenty_api_get_orders_by_date
+
+    def get_orders(start, end, **kwargs) -> list:
+        ranges.append((start, end))
+        return original(start=start, end=end, **kwargs)
+
+    client.plenty_api_get_orders_by_date = get_orders
+    set_clients(monkeypatch, {'DE': client})
+    (tmp_path / 'report.csv').touch()
+    set_argv(monkeypatch, ['--year', '2020', '--period_length', 'month',
+                           'quarter', '-o', str(tmp_path / 'report.csv')])
+
+    cli()
+
+    def read_ids(name: str) -> list:
+        with open(tmp_path / f'report_{name}.csv',
+                  encoding='utf-8') as report_file:
+            return [row['TransactionId']
+                    for row in csv.DictReader(report_file)]
+
+    months = [read_ids(f'2020-{month:02d}') for month in range(1, 13)]
+    assert {('2020-01-01', '2021-01-01')} == set(ranges)
+    assert sorted(str(order['id']) for order in orders) == sorted(
+        sum(months, []))
+    assert sorted(sum(months[:3], [])) == sorted(read_ids('2020-Q1'))
+    assert [] == read_ids('2020-Q3')
+
+
+@pytest.mark.parametrize('argv', [
+    ['--year', '2020', '--period_length', 'month', 'month'],
+    ['--periods', '2020-09=2020-09-01..2020-10-01', '--year', '2020'],
+    ['--periods', 'a/b=2020-09-01..2020-10-01'],
+    ['--year', '2020', '--from', '2020-09-01', '--to', '2020-10-01'],
+    ['--periods', '2020-09-01..2020-10-01', '--from', '2020-09-01'],
+])
+def test_invalid_period_options(monkeypatch, tmp_path, config_path,
+                                argv: list) -> None:
+    logins = []
+    monkeypatch.setattr('plenty_taxhub_generator.cli.login', logins.append)
+    (tmp_path / 'report.csv').touch()
+    set_argv(monkeypatch, ['-o', str(tmp_path / 'report.csv')] + argv)
+
+    with pytest.raises(SystemExit):
+        cli()
+
+    assert [] == logins
+
+
+def test_mapping_snapshot(monkeypatch, tmp_path, config_path) -> None:
+    client = FakeTenantApi(orders=list(generate_orders(count=20, seed=9)),
+                           barrier=threading.Barrier(1))
+    vat_requests = []
+    original = client.plenty_api_get_vat_id_mappings
+
+    def count_vat_requests() -> dict:
+        vat_requests.append(1)
+        return original()
+
+    client.plenty_api_get_vat_id_mappings = count_vat_requests
+    set_clients(monkeypatch, {'DE': client})
+    (tmp_path / 'report.csv').touch()
+    counts = []
+    reports = set()
+    for (argv, modify) in [([], False), ([], False),
+                           (['--mapping_ttl', '0'], False), ([], True),
+                           ([], False)]:
+        if modify:
+            config_path.write_text(SAMPLE_CONFIG + '\n')
+        set_argv(monkeypatch, ['--from', '2020-09-01', '--to', '2020-10-01',
+                               '-o', str(tmp_path / 'report.csv')] + argv)
+
+        cli()
+
+        counts.append(len(vat_requests))
+        reports.add((tmp_path / 'report.csv').read_bytes())
+
+    # reused until the config is modified, a TTL of 0 skips the snapshot
+    assert [1, 1, 2, 3, 3] == counts
+    assert 1 == len(reports)
+
+
+@pytest.mark.parametrize('argv', [[], ['--shard', 'week'], ['--jobs', '3'],
+                                  ['--year', '2020']])
+def test_max_memory(monkeypatch, tmp_path, config_path,
+                    argv: list) -> None:
+    set_clients(monkeypatch, {'DE': FakeTenantApi(
+        orders=list(generate_orders(count=200, duplicate_ratio=0.1,
+                                    seed=11)),
+        barrier=threading.Barrier(1))})
+    spill_paths = []
+    original = MemoryBudget.get_spill_path
+
+    def get_spill_path(budget) -> str:
+        spill_paths.append(original(budget))
+        return spill_paths[-1]
+
+    monkeypatch.setattr(MemoryBudget, 'get_spill_path', get_spill_path)
+    if '--year' not in argv:
+        argv = argv + ['--from', '2020-09-01', '--to', '2020-10-01']
+    reports = []
+    for budget in [[], ['--max-memory', '0.02']]:
+        (tmp_path / 'report.csv').touch()
+        set_argv(monkeypatch,
+                 ['-o', str(tmp_path / 'report.csv')] + argv + budget)
+
+        cli()
+
+        name = 'report_2020-09.csv' if '--year' in argv else 'report.csv'
+        reports.append((tmp_path / name).read_bytes())
+
+    assert reports[0].count(b'\n') > 150
+    assert reports[0] == reports[1]
+    assert spill_paths
+    assert not any(os.path.exists(path) for path in spill_paths)
+
+
+@pytest.mark.parametrize('argv', [['--engine', 'vectorized'],
+                                  ['--incremental'], ['--stream']])
+def test_max_memory_unsupported(monkeypatch, argv: list) -> None:
+    set_argv(monkeypatch, ['--from', '2020-09-01', '--to', '2020-10-01',
+                           '--max-memory', '64'] + argv)
+
+    with pytest.raises(SystemExit):
+        setup_argparser()
+
+
+def test_stream_archive_discarded(monkeypatch, tmp_path,
+                                  config_path) -> None:
+    set_clients(monkeypatch, {'DE': FakeTenantApi(
+        orders=[], barrier=threading.Barrier(1))})
+    # the stream requests the order pages directly
+    monkeypatch.setattr(
+        'plenty_taxhub_generator.packages.fetch.iter_orders',
+        lambda **kwargs: generate_orders(count=20, seed=12))
+
+    def write_report(rows, **kwargs) -> None:
+        next(iter(rows))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('plenty_taxhub_generator.packages.report.'
+                        'write_report', write_report)
+    (tmp_path / 'report.csv').touch()
+    set_argv(monkeypatch, [
+        '--from', '2020-09-01', '--to', '2020-10-01', '--stream',
+        '--archive', str(tmp_path / 'archive.ndjson.gz'), '-o',
+        str(tmp_path / 'report.csv')])
+
+    with pytest.raises(KeyboardInterrupt):
+        cli()
+
+    assert not list(tmp_path.glob('archive.ndjson.gz*'))
+
+
+@pytest.mark.parametrize('argv', [['--from', '2020-09-01', '--to',
+                                   '2020-10-01'],
+                                  ['--periods', '2020-09-01..2020-10-01']])
+def test_archive_keeps_orders(monkeypatch, tmp_path, config_path,
+                              argv: list) -> None:
+    orders = list(generate_orders(count=30, seed=14))
+    set_clients(monkeypatch, {'DE': FakeTenantApi(
+        orders=orders, barrier=threading.Barrier(1))})
+    (tmp_path / 'report.csv').touch()
+    set_argv(monkeypatch, [
+        '--archive', str(tmp_path / 'archive.ndjson.gz'), '-o',
+        str(tmp_path / 'report.csv')] + argv)
+
+    cli()
+
+    # the orders are archived before they are reduced for the report
+    (_, _, archived) = read_archive(path=str(tmp_path / 'archive.ndjson.gz'))
+    assert sorted(orders, key=lambda order: order['id']) == sorted(
+        archived, key=lambda order: order['id'])
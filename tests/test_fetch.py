@@ -0,0 +1,239 @@
+import threading
+import time
+
+import pytest
+
+from plenty_taxhub_generator.packages.fetch import (build_fetch_tasks,
+                                                    fetch_orders,
+                                                    get_delivery_country_id,
+                                                    iter_order_pages,
+                                                    iter_orders,
+                                                    partition_orders,
+                                                    sweep_orders
+                                                    )
+
+
+class FakePlentyApi:
+    """Answer order requests with one order per country/referrer pair."""
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine):
+        with self.lock:
+            self.calls.append(refine)
+        # answer the first requests last, to shuffle the completion order
+        time.sleep(self.delay / int(refine['countryId']))
+        return [{'id': f"{refine['countryId']}-{refine['referrerId']}"}]
+
+
+class FakeSweepApi:
+    """Answer every order request with the same list of orders."""
+    def __init__(self, orders: list):
+        self.orders = orders
+        self.calls = []
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine):
+        self.calls.append({'additional': additional, 'refine': refine})
+        return self.orders
+
+
+class FakeResponse:
+    def __init__(self, body: dict, status_code: int = 200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakePagedApi:
+    """Client attributes used by the page iterator, with canned pages."""
+    def __init__(self, pages: list):
+        self.url = 'https://test.plentymarkets-cloud01.com'
+        self.creds = {'Authorization': 'Bearer token'}
+        self.pages = pages
+        self.queries = []
+
+    def get(self, endpoint, headers, params):
+        self.queries.append(dict(params))
+        entries = self.pages[params['page'] - 1]
+        return FakeResponse(body={
+            'page': params['page'], 'entries': entries,
+            'isLastPage': params['page'] == len(self.pages),
+            'lastPageNumber': len(self.pages)
+        })
+
+
+def address_order(order_id: int, referrer, delivery: int = 0,
+                  billing: int = 0) -> dict:
+    order = {'id': order_id, 'referrerId': referrer, 'addressRelations': [],
+             'addresses': []}
+    if billing:
+        order['addressRelations'].append({'typeId': 1, 'addressId': 100})
+        order['addresses'].append({'id': 100, 'countryId': billing})
+    if delivery:
+        order['addressRelations'].append({'typeId': 2, 'addressId': 200})
+        order['addresses'].append({'id': 200, 'countryId': delivery})
+    return order
+
+
+@pytest.fixture
+def sample_sweep_orders() -> list:
+    samples = [
+        address_order(order_id=1, referrer=4, delivery=2, billing=1),
+        address_order(order_id=2, referrer=1, billing=10),
+        address_order(order_id=3, referrer=1, delivery=1),
+        address_order(order_id=4, referrer=4.01, delivery=1),
+        address_order(order_id=5, referrer=1, delivery=12),
+        address_order(order_id=6, referrer=4, delivery=1),
+        address_order(order_id=7, referrer=1),
+    ]
+    return samples
+
+
+@pytest.fixture
+def sample_fetch_mapping() -> dict:
+    mapping = {
+        'countries': {
+            'DE': {'country_id': '1', 'vat_conf': [], 'tax_id': ''},
+            'AT': {'country_id': '2', 'vat_conf': [], 'tax_id': ''},
+            'FR': {'country_id': '10', 'vat_conf': [], 'tax_id': ''},
+        },
+        'referrer': ['1', '4'],
+    }
+    return mapping
+
+
+def test_build_fetch_tasks(sample_fetch_mapping: dict) -> None:
+    expected = [('DE', '1'), ('DE', '4'), ('AT', '1'), ('AT', '4'),
+                ('FR', '1'), ('FR', '4')]
+
+    result = build_fetch_tasks(mapping=sample_fetch_mapping)
+
+    assert expected == result
+
+
+def test_fetch_orders_deterministic_order(sample_fetch_mapping: dict) -> None:
+    expected = [{'id': '1-1'}, {'id': '1-4'}, {'id': '2-1'}, {'id': '2-4'},
+                {'id': '10-1'}, {'id': '10-4'}]
+    result = []
+
+    for jobs in [1, 3, 6]:
+        plenty = FakePlentyApi(delay=0.05)
+        result.append(fetch_orders(plenty=plenty, start='2020-09-01',
+                                   end='2020-09-30',
+                                   mapping=sample_fetch_mapping, jobs=jobs))
+        assert len(plenty.calls) == 6
+
+    assert [expected, expected, expected] == result
+
+
+def test_fetch_orders_convert(sample_fetch_mapping: dict) -> None:
+    expected = ['1-1', '1-4', '2-1', '2-4', '10-1', '10-4']
+    result = []
+
+    for jobs in [1, 3]:
+        result.append(fetch_orders(
+            plenty=FakePlentyApi(delay=0.05), start='2020-09-01',
+            end='2020-09-30', mapping=sample_fetch_mapping, jobs=jobs,
+            convert=lambda order: order['id']))
+
+    assert [expected, expected] == result
+
+
+def test_get_delivery_country_id(sample_sweep_orders: list) -> None:
+    expected = ['2', '10', '1', '1', '12', '1', '']
+    result = []
+
+    for sample in sample_sweep_orders:
+        result.append(get_delivery_country_id(order=sample))
+
+    assert expected == result
+
+
+def test_partition_orders(sample_sweep_orders: list,
+                          sample_fetch_mapping: dict) -> None:
+    expected = [3, 6, 1, 2]
+
+    result = partition_orders(orders=sample_sweep_orders,
+                              mapping=sample_fetch_mapping)
+
+    assert expected == [order['id'] for order in result]
+
+
+def test_partition_orders_convert(sample_sweep_orders: list,
+                                  sample_fetch_mapping: dict) -> None:
+    converted = []
+
+    def convert(order):
+        converted.append(order['id'])
+        return order['id']
+
+    result = partition_orders(orders=sample_sweep_orders,
+                              mapping=sample_fetch_mapping, convert=convert)
+
+    # only the orders of the configuration are converted
+    assert [3, 6, 1, 2] == result
+    assert [1, 2, 3, 6] == converted
+
+
+def test_partition_orders_all_referrer(sample_sweep_orders: list,
+                                       sample_fetch_mapping: dict) -> None:
+    sample_fetch_mapping['referrer'] = ['ALL']
+    expected = [3, 4, 6, 1, 2]
+
+    result = partition_orders(orders=sample_sweep_orders,
+                              mapping=sample_fetch_mapping)
+
+    assert expected == [order['id'] for order in result]
+
+
+def test_sweep_orders(sample_sweep_orders: list,
+                      sample_fetch_mapping: dict) -> None:
+    plenty = FakeSweepApi(orders=sample_sweep_orders)
+    expected = [3, 6, 1, 2]
+
+    result = sweep_orders(plenty=plenty, start='2020-09-01', end='2020-09-30',
+                          mapping=sample_fetch_mapping)
+
+    assert expected == [order['id'] for order in result]
+    assert len(plenty.calls) == 1
+    assert plenty.calls[0]['refine'] == {'orderType': '1,4'}
+    assert 'addresses' in plenty.calls[0]['additional']
+
+
+def test_iter_order_pages(monkeypatch) -> None:
+    plenty = FakePagedApi(pages=[[{'id': 1}, {'id': 2}], [{'id': 3}]])
+    monkeypatch.setattr(
+        'plenty_taxhub_generator.packages.transport.TRANSPORT', plenty)
+
+    pages = iter_order_pages(plenty=plenty, start='2020-09-01',
+                             end='2020-09-30', date_type='Payment',
+                             additional=['documents'],
+                             refine={'orderType': '1,4'})
+    first = next(pages)
+
+    assert [{'id': 1}, {'id': 2}] == first
+    assert len(plenty.queries) == 1
+    assert [[{'id': 3}]] == list(pages)
+    assert plenty.queries[1]['page'] == 2
+    assert plenty.queries[1]['orderType'] == '1,4'
+    assert 'paidAtFrom' in plenty.queries[1]
+
+
+def test_iter_orders_sweep(monkeypatch, sample_sweep_orders: list,
+                           sample_fetch_mapping: dict) -> None:
+    plenty = FakePagedApi(pages=[sample_sweep_orders[:3],
+                                 sample_sweep_orders[3:]])
+    monkeypatch.setattr(
+        'plenty_taxhub_generator.packages.transport.TRANSPORT', plenty)
+    expected = [1, 2, 3, 6]
+
+    result = iter_orders(plenty=plenty, start='2020-09-01', end='2020-09-30',
+                         mapping=sample_fetch_mapping, fetch_mode='sweep')
+
+    assert expected == [order['id'] for order in result]
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from plenty_taxhub_generator.packages.idset import MAX_ARRAY_SIZE, OrderIdSet
+
+
+@pytest.mark.parametrize('ids', [
+    list(range(1000, 1000 + 3 * MAX_ARRAY_SIZE)) * 2,
+    random.Random(2).choices(range(2**32), k=5000) * 2,
+    random.Random(3).choices(range(70000), k=20000),
+    [5, -1, '7', 5, '7', -1, 0, 2**70, 2**70],
+])
+def test_order_id_set(ids: list) -> None:
+    expected = set()
+    id_set = OrderIdSet()
+
+    added = [id_set.add(order_id) for order_id in ids]
+
+    for order_id in ids:
+        expected_new = order_id not in expected
+        expected.add(order_id)
+        assert expected_new == added.pop(0)
+        assert order_id in id_set
+    assert len(expected) == len(id_set)
+    assert 3 not in id_set and 2**32 + 1 not in id_set
+
+
+def test_order_id_set_memory() -> None:
+    id_set = OrderIdSet(ids=range(100000, 300000))
+
+    # dense IDs are kept as bitmaps of one bit per ID in their range
+    assert 200000 == len(id_set)
+    assert id_set.memory_size() <= (300000 // 65536 + 1) * 8192
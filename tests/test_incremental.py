@@ -0,0 +1,88 @@
+import copy
+import json
+
+import pytest
+
+from plenty_taxhub_generator.packages.incremental import (ReportState,
+                                                          write_delta)
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import iter_rows
+
+
+@pytest.fixture
+def sample_orders() -> list:
+    return list(generate_orders(count=50, days=5, seed=3))
+
+
+def run(orders: list, mapping: dict, tmp_path) -> tuple:
+    state = ReportState(path=str(tmp_path / 'report.csv.state.gz'),
+                        mapping=mapping)
+    rows = list(state.iter_rows(data=orders))
+    delta = write_delta(state=state, path=str(tmp_path / 'delta.json'))
+    return (rows, state, delta)
+
+
+def test_incremental_rows_match(sample_orders: list, tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    expected = list(iter_rows(data=sample_orders, mapping=mapping))
+
+    (first, _, delta) = run(orders=sample_orders, mapping=mapping,
+                            tmp_path=tmp_path)
+    (second, state, _) = run(orders=sample_orders, mapping=mapping,
+                             tmp_path=tmp_path)
+
+    assert expected == first
+    assert expected == second
+    assert len(expected) == len(delta['added'])
+    assert len(expected) == state.reused
+
+
+def test_incremental_delta(sample_orders: list, tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    run(orders=sample_orders, mapping=mapping, tmp_path=tmp_path)
+    changed = copy.deepcopy(sample_orders[1:])
+    changed[0]['amounts'][0]['grossTotal'] += 10
+    changed[0]['updatedAt'] = '2020-10-01T12:00:00+02:00'
+    changed.append(next(generate_orders(count=1, first_id=900000)))
+
+    (rows, state, delta) = run(orders=changed, mapping=mapping,
+                               tmp_path=tmp_path)
+
+    assert list(iter_rows(data=changed, mapping=mapping)) == rows
+    assert [str(changed[-1]['id'])] == delta['added']
+    assert [str(changed[0]['id'])] == delta['changed']
+    assert [str(sample_orders[0]['id'])] == delta['removed']
+    assert len(changed) - 2 == state.reused
+    with open(tmp_path / 'delta.json', encoding='utf-8') as delta_file:
+        assert delta == json.load(delta_file)
+
+
+def test_incremental_mapping_change(sample_orders: list, tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    run(orders=sample_orders, mapping=mapping, tmp_path=tmp_path)
+    mapping['countries']['DE']['tax_id'] = 'DE999999999'
+
+    (rows, state, delta) = run(orders=sample_orders, mapping=mapping,
+                               tmp_path=tmp_path)
+
+    assert list(iter_rows(data=sample_orders, mapping=mapping)) == rows
+    assert 0 == state.reused
+    assert delta['changed']
+    assert not delta['added'] and not delta['removed']
+
+
+def test_incremental_without_timestamp(sample_orders: list,
+                                       tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    for order in sample_orders[:10]:
+        del order['updatedAt']
+    run(orders=sample_orders, mapping=mapping, tmp_path=tmp_path)
+
+    (rows, state, delta) = run(orders=sample_orders, mapping=mapping,
+                               tmp_path=tmp_path)
+
+    assert list(iter_rows(data=sample_orders, mapping=mapping)) == rows
+    assert len(sample_orders) - 10 == state.reused
+    assert not delta['changed']
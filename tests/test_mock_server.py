@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+import requests
+
+from plenty_taxhub_generator.packages.fetch import iter_orders
+from plenty_taxhub_generator.packages.mock_server import (MOCK_TOKEN,
+                                                          build_order_index,
+                                                          create_server,
+                                                          filter_orders,
+                                                          paginate
+                                                          )
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import iter_rows
+from plenty_taxhub_generator.packages.transport import Transport
+
+
+class MockClient:
+    """Attributes of the PlentyApi client used by the page iterator."""
+    def __init__(self, url: str):
+        self.url = url
+        self.creds = {'Authorization': f'Bearer {MOCK_TOKEN}'}
+
+
+@pytest.fixture
+def sample_server_orders() -> list:
+    return list(generate_orders(count=120, days=10, duplicate_ratio=0.2,
+                                seed=1))
+
+
+@pytest.fixture
+def mock_server(sample_server_orders: list):
+    server = create_server(orders=sample_server_orders, items_per_page=25)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_orders_duplicates(sample_server_orders: list) -> None:
+    ids = [order['id'] for order in sample_server_orders]
+
+    assert len(set(ids)) == 120
+    assert len(ids) > 120
+
+
+def test_paginate() -> None:
+    entries = list(range(7))
+    expected = [([0, 1, 2], False, 3), ([6], True, 3), ([], True, 1)]
+    result = []
+
+    for (sample, page) in [(entries, 1), (entries, 3), ([], 1)]:
+        response = paginate(entries=sample, page=page, items_per_page=3)
+        result.append((response['entries'], response['isLastPage'],
+                       response['lastPageNumber']))
+
+    assert expected == result
+
+
+def test_filter_orders(sample_server_orders: list) -> None:
+    index = build_order_index(orders=sample_server_orders)
+    query = {'paidAtFrom': '2020-09-02T00:00:00+02:00',
+             'paidAtTo': '2020-09-04T00:00:00+02:00',
+             'countryId': '1', 'orderType': '1'}
+
+    result = filter_orders(index=index, query=query)
+
+    assert result
+    for order in result:
+        assert order['typeId'] == 1
+        assert order['addresses'][1]['countryId'] == 1
+        assert '2020-09-02' <= order['dates'][1]['date'][:10] < '2020-09-04'
+
+
+def test_mock_server_routes(mock_server) -> None:
+    login = requests.post(mock_server.url + '/rest/login',
+                          params={'username': 'a', 'password': 'b'}).json()
+    headers = {'Authorization': f"{login['token_type']} "
+                                f"{login['access_token']}"}
+
+    vat = requests.get(mock_server.url + '/rest/vat', headers=headers).json()
+    denied = requests.get(mock_server.url + '/rest/orders')
+
+    assert vat['isLastPage']
+    assert {'id', 'countryId', 'taxIdNumber'} <= set(vat['entries'][0])
+    assert denied.status_code == 401
+
+
+def test_mock_server_fetch_modes(mock_server,
+                                 sample_server_orders: list) -> None:
+    mapping = build_synthetic_mapping()
+    client = MockClient(url=mock_server.url)
+    result = {}
+
+    for mode in ['matrix', 'sweep']:
+        orders = iter_orders(plenty=client, start='2020-09-01T00:00:00+02:00',
+                             end='2020-09-11T00:00:00+02:00', mapping=mapping,
+                             fetch_mode=mode)
+        result[mode] = sorted(row[2] for row in iter_rows(data=orders,
+                                                          mapping=mapping))
+
+    expected = sorted({str(order['id']) for order in sample_server_orders})
+    assert expected == result['matrix']
+    assert expected == result['sweep']
+
+
+def test_pooled_transport(monkeypatch, mock_server) -> None:
+    pooled = Transport(pool_size=2)
+    monkeypatch.setattr(
+        'plenty_taxhub_generator.packages.transport.TRANSPORT', pooled)
+    client = MockClient(url=mock_server.url)
+
+    orders = list(iter_orders(plenty=client,
+                              start='2020-09-01T00:00:00+02:00',
+                              end='2020-09-11T00:00:00+02:00',
+                              mapping=build_synthetic_mapping(),
+                              fetch_mode='sweep'))
+    vat = pooled.get(mock_server.url + '/rest/vat', headers=client.creds)
+    pooled.close()
+
+    assert len(orders) > 25
+    assert mock_server.requests > 1
+    assert mock_server.connections == 1
+    assert vat.headers['Content-Encoding'] == 'gzip'
+    assert vat.json()['entries']
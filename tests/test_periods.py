@@ -0,0 +1,93 @@
+import pytest
+
+from plenty_taxhub_generator.packages.periods import (build_year_periods,
+                                                      bucket_orders,
+                                                      get_duplicate_names,
+                                                      merge_periods,
+                                                      parse_period)
+from plenty_taxhub_generator.packages.taxhub import OrderRecord
+
+
+def paid_order(order_id: int, paid_at: str) -> dict:
+    return {'id': order_id, 'dates': [{'typeId': 3, 'date': paid_at}]}
+
+
+def test_build_year_periods() -> None:
+    result = build_year_periods(year=2020, lengths=['month', 'quarter'])
+
+    assert 16 == len(result)
+    assert ('2020-02', '2020-02-01', '2020-03-01') == result[1]
+    assert ('2020-12', '2020-12-01', '2021-01-01') == result[11]
+    assert ('2020-Q3', '2020-07-01', '2020-10-01') == result[14]
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2020-01-01..2020-02-01',
+     ('2020-01-01_2020-02-01', '2020-01-01', '2020-02-01')),
+    ('jan=2020-01-01T00:00..2020-02-01',
+     ('jan', '2020-01-01T00:00', '2020-02-01')),
+    ('2020/01/01..2020/02/01',
+     ('2020-01-01_2020-02-01', '2020/01/01', '2020/02/01')),
+    ('2020-02-01..2020-01-01', None),
+    ('2020-01-01', None),
+    ('a/b=2020-01-01..2020-02-01', None),
+    ('a\\b=2020-01-01..2020-02-01', None),
+])
+def test_parse_period(value: str, expected: tuple) -> None:
+    assert expected == parse_period(value=value)
+
+
+def test_get_duplicate_names() -> None:
+    sample = build_year_periods(year=2020, lengths=['month', 'month'])
+    sample.append(('2020-Q1', '2020-01-01', '2020-04-01'))
+
+    assert [f'2020-{month:02d}' for month in range(1, 13)] == (
+        get_duplicate_names(periods=sample))
+    assert [] == get_duplicate_names(periods=sample[12:])
+
+
+def test_merge_periods() -> None:
+    sample = [('b', '2020-03-01', '2020-04-01'),
+              ('a', '2020-01-01', '2020-02-01'),
+              ('q', '2020-01-01', '2020-03-01'),
+              ('x', '2020-06-01', '2020-07-01')]
+
+    assert [('2020-01-01', '2020-04-01'), ('2020-06-01', '2020-07-01')] == (
+        merge_periods(periods=sample))
+
+
+def test_bucket_orders() -> None:
+    sample = build_year_periods(year=2020, lengths=['month', 'quarter'])
+    orders = [paid_order(1, '2020-01-31T23:59:59'),
+              paid_order(2, '2020-02-01T00:00:00'),
+              paid_order(3, '2020-04-15T10:00:00'),
+              paid_order(4, '2021-01-01T00:00:00'),
+              {'id': 5, 'dates': []}]
+    converted = []
+
+    def convert(order):
+        converted.append(order['id'])
+        return order['id']
+
+    result = bucket_orders(orders=orders, periods=sample, convert=convert)
+
+    assert [1] == result['2020-01']
+    assert [2] == result['2020-02']
+    assert [1, 2] == result['2020-Q1']
+    assert [3] == result['2020-Q2']
+    assert [] == result['2020-12']
+    assert [1, 2, 3] == converted
+
+
+def test_bucket_orders_records() -> None:
+    sample = build_year_periods(year=2020, lengths=['quarter'])
+    orders = [paid_order(1, '2020-03-31T23:59:59'),
+              paid_order(2, '2020-04-01T00:00:00'),
+              {'id': 3, 'dates': []}]
+    records = [OrderRecord(dict(order, typeId=2)) for order in orders]
+
+    result = bucket_orders(orders=records, periods=sample)
+
+    assert [records[0]] == result['2020-Q1']
+    assert [records[1]] == result['2020-Q2']
+    assert [] == result['2020-Q3']
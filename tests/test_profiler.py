@@ -0,0 +1,49 @@
+import json
+
+from plenty_taxhub_generator.packages.profiler import Profiler
+
+
+def test_stage_records_orders() -> None:
+    prof = Profiler(enabled=True)
+
+    for count in [3, 4]:
+        with prof.stage('fetch') as record:
+            record['orders'] = count
+
+    stage = prof.summary()['stages']['fetch']
+    assert (2, 7) == (stage['calls'], stage['orders'])
+    assert stage['seconds'] >= 0
+
+
+def test_wrap_iter_counts_elements() -> None:
+    prof = Profiler(enabled=True)
+
+    result = list(prof.wrap_iter('transform', iter(['a', 'b', 'c'])))
+
+    stage = prof.summary()['stages']['transform']
+    assert ['a', 'b', 'c'] == result
+    assert (1, 3) == (stage['calls'], stage['orders'])
+
+
+def test_disabled_profiler_records_nothing() -> None:
+    prof = Profiler()
+    sample = iter([1, 2])
+
+    with prof.stage('fetch') as record:
+        record['orders'] = 2
+
+    assert sample is prof.wrap_iter('transform', sample)
+    assert {} == prof.summary()['stages']
+
+
+def test_write_summary(tmp_path) -> None:
+    prof = Profiler(enabled=True)
+    path = tmp_path / 'report.csv.profile.json'
+    with prof.stage('write') as record:
+        record['orders'] = 1
+
+    prof.write(path=str(path))
+
+    result = json.loads(path.read_text())
+    assert ['write'] == list(result['stages'])
+    assert result['total_seconds'] >= result['stages']['write']['seconds']
@@ -0,0 +1,94 @@
+import datetime
+
+import pandas
+import pytest
+
+from plenty_taxhub_generator.packages.report import (PARQUET_TYPES,
+                                                     write_report)
+from plenty_taxhub_generator.packages.taxhub import tax_columns
+
+
+def report_row(position: int) -> list:
+    row = [str(position), 'SALE', str(10000 + position), 'R2020,"1"']
+    return row + [''] * (len(tax_columns) - len(row))
+
+
+def test_write_report_backends(tmp_path) -> None:
+    rows = [report_row(position=x) for x in range(1, 8)]
+    expected_path = tmp_path / 'expected.csv'
+    pandas.DataFrame(rows, columns=tax_columns).to_csv(
+        expected_path, index=False, header=True)
+
+    for backend in ['csv', 'pandas']:
+        result_path = tmp_path / f'{backend}.csv'
+        written = write_report(rows=iter(rows), path=str(result_path),
+                               backend=backend, chunk_size=3)
+
+        assert written == 7
+        assert expected_path.read_bytes() == result_path.read_bytes()
+
+
+def test_write_report_empty(tmp_path) -> None:
+    expected_path = tmp_path / 'expected.csv'
+    pandas.DataFrame([], columns=tax_columns).to_csv(
+        expected_path, index=False, header=True)
+
+    for backend in ['csv', 'pandas']:
+        result_path = tmp_path / f'{backend}.csv'
+        written = write_report(rows=iter([]), path=str(result_path),
+                               backend=backend)
+
+        assert written == 0
+        assert expected_path.read_bytes() == result_path.read_bytes()
+
+
+def test_write_report_stdout(capsys) -> None:
+    rows = [report_row(position=1)]
+
+    written = write_report(rows=rows, path='-', backend='csv')
+
+    assert written == 1
+    assert capsys.readouterr().out.splitlines()[1].startswith(
+        '1,SALE,10001,"R2020,""1"""')
+
+
+def test_write_report_parquet(tmp_path) -> None:
+    parquet = pytest.importorskip('pyarrow.parquet')
+    rows = [report_row(position=x) for x in range(1, 6)]
+    rows[0][tax_columns.index('DocumentDate')] = '01/09/2020'
+    rows[0][tax_columns.index('VatRate')] = '19 %'
+    rows[0][tax_columns.index('MarketZoneGross')] = '11.9'
+    rows[0][tax_columns.index('ItemQuantity')] = '3'
+    csv_path = tmp_path / 'report.csv'
+    parquet_path = tmp_path / 'report.parquet'
+
+    written = write_report(rows=iter(rows), path=str(csv_path),
+                           parquet_path=str(parquet_path))
+
+    table = parquet.read_table(str(parquet_path))
+    first = table.slice(0, 1).to_pylist()[0]
+    assert written == 5
+    assert tax_columns == table.column_names
+    assert 5 == table.num_rows
+    assert str(table.schema.field('VatRate').type) == 'double'
+    assert str(table.schema.field('TransactionId').type) == 'int64'
+    assert [1, 10001, datetime.date(2020, 9, 1), 19.0, 11.9, 3] == [
+        first['Position-Nr.'], first['TransactionId'], first['DocumentDate'],
+        first['VatRate'], first['MarketZoneGross'], first['ItemQuantity']]
+    assert first['KindOfBusiness'] == 'SALE'
+    assert first['ArrivalDate'] is None
+    assert set(PARQUET_TYPES).issubset(tax_columns)
+
+
+def test_write_report_parquet_quantity(tmp_path) -> None:
+    parquet = pytest.importorskip('pyarrow.parquet')
+    rows = [report_row(position=x) for x in range(1, 4)]
+    for (row, quantity) in zip(rows, ['6.0', '1.5', 2]):
+        row[tax_columns.index('ItemQuantity')] = quantity
+
+    write_report(rows=iter(rows), path=str(tmp_path / 'report.csv'),
+                 parquet_path=str(tmp_path / 'report.parquet'))
+
+    table = parquet.read_table(str(tmp_path / 'report.parquet'))
+    assert [6.0, 1.5, 2.0] == table.column('ItemQuantity').to_pylist()
+    assert 3 == len((tmp_path / 'report.csv').read_text().splitlines()) - 1
@@ -0,0 +1,189 @@
+import json
+
+import pytest
+
+from plenty_taxhub_generator.packages.fetch import (FetchError,
+                                                    fetch_range,
+                                                    get_delivery_country_id
+                                                    )
+from plenty_taxhub_generator.packages.shard import (fetch_sharded,
+                                                    get_checkpoint_key,
+                                                    load_checkpoint,
+                                                    split_date_range
+                                                    )
+from plenty_taxhub_generator.packages.store import (get_payment_date,
+                                                    normalize_date)
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import OrderRecord
+
+
+class FakeWindowApi:
+    """Answer with one order per window and an order on the boundary."""
+    def __init__(self, fail: list = None):
+        self.fail = fail or []
+        self.calls = []
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine):
+        self.calls.append(start)
+        if start in self.fail:
+            return None
+        return [{'id': start}, {'id': end}]
+
+
+class FakeMatrixApi:
+    """Answer the requests of the matrix mode from synthetic orders."""
+    def __init__(self, orders: list):
+        self.orders = orders
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine):
+        (start, end) = (normalize_date(date=start), normalize_date(date=end))
+        return [
+            order for order in self.orders
+            if start <= get_payment_date(order=order) <= end
+            and get_delivery_country_id(order=order) == refine['countryId']
+            and float(order['referrerId']) == float(refine['referrerId'])
+        ]
+
+
+@pytest.fixture
+def sample_shard_mapping() -> dict:
+    mapping = {
+        'countries': {
+            'DE': {'country_id': '1', 'vat_conf': [], 'tax_id': ''},
+        },
+        'referrer': ['1'],
+    }
+    return mapping
+
+
+def test_split_date_range() -> None:
+    expected = [
+        [('2020-09-01T00:00:00', '2020-09-02T00:00:00'),
+         ('2020-09-02T00:00:00', '2020-09-03T00:00:00'),
+         ('2020-09-03T00:00:00', '2020-09-03T12:00:00')],
+        [('2020-09-01T00:00:00', '2020-09-08T00:00:00'),
+         ('2020-09-08T00:00:00', '2020-09-10T00:00:00')],
+        [],
+        [],
+    ]
+    samples = [
+        ('2020-09-01', '2020-09-03T12:00', 'day'),
+        ('2020-09-01', '2020-09-10', 'week'),
+        ('2020-09-10', '2020-09-01', 'day'),
+        ('abc', '2020-09-01', 'day'),
+    ]
+    result = []
+
+    for (start, end, window) in samples:
+        result.append(split_date_range(start=start, end=end, window=window))
+
+    assert expected == result
+
+
+def test_fetch_sharded_resume(tmp_path, sample_shard_mapping: dict) -> None:
+    checkpoint_path = str(tmp_path / 'report.checkpoint')
+    plenty = FakeWindowApi(fail=['2020-09-02T00:00:00'])
+    expected = ['2020-09-01T00:00:00', '2020-09-02T00:00:00',
+                '2020-09-03T00:00:00', '2020-09-04T00:00:00']
+
+    with pytest.raises(FetchError):
+        fetch_sharded(plenty=plenty, start='2020-09-01', end='2020-09-04',
+                      mapping=sample_shard_mapping, window='day',
+                      checkpoint_path=checkpoint_path, jobs=2)
+    key = get_checkpoint_key(mapping=sample_shard_mapping,
+                             fetch_mode='matrix')
+    assert len(load_checkpoint(path=checkpoint_path, key=key)) == 2
+
+    plenty = FakeWindowApi()
+    result = fetch_sharded(plenty=plenty, start='2020-09-01',
+                           end='2020-09-04', mapping=sample_shard_mapping,
+                           window='day', checkpoint_path=checkpoint_path,
+                           jobs=2)
+
+    assert plenty.calls == ['2020-09-02T00:00:00']
+    assert expected == [order['id'] for order in result]
+
+
+def test_load_checkpoint_ignores_foreign_entries(tmp_path) -> None:
+    checkpoint_path = tmp_path / 'report.checkpoint'
+    lines = [
+        json.dumps({'key': 'a', 'start': '1', 'end': '2', 'tasks': [[1]]}),
+        json.dumps({'key': 'b', 'start': '2', 'end': '3', 'tasks': [[2]]}),
+        json.dumps({'key': 'a', 'start': '4', 'end': '5', 'orders': [3]}),
+        '{"key": "a", "start": "3", "end": "4", "tas',
+    ]
+    checkpoint_path.write_text('\n'.join(lines))
+
+    result = load_checkpoint(path=str(checkpoint_path), key='a')
+
+    assert {('1', '2'): [[1]]} == result
+
+
+def test_fetch_sharded_order(tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    plenty = FakeMatrixApi(orders=list(generate_orders(count=150, days=20,
+                                                       seed=12)))
+    expected = fetch_range(plenty=plenty, start='2020-08-31',
+                           end='2020-09-21', mapping=mapping)
+    result = []
+
+    for window in ['day', 'week']:
+        orders = fetch_sharded(
+            plenty=plenty, start='2020-08-31', end='2020-09-21',
+            mapping=mapping, window=window,
+            checkpoint_path=str(tmp_path / f'{window}.checkpoint'))
+        result.append([order['id'] for order in orders])
+
+    assert 150 == len(expected)
+    assert [[order['id'] for order in expected]] * 2 == result
+
+
+def test_fetch_sharded_convert(tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    plenty = FakeMatrixApi(orders=list(generate_orders(count=60, days=10,
+                                                       seed=13)))
+    expected = fetch_sharded(
+        plenty=plenty, start='2020-08-31', end='2020-09-11', mapping=mapping,
+        window='day', checkpoint_path=str(tmp_path / 'first.checkpoint'))
+    resumed = FakeWindowApi()
+    result = []
+
+    # the orders of the checkpoint are converted like the fetched orders
+    for (client, name) in [(plenty, 'second'), (resumed, 'first')]:
+        records = fetch_sharded(
+            plenty=client, start='2020-08-31', end='2020-09-11',
+            mapping=mapping, window='day',
+            checkpoint_path=str(tmp_path / f'{name}.checkpoint'),
+            convert=OrderRecord)
+        assert all(isinstance(record, OrderRecord) for record in records)
+        result.append([record.id for record in records])
+
+    assert [] == resumed.calls
+    assert [[order['id'] for order in expected]] * 2 == result
+
+
+def test_fetch_sharded_resume_buckets(tmp_path,
+                                      sample_shard_mapping: dict) -> None:
+    checkpoint_path = str(tmp_path / 'report.checkpoint')
+    fetch_sharded(plenty=FakeWindowApi(), start='2020-09-01',
+                  end='2020-09-04', mapping=sample_shard_mapping,
+                  window='day', checkpoint_path=checkpoint_path)
+    buckets = []
+
+    def new_bucket() -> list:
+        buckets.append([])
+        return buckets[-1]
+
+    result = fetch_sharded(plenty=FakeWindowApi(), start='2020-09-01',
+                           end='2020-09-04', mapping=sample_shard_mapping,
+                           window='day', checkpoint_path=checkpoint_path,
+                           new_bucket=new_bucket)
+
+    # a bucket for each resumed window and one for the result
+    assert 4 == len(buckets)
+    assert result is buckets[-1]
+    assert all(not bucket for bucket in buckets[:-1])
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from plenty_taxhub_generator.packages.snapshot import (get_snapshot_path,
+                                                       load_snapshot,
+                                                       write_snapshot)
+from plenty_taxhub_generator.packages.synthetic import build_synthetic_mapping
+
+
+@pytest.fixture
+def config_path(monkeypatch, tmp_path) -> str:
+    monkeypatch.setenv('HOME', str(tmp_path))
+    path = tmp_path / 'shop.ini'
+    path.write_text('[General]\nbase_url=https://a.plentymarkets.com\n')
+    return str(path)
+
+
+def test_load_snapshot(config_path: str) -> None:
+    mapping = build_synthetic_mapping()
+    vat_data = {'1': {'config': ['54', '55'], 'TaxId': 'DE123456789'}}
+
+    assert load_snapshot(config_path=config_path, ttl=60) is None
+    write_snapshot(config_path=config_path, mapping=mapping,
+                   vat_data=vat_data)
+
+    assert (mapping, vat_data) == load_snapshot(config_path=config_path,
+                                                ttl=60)
+    assert load_snapshot(config_path=config_path, ttl=-1) is None
+
+
+def test_snapshot_invalidated_by_config(config_path: str) -> None:
+    write_snapshot(config_path=config_path, mapping={'url': 'a'},
+                   vat_data={})
+    stat = os.stat(config_path)
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+    assert load_snapshot(config_path=config_path, ttl=60) is None
+
+
+def test_snapshot_path(config_path: str, tmp_path) -> None:
+    result = get_snapshot_path(config_path=config_path)
+
+    assert result.startswith(str(tmp_path / '.cache'))
+    assert os.path.basename(result).startswith('shop-')
+    assert result != get_snapshot_path(config_path=str(tmp_path / 'x.ini'))
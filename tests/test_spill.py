@@ -0,0 +1,67 @@
+import os
+import pickle
+
+import pytest
+
+from plenty_taxhub_generator.packages.fetch import partition_orders
+from plenty_taxhub_generator.packages.spill import (MemoryBudget, SpillList,
+                                                    get_size)
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import OrderRecord
+
+
+@pytest.fixture
+def sample_orders() -> list:
+    return list(generate_orders(count=300, seed=10))
+
+
+def test_get_size(sample_orders: list) -> None:
+    order = sample_orders[0]
+    record = OrderRecord(order)
+
+    assert get_size(order) > len(pickle.dumps(order)) > 0
+    assert get_size(order) > get_size(record) > get_size(None)
+
+
+def test_memory_budget_without_limit() -> None:
+    with MemoryBudget() as budget:
+        result = budget.new_list()
+
+    assert [] == result and not isinstance(result, SpillList)
+
+
+def test_spill_list(sample_orders: list) -> None:
+    with MemoryBudget(max_bytes=20 * get_size(sample_orders[0])) as budget:
+        orders = budget.new_list()
+        records = budget.new_list()
+        orders.extend(sample_orders)
+        directory = budget.directory
+        records.extend(OrderRecord(order) for order in orders)
+        # spilled while it is iterated, entries stay in sequence
+        for (index, order) in enumerate(orders):
+            if index == 150:
+                orders.spill()
+            assert sample_orders[index] == order
+        spill_path = orders.path
+        orders.clear()
+
+        assert 300 == len(records) and 0 == len(orders)
+        assert 0 < records.spilled and not os.path.exists(spill_path)
+        assert ([x['id'] for x in sample_orders] ==
+                [x.id for x in records])
+        assert budget.used <= budget.max_bytes
+    assert not os.path.exists(directory)
+
+
+def test_partition_orders_spilled(sample_orders: list) -> None:
+    mapping = build_synthetic_mapping()
+    expected = partition_orders(orders=sample_orders, mapping=mapping)
+
+    with MemoryBudget(max_bytes=10 * get_size(sample_orders[0])) as budget:
+        result = partition_orders(orders=sample_orders, mapping=mapping,
+                                  new_bucket=budget.new_list)
+
+        assert isinstance(result, SpillList) and result.spilled
+        assert expected == list(result)
@@ -0,0 +1,112 @@
+import pytest
+
+from plenty_taxhub_generator.packages.store import (OrderStore,
+                                                    fetch_from_store,
+                                                    get_payment_date,
+                                                    normalize_date, sync_store
+                                                    )
+
+
+def store_order(order_id: int, paid: str, updated: str,
+                country: int = 1) -> dict:
+    order = {
+        'id': order_id, 'referrerId': 1, 'updatedAt': updated,
+        'dates': [{'typeId': 3, 'date': paid}],
+        'addressRelations': [{'typeId': 2, 'addressId': 200}],
+        'addresses': [{'id': 200, 'countryId': country}],
+    }
+    return order
+
+
+class FakeStoreApi:
+    """Answer payment and change requests with separate order lists."""
+    def __init__(self, paid: list, changed: list):
+        self.paid = paid
+        self.changed = changed
+        self.calls = []
+
+    def plenty_api_get_orders_by_date(self, start, end, date_type,
+                                      additional, refine):
+        self.calls.append(date_type)
+        if date_type == 'Payment':
+            return self.paid
+        return self.changed
+
+
+@pytest.fixture
+def sample_store_mapping() -> dict:
+    mapping = {
+        'countries': {
+            'DE': {'country_id': '1', 'vat_conf': [], 'tax_id': ''},
+        },
+        'referrer': ['1'],
+    }
+    return mapping
+
+
+def test_normalize_date() -> None:
+    sample = ['2020-09-01', '2020-09-01T12:30', 'abc', None]
+    expected = ['2020-09-01T00:00:00', '2020-09-01T12:30:00', '', '']
+    result = []
+
+    for date in sample:
+        result.append(normalize_date(date=date))
+
+    assert expected == result
+
+
+def test_get_payment_date() -> None:
+    order = store_order(order_id=1, paid='2020-09-02T10:00:00',
+                        updated='2020-09-02T10:00:00')
+
+    assert get_payment_date(order=order) == '2020-09-02T10:00:00'
+    assert get_payment_date(order={'dates': []}) == ''
+
+
+def test_sync_store_incremental(tmp_path) -> None:
+    path = str(tmp_path / 'orders.sqlite')
+    paid = [
+        store_order(order_id=2, paid='2020-09-02', updated='2020-09-02'),
+        store_order(order_id=1, paid='2020-09-10', updated='2020-09-10'),
+    ]
+    changed = [
+        store_order(order_id=1, paid='2020-09-10', updated='2020-10-02',
+                    country=2),
+        store_order(order_id=3, paid='2020-10-01', updated='2020-10-01'),
+    ]
+
+    store = OrderStore(path=path)
+    plenty = FakeStoreApi(paid=paid, changed=changed)
+    sync_store(plenty=plenty, store=store, start='2020-09-01',
+               end='2020-09-30')
+    assert plenty.calls == ['Payment']
+    assert store.get_watermark()
+    store.set_watermark(watermark='2020-10-01T00:00:00+02:00')
+    store.close()
+
+    store = OrderStore(path=path)
+    plenty = FakeStoreApi(paid=paid, changed=changed)
+    sync_store(plenty=plenty, store=store, start='2020-09-05',
+               end='2020-09-20')
+    assert plenty.calls == ['Change']
+    result = store.get_orders(start='2020-09-01', end='2020-09-30')
+    store.close()
+
+    assert [1, 2] == [order['id'] for order in result]
+    assert result[0]['updatedAt'] == '2020-10-02'
+
+
+def test_fetch_from_store(tmp_path, sample_store_mapping: dict) -> None:
+    path = str(tmp_path / 'orders.sqlite')
+    paid = [
+        store_order(order_id=2, paid='2020-09-02', updated='2020-09-02'),
+        store_order(order_id=1, paid='2020-09-10', updated='2020-09-10',
+                    country=2),
+        store_order(order_id=3, paid='2020-09-11', updated='2020-09-11'),
+    ]
+    plenty = FakeStoreApi(paid=paid, changed=[])
+
+    result = fetch_from_store(plenty=plenty, path=path, start='2020-09-01',
+                              end='2020-09-30', mapping=sample_store_mapping)
+
+    assert [2, 3] == [order['id'] for order in result]
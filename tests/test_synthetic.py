@@ -0,0 +1,27 @@
+from plenty_taxhub_generator.packages.fetch import partition_orders
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import iter_rows, tax_columns
+
+
+def test_generate_orders_reproducible() -> None:
+    first = list(generate_orders(count=50, seed=3))
+    second = list(generate_orders(count=50, seed=3))
+
+    assert first == second
+    assert [order['id'] for order in first] == list(range(100000, 100050))
+
+
+def test_generate_orders_match_mapping() -> None:
+    mapping = build_synthetic_mapping()
+    orders = list(generate_orders(count=200, refund_ratio=0.25))
+
+    rows = list(iter_rows(data=orders, mapping=mapping))
+    partitioned = partition_orders(orders=orders, mapping=mapping)
+
+    assert len(rows) == 200
+    assert len(partitioned) == 200
+    assert all(len(row) == len(tax_columns) for row in rows)
+    assert {'SALE', 'REFUND'} == {row[1] for row in rows}
+    assert all(row[3] and row[7] for row in rows)
@@ -2,12 +2,21 @@ import pandas
 import pytest
 from pandas.testing import assert_frame_equal
 
-from plenty_taxhub_generator.packages.taxhub import (filter_data,
+from plenty_taxhub_generator.packages.taxhub import (ROW_SPEC, ROW_TEMPLATE,
+                                                     OrderRecord,
+                                                     build_vat_index,
+                                                     compact_orders,
+                                                     filter_data,
                                                      get_delivery_date,
                                                      get_document_data,
                                                      get_order_type,
-                                                     get_vat_zone, tax_columns
+                                                     get_vat_zone, iter_rows,
+                                                     iter_rows_parallel,
+                                                     tax_columns
                                                      )
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
 from tests.test_api_data import (sample_date_data, sample_document_data,
                                  sample_orders_api, sample_vat_data
                                  )
@@ -73,6 +82,26 @@ def test_filter_data(
     assert_frame_equal(expected_filter_result, result)
 
 
+def test_iter_rows_from_generator(
+    sample_orders_api: list,
+    sample_mapping_data: dict,
+) -> None:
+    consumed = []
+
+    def orders():
+        for order in sample_orders_api:
+            consumed.append(order['id'])
+            yield order
+
+    rows = iter_rows(data=orders(), mapping=sample_mapping_data)
+    first = next(rows)
+
+    assert consumed == [12345]
+    assert first[:3] == ['1', 'SALE', '12345']
+    assert len(first) == len(tax_columns)
+    assert [row[2] for row in rows] == ['12346']
+
+
 def test_get_order_type() -> None:
     value = [1, 4, 99]
     expected = ['SALE', 'REFUND', '']
@@ -116,3 +145,78 @@ def test_get_vat_zone(sample_vat_data: list, sample_mapping_data: dict) -> None:
         result.append(get_vat_zone(row=sample, mapping=sample_mapping_data))
 
     assert expected == result
+
+
+def test_build_vat_index(sample_mapping_data: dict) -> None:
+    sample_mapping_data['countries']['AT']['vat_conf'].append('54')
+    expected = {'54': 'DE', '55': 'DE', '34': 'AT', '35': 'AT'}
+
+    result = build_vat_index(mapping=sample_mapping_data)
+
+    assert expected == result
+
+
+def test_get_vat_zone_with_index(sample_vat_data: list,
+                                 sample_mapping_data: dict) -> None:
+    sample_mapping_data['vat_index'] = build_vat_index(
+        mapping=sample_mapping_data)
+    expected = ['DE', 'DE', 'AT', '', '']
+    result = []
+
+    for sample in sample_vat_data:
+        result.append(get_vat_zone(row=sample, mapping=sample_mapping_data))
+
+    assert expected == result
+
+
+def test_row_spec() -> None:
+    columns = [column for (column, _) in ROW_SPEC]
+
+    assert len(columns) == len(set(columns))
+    assert set(columns).issubset(tax_columns)
+
+
+def test_iter_rows_keeps_template(
+    sample_orders_api: list,
+    sample_mapping_data: dict,
+) -> None:
+    rows = list(iter_rows(data=sample_orders_api,
+                          mapping=sample_mapping_data))
+
+    assert rows[0] is not rows[1]
+    assert ROW_TEMPLATE == [''] * len(tax_columns)
+
+
+@pytest.mark.parametrize('as_iterator', [False, True])
+def test_iter_rows_parallel_matches_iter_rows(as_iterator: bool) -> None:
+    mapping = build_synthetic_mapping()
+    orders = list(generate_orders(count=200, duplicate_ratio=0.3,
+                                  refund_ratio=0.3, seed=3))
+    orders.append(dict(orders[0], id=1, typeId=3))
+    expected = list(iter_rows(data=orders, mapping=mapping))
+
+    data = iter(orders) if as_iterator else orders
+
+    result = list(iter_rows_parallel(data=data, mapping=mapping, workers=2,
+                                     chunk_size=7))
+
+    assert expected == result
+    assert [str(x) for x in range(1, 201)] == [row[0] for row in result]
+
+
+def test_compact_orders_keep_rows() -> None:
+    mapping = build_synthetic_mapping()
+    orders = list(generate_orders(count=50, duplicate_ratio=0.2,
+                                  refund_ratio=0.3, seed=5))
+    orders.append(dict(orders[0], id=1, typeId=3, amounts=[]))
+
+    records = compact_orders(orders=orders)
+
+    assert all(isinstance(record, OrderRecord) for record in records)
+    assert not hasattr(records[0], '__dict__')
+    assert ['', None] == [records[-1].document_id, records[-1].vat_rate]
+    assert (list(iter_rows(data=orders, mapping=mapping)) ==
+            list(iter_rows(data=records, mapping=mapping)))
+    assert (list(iter_rows(data=orders, mapping=mapping)) ==
+            list(iter_rows_parallel(data=records, mapping=mapping,
+                                    workers=2, chunk_size=9)))
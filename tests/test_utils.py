@@ -2,11 +2,13 @@ import configparser
 
 import pytest
 
+from loguru import logger
+
 from plenty_taxhub_generator.packages.utils import (check_url,
                                                     country_id_mapping,
+                                                    format_date_portion,
                                                     get_referrer_id_list,
-                                                    transform_date
-                                                    )
+                                                    transform_date)
 
 
 def config_obj(country='', referrer='') -> object:
@@ -32,7 +34,8 @@ def sample_referrer() -> list:
         config_obj(referrer='3,4'),
         config_obj(referrer='3,4,5.01'),
         config_obj(referrer='104,4,5.01,2'),
-        config_obj(referrer='abc')
+        config_obj(referrer='abc'),
+        config_obj(referrer='3,abc,4')
     ]
     return samples
 
@@ -77,7 +80,8 @@ def test_get_referrer_id_list(sample_referrer) -> None:
         ['3', '4'],
         ['3', '4', '5.01'],
         ['104', '4', '5.01', '2'],
-        []
+        [],
+        ['3', '4']
     ]
     result = []
 
@@ -122,3 +126,27 @@ def test_transform_date() -> None:
         result.append(transform_date(date=test_date))
 
     assert expected == result
+
+
+def test_transform_date_fast_path() -> None:
+    sample = ['2020-02-01T23:30:00+02:00', '2020-02-01T00:30:00-05:00',
+              '2020-02-29T10:00:00.123Z', '2020-02-01T10:00',
+              '2019-02-29T10:00:00+01:00', '2020-02-01T10:00:00+0100',
+              '1 Feb 2020', '2020-02-01']
+    expected = ['01/02/2020', '01/02/2020', '29/02/2020', '01/02/2020', '',
+                '01/02/2020', '01/02/2020', '01/02/2020']
+    format_date_portion.cache_clear()
+    errors = []
+    handler = logger.add(errors.append, level='ERROR')
+    result = []
+
+    try:
+        for test_date in sample + sample:
+            result.append(transform_date(date=test_date))
+    finally:
+        logger.remove(handler)
+
+    assert expected + expected == result
+    # invalid dates are not cached, so each occurrence is logged
+    assert format_date_portion.cache_info().currsize == 2
+    assert 2 == len(errors)
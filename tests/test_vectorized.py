@@ -0,0 +1,77 @@
+import pytest
+from pandas.testing import assert_frame_equal
+
+from plenty_taxhub_generator.packages.report import write_report
+from plenty_taxhub_generator.packages.synthetic import (
+    build_synthetic_mapping, generate_orders
+)
+from plenty_taxhub_generator.packages.taxhub import (compact_orders,
+                                                     filter_data, iter_rows)
+from plenty_taxhub_generator.packages.vectorized import (build_frame,
+                                                         transform_dates)
+from tests.test_api_data import sample_orders_api
+from tests.test_taxhub import sample_mapping_data
+
+
+@pytest.fixture
+def synthetic_orders() -> list:
+    orders = list(generate_orders(count=300, duplicate_ratio=0.1,
+                                  seed=11))
+    orders[0]['documents'] = []
+    orders[1]['dates'] = orders[1]['dates'][:2]
+    orders[2]['typeId'] = 3
+    orders[3]['amounts'][0]['vats'][0]['countryVatId'] = 999
+    return orders
+
+
+def test_transform_dates() -> None:
+    import pandas
+
+    dates = pandas.Series(['2020-08-13T14:05:00+02:00', '2020-08-13',
+                           '2020-02-30T10:00:00+01:00', 'invalid'],
+                          dtype=object)
+
+    assert ['13/08/2020', '13/08/2020', '', ''] == list(
+        transform_dates(dates=dates))
+
+
+@pytest.mark.parametrize('records', ['none', 'all', 'mixed'])
+def test_build_frame_matches_rows(synthetic_orders: list,
+                                  records: str) -> None:
+    mapping = build_synthetic_mapping()
+    if records == 'all':
+        synthetic_orders = compact_orders(orders=synthetic_orders)
+    elif records == 'mixed':
+        synthetic_orders = (compact_orders(orders=synthetic_orders[:100]) +
+                            synthetic_orders[100:])
+
+    expected = filter_data(data=synthetic_orders, mapping=mapping)
+    result = build_frame(data=synthetic_orders, mapping=mapping)
+
+    assert_frame_equal(expected, result)
+
+
+def test_build_frame_api_data(sample_orders_api: list,
+                              sample_mapping_data: dict) -> None:
+    expected = filter_data(data=sample_orders_api,
+                           mapping=sample_mapping_data)
+
+    assert_frame_equal(expected, filter_data(data=sample_orders_api,
+                                             mapping=sample_mapping_data,
+                                             engine='vectorized'))
+    assert_frame_equal(filter_data(data=[], mapping=sample_mapping_data),
+                       build_frame(data=[], mapping=sample_mapping_data))
+
+
+def test_build_frame_identical_report(synthetic_orders: list,
+                                      tmp_path) -> None:
+    mapping = build_synthetic_mapping()
+    frame = build_frame(data=synthetic_orders, mapping=mapping)
+
+    write_report(rows=iter_rows(data=synthetic_orders, mapping=mapping),
+                 path=str(tmp_path / 'rows.csv'))
+    write_report(rows=frame.itertuples(index=False, name=None),
+                 path=str(tmp_path / 'vectorized.csv'))
+
+    assert ((tmp_path / 'rows.csv').read_bytes() ==
+            (tmp_path / 'vectorized.csv').read_bytes())